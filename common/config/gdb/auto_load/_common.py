@@ -36,6 +36,34 @@ class FrameFilter:
         self.enabled = enabled
         self.objfile = objfile
 
+        # function name -> decorator (or None to pass the frame through)
+        self._decisions = {}
+
+    def decide(self, name):
+        "Pick the decorator for a function, memoised per function name"
+        try:
+            return self._decisions[name]
+        except KeyError:
+            pass
+
+        stripped = name
+        if stripped.find('@@') >= 0:
+            stripped = stripped[:stripped.find('@@')]
+
+        for prefix in self.drop_prefixes:
+            if stripped.startswith(prefix):
+                stripped = stripped[len(prefix):]
+                break
+        else:
+            prefix = None
+
+        decorator = self.decorators.get(stripped)
+        if not decorator and prefix is not None:
+            decorator = ignore
+
+        self._decisions[name] = decorator
+        return decorator
+
     def filter(self, frame_iterator):
         for frame in frame_iterator:
             name = frame.inferior_frame().name()
@@ -43,21 +71,9 @@ class FrameFilter:
                 yield frame
                 continue
 
-            if name.find('@@') >= 0:
-                name = name[:name.find('@@')]
-
-            for prefix in self.drop_prefixes:
-                if name.startswith(prefix):
-                    name = name[len(prefix):]
-                    break
-            else:
-                prefix = None
-
-            decorator = self.decorators.get(name)
+            decorator = self.decide(name)
             if decorator:
                 frame = decorator(frame, frame_iterator)
-            elif prefix is not None:
-                frame = None
 
             if frame:
                 yield frame
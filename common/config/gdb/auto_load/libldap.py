@@ -4,6 +4,8 @@ import auto_load._common as helpers
 from auto_load._common import ignore
 from auto_load.libpthread import LockDecorator
 
+from pretty_printers import register_openldap
+
 
 def set_thread_name(name, decorator=None):
     def f(frame, *args, **kwargs):
@@ -31,3 +33,4 @@ def new_objfile(event):
     ff = OpenLDAPFrameFilter()
     event.new_objfile.frame_filters[ff.name] = ff
     print(ff.name+" loaded")
+    register_openldap(event.new_objfile)
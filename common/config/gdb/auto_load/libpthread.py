@@ -1,3 +1,5 @@
+import snapshot
+
 import auto_load._common as helpers
 from auto_load._common import SavingDecorator, ignore
 
@@ -18,16 +20,14 @@ class LockDecorator(SavingDecorator):
 
         frame = self.inferior_frame()
         mutex = frame.read_var('mutex')
-        owner = mutex['__data']['__owner']
+        owner = int(mutex['__data']['__owner'])
 
         if owner == self.thread.ptid[1]:
             name = "self-deadlock in " + name
         else:
-            for thread in self.thread.inferior.threads():
-                lwp_id = thread.ptid[1]
-                if lwp_id == owner:
-                    name += " [waiting on thread %d (LWP %d)]" % (thread.num, lwp_id)
-                    break
+            thread = snapshot.get(self.thread.inferior).thread(owner)
+            if thread:
+                name += " [waiting on thread %d (LWP %d)]" % (thread.num, owner)
 
         return name
 
@@ -1,6 +1,8 @@
 import auto_load._common as helpers
 from auto_load._common import GDBArgument, SavingDecorator, ignore
 
+from pretty_printers import register
+
 
 class LloadFrameFilter(helpers.FrameFilter):
     decorators = {
@@ -48,3 +50,4 @@ def new_objfile(event):
     ff = LloadFrameFilter()
     event.new_objfile.frame_filters[ff.name] = ff
     print(ff.name+" loaded")
+    register(event.new_objfile)
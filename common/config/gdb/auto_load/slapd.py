@@ -1,6 +1,8 @@
 import auto_load._common as helpers
 from auto_load._common import ignore
 
+from pretty_printers import register_openldap
+
 
 class SlapdFrameFilter(helpers.FrameFilter):
     decorators = {
@@ -13,3 +15,4 @@ def new_objfile(event):
     ff = SlapdFrameFilter()
     event.new_objfile.frame_filters[ff.name] = ff
     print(ff.name+" loaded")
+    register_openldap(event.new_objfile)
@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+
+import gdb
+
+import collections
+
+import snapshot
+
+
+def format_ranges(numbers):
+    "Compress a list of numbers into '1-3,5,7-9'"
+    ranges = []
+    for number in sorted(numbers):
+        if ranges and ranges[-1][1] == number - 1:
+            ranges[-1][1] = number
+        else:
+            ranges.append([number, number])
+
+    return ",".join(str(start) if start == end else "{}-{}".format(start, end)
+                    for start, end in ranges)
+
+
+class CommandUniqueBacktraces(gdb.Command):
+    """Prints each distinct backtrace once with the threads sharing it, e.g.
+    (gdb) bt-unique
+    998 threads: 4-1001 (worker thread)
+            #0 ldap_pvt_thread_cond_wait() at thr_posix.c:277
+
+    3 threads: 1-3
+    ...
+
+    Backtraces are compared after frame filters are applied, by function name
+    and pc of each frame, most common ones are printed first.
+
+    Options:
+    --frames N      only look at (and print) the newest N frames
+    """
+
+    def __init__(self):
+        super().__init__("bt-unique", gdb.COMMAND_STACK)
+        print("Command 'bt-unique' loaded")
+
+    def invoke(self, arg, from_tty):
+        "Groups and prints backtraces"
+
+        limit = None
+
+        argv = gdb.string_to_argv(arg)
+        while argv:
+            option = argv.pop(0)
+            if option != '--frames':
+                raise gdb.GdbError("Unknown option " + option)
+            if not argv:
+                raise gdb.GdbError("Option {} needs an argument"
+                                   .format(option))
+            try:
+                limit = int(argv.pop(0))
+            except ValueError:
+                raise gdb.GdbError("Option --frames needs a number\n"
+                                   "Usage: bt-unique [--frames N]") from None
+
+        # stack key -> thread numbers/names and the formatted frames
+        threads = collections.defaultdict(list)
+        names = collections.defaultdict(collections.Counter)
+        lines = {}
+
+        with snapshot.SelectionSaver():
+            current = snapshot.get()
+            for thread in current:
+                frame = current.newest_frame(thread)
+                decorators = list(snapshot.filtered_frames(frame, limit))
+                key = tuple((decorator.inferior_frame().name(),
+                             decorator.address())
+                            for decorator in decorators)
+
+                threads[key].append(thread.num)
+                names[key][thread.name] += 1
+                if key not in lines:
+                    # only the first thread with this stack is formatted
+                    lines[key] = [snapshot.format_frame(decorator)
+                                  for decorator in decorators]
+
+        for key in sorted(threads, key=lambda k: len(threads[k]),
+                          reverse=True):
+            count = len(threads[key])
+            header = "{} thread{}: {}".format(count, "s" if count > 1 else "",
+                                             format_ranges(threads[key]))
+            named = ", ".join(name for name in names[key] if name)
+            if named:
+                header += " ({})".format(named)
+            print(header)
+
+            for level, line in enumerate(lines[key]):
+                print("\t#{} {}".format(level, line))
+            print()
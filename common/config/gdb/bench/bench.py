@@ -0,0 +1,460 @@
+#!/usr/bin/env python3
+"""Benchmarks of the extensions against generated cores
+
+Builds the C fixtures in fixtures/ (small programs reproducing the layouts
+the extensions deal with: mutex convoys and cycles, lloadd connection lists
+and operation trees, thread pool backlogs, wide OR filters), runs each at a
+range of sizes, takes a core with gcore and times the commands and printers
+over it in a batch mode gdb:
+
+    ~/.gdb/bench/bench.py -o before.json
+    ... hack ...
+    ~/.gdb/bench/bench.py -o after.json --compare before.json
+
+Needs gcc, gdb and gcore, and permission to ptrace our own children (see
+/proc/sys/kernel/yama/ptrace_scope).
+
+UNTESTED: this script has not yet been run against a real gdb and gcore,
+only the fixtures have been built and the printers and commands exercised
+on fakegdb (see micro.py and test_extensions.py). Expect rough edges in the
+gdb driving part.
+
+All the commands and walks of a scenario share one gdb. Each command is
+run once ('cold', only the first command of a scenario pays for symbol and
+type lookups, later ones find them cached) and then REPEAT more times,
+forgetting the thread snapshot in between as a new stop would ('warm', the
+median is reported). Printer throughput is measured by running the
+printers over an expression and everything they hand out, with 'print
+elements' unlimited.
+
+The same module is imported inside each gdb where measure() does the
+actual work.
+"""
+
+import argparse
+import collections
+import datetime
+import json
+import os
+import platform
+import select
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+GDB_DIR = os.path.dirname(BENCH_DIR)
+FIXTURES_DIR = os.path.join(BENCH_DIR, 'fixtures')
+
+REPEAT = 5
+
+CFLAGS = ['-g', '-O0', '-pthread']
+
+LOCK_COMMANDS = [
+    ('deadlock', 'deadlock'),
+    ('lockstat', 'lockstat'),
+    ('bt', 'thread apply all bt'),
+    ('bt-no-filters', 'thread apply all bt -no-filters'),
+    ('bt-unique', 'bt-unique'),
+]
+
+Scenario = collections.namedtuple('Scenario', [
+    'name',
+    'fixture',      # fixtures/<fixture>.c
+    'args',         # fixture arguments, '{n}' is replaced with the size
+    'sizes',
+    'commands',     # (key, command) pairs, '{n}' is replaced as well
+    'walks',        # expressions to run the printers over
+])
+
+SCENARIOS = [
+    Scenario('convoy', 'locks', ['convoy', '{n}'], [10, 100, 1000],
+             LOCK_COMMANDS, []),
+    Scenario('cycle', 'locks', ['cycle', '{n}'], [10, 100, 1000],
+             LOCK_COMMANDS, []),
+    Scenario('conns', 'conns', ['{n}', '4'], [100, 1000, 10000], [
+        ('lload-census', 'lload-census'),
+        ('find-conn', 'find-conn {n}'),
+        ('print-clients', 'print clients'),
+    ], ['clients', 'backend']),
+    Scenario('pool', 'pool', ['{n}'], [100, 1000, 10000], [
+        ('pool', 'pool'),
+        ('print-pool', 'print *connection_pool'),
+    ], ['*connection_pool']),
+    Scenario('filter', 'filter', ['{n}'], [10, 100, 1000], [
+        ('print-filter', 'print *filter'),
+    ], ['*filter']),
+]
+
+
+def forget():
+    "Run inside gdb: drop what is kept until the inferior is resumed"
+    import snapshot
+    snapshot.invalidate()
+
+
+def time_command(command, repeat):
+    "Run inside gdb: time command cold and then warm"
+    import gdb
+    from pretty_printers import decoder
+
+    timings = []
+    for _ in range(repeat + 1):
+        forget()
+        reads = decoder.reads
+        start = time.perf_counter()
+        output = gdb.execute(command, to_string=True)
+        timings.append(time.perf_counter() - start)
+        reads = decoder.reads - reads
+
+    return {
+        'cold': timings[0],
+        'warm': statistics.median(timings[1:]) if repeat else None,
+        'reads': reads,
+        'lines': output.count('\n'),
+    }
+
+
+def expand(value):
+    """Run inside gdb: run the printers over value and whatever they return
+
+    Returns how many values were looked at, each is visited once."""
+    import gdb
+
+    count = 0
+    seen = set()
+    stack = [value]
+    while stack:
+        value = stack.pop()
+        if value.type.strip_typedefs().code == gdb.TYPE_CODE_PTR:
+            key = (str(value.type), int(value))
+        elif value.address is not None:
+            key = (str(value.type), int(value.address))
+        else:
+            key = None
+        if key is not None:
+            if key in seen:
+                continue
+            seen.add(key)
+
+        count += 1
+        printer = gdb.default_visualizer(value)
+        if printer is None:
+            continue
+
+        if hasattr(printer, 'to_string'):
+            result = printer.to_string()
+            if isinstance(result, gdb.Value):
+                stack.append(result)
+        if hasattr(printer, 'children'):
+            for _, child in printer.children():
+                if isinstance(child, gdb.Value):
+                    stack.append(child)
+    return count
+
+
+def time_walk(expression, repeat):
+    "Run inside gdb: time the printers over expression cold and then warm"
+    import gdb
+    from pretty_printers import decoder
+
+    elements = gdb.parameter('print elements')
+    gdb.execute('set print elements unlimited')
+    try:
+        timings = []
+        for _ in range(repeat + 1):
+            forget()
+            reads = decoder.reads
+            start = time.perf_counter()
+            count = expand(gdb.parse_and_eval(expression))
+            timings.append(time.perf_counter() - start)
+            reads = decoder.reads - reads
+    finally:
+        gdb.execute('set print elements {}'.format(elements or 'unlimited'))
+
+    warm = statistics.median(timings[1:]) if repeat else None
+    return {
+        'cold': timings[0],
+        'warm': warm,
+        'reads': reads,
+        'values': count,
+        'rate': count / (warm or timings[0]),
+    }
+
+
+def measure(spec, output):
+    "Run inside gdb: measure what the spec file asks for, store in output"
+    import gdb
+
+    with open(spec) as f:
+        spec = json.load(f)
+
+    result = {
+        'python': platform.python_version(),
+        'gdb': gdb.VERSION,
+        'commands': {},
+        'walks': {},
+        'errors': {},
+    }
+
+    for key, command in spec['commands']:
+        try:
+            result['commands'][key] = time_command(command, spec['repeat'])
+        except gdb.error as e:
+            result['errors'][key] = str(e)
+
+    for expression in spec['walks']:
+        try:
+            result['walks'][expression] = time_walk(expression,
+                                                    spec['repeat'])
+        except gdb.error as e:
+            result['errors'][expression] = str(e)
+
+    with open(output, 'w') as f:
+        json.dump(result, f)
+
+
+def build(fixture, workdir):
+    "Compile fixtures/<fixture>.c into workdir unless up to date"
+    source = os.path.join(FIXTURES_DIR, fixture + '.c')
+    binary = os.path.join(workdir, fixture)
+    if not os.path.exists(binary) or \
+            os.path.getmtime(binary) < os.path.getmtime(source):
+        subprocess.run(['gcc'] + CFLAGS + ['-o', binary, source], check=True)
+    return binary
+
+
+def take_core(command, prefix, timeout):
+    "Run command until it says it is ready, returns the path to its core"
+    process = subprocess.Popen(command, stdin=subprocess.DEVNULL,
+                               stdout=subprocess.PIPE)
+    try:
+        ready, _, _ = select.select([process.stdout], [], [], timeout)
+        if not ready or process.stdout.readline().strip() != b'ready':
+            raise RuntimeError("{} did not get ready".format(command))
+        subprocess.run(['gcore', '-o', prefix, str(process.pid)],
+                       stdout=subprocess.DEVNULL, check=True)
+    finally:
+        process.kill()
+        process.wait()
+    return "{}.{}".format(prefix, process.pid)
+
+
+def gdb_command(binary, core, spec, output):
+    return [
+        'gdb', '-batch', '-nx',
+        '-iex', 'set pagination off',
+        '-iex', 'python import sys; sys.path.insert(0, {!r}); '
+                'sys.path.insert(0, {!r})'.format(GDB_DIR, BENCH_DIR),
+        '-x', os.path.join(GDB_DIR, 'gdb.py'),
+        binary, '-c', core,
+        '-ex', 'python import bench; bench.measure({!r}, {!r})'.format(
+            spec, output),
+    ]
+
+
+def run(scenario, n, workdir, repeat, timeout):
+    "Benchmark scenario at size n, returns a result dictionary"
+    result = {
+        'scenario': scenario.name,
+        'n': n,
+    }
+
+    binary = build(scenario.fixture, workdir)
+    args = [arg.format(n=n) for arg in scenario.args]
+    prefix = os.path.join(workdir, 'core.{}.{}'.format(scenario.name, n))
+    core = take_core([binary] + args, prefix, timeout)
+
+    spec = os.path.join(workdir, 'spec.json')
+    output = os.path.join(workdir, 'result.json')
+    with open(spec, 'w') as f:
+        json.dump({
+            'commands': [(key, command.format(n=n))
+                         for key, command in scenario.commands],
+            'walks': scenario.walks,
+            'repeat': repeat,
+        }, f)
+    if os.path.exists(output):
+        os.unlink(output)
+
+    start = time.perf_counter()
+    try:
+        process = subprocess.run(gdb_command(binary, core, spec, output),
+                                 stdin=subprocess.DEVNULL,
+                                 stdout=subprocess.PIPE,
+                                 stderr=subprocess.STDOUT,
+                                 timeout=timeout)
+    except subprocess.TimeoutExpired:
+        result['status'] = 'timeout'
+    else:
+        if os.path.exists(output):
+            with open(output) as f:
+                result.update(json.load(f))
+            result['status'] = 'ok'
+        else:
+            result['status'] = 'failed'
+            result['log'] = process.stdout.decode(errors='replace')
+    result['elapsed'] = time.perf_counter() - start
+    result['core'] = core
+    result['core_size'] = os.path.getsize(core)
+    return result
+
+
+def first_line(command):
+    try:
+        process = subprocess.run(command, stdout=subprocess.PIPE,
+                                 stderr=subprocess.DEVNULL)
+    except OSError:
+        return None
+    return process.stdout.decode(errors='replace').partition('\n')[0]
+
+
+def environment():
+    "Describe where the numbers come from so runs can be compared"
+    return {
+        'date': datetime.datetime.now().isoformat(timespec='seconds'),
+        'host': platform.node(),
+        'machine': platform.machine(),
+        'cpus': os.cpu_count(),
+        'gdb': first_line(['gdb', '--version']),
+        'gcc': first_line(['gcc', '--version']),
+        'commit': first_line(['git', '-C', GDB_DIR, 'rev-parse', 'HEAD']),
+        'dirty': bool(first_line(['git', '-C', GDB_DIR, 'status',
+                                  '--porcelain', '--', '.'])),
+        'cflags': CFLAGS,
+    }
+
+
+def flatten(report):
+    "Map (scenario, n, key) to each measurement in report"
+    results = {}
+    for result in report['results']:
+        for group in ('commands', 'walks'):
+            for key, measurement in result.get(group, {}).items():
+                results[(result['scenario'], result['n'], key)] = measurement
+    return results
+
+
+def print_results(report, out=sys.stdout):
+    print("{:<8} {:>6} {:<16} {:>9} {:>9} {:>8}  rate".format(
+        "scenario", "n", "key", "cold", "warm", "reads"), file=out)
+    for (scenario, n, key), m in flatten(report).items():
+        line = "{:<8} {:>6} {:<16} {:>7.1f}ms {:>7.1f}ms {:>8}".format(
+            scenario, n, key, m['cold'] * 1000, (m['warm'] or 0) * 1000,
+            m['reads'])
+        if m.get('rate'):
+            line += "  {:.0f}/s".format(m['rate'])
+        print(line, file=out)
+
+    for result in report['results']:
+        if result['status'] != 'ok':
+            print("{scenario} {n}: {status}".format(**result), file=out)
+            if result.get('log'):
+                print(result['log'], file=out)
+        for key, error in result.get('errors', {}).items():
+            print("{} {} {}: {}".format(result['scenario'], result['n'], key,
+                                        error.strip()), file=out)
+
+
+def compare(old, new, out=sys.stdout):
+    "Print how the warm timings of new compare to those of old"
+    old_results = flatten(old)
+    print("\nCompared to {} ({}):".format(old['meta']['commit'],
+                                           old['meta']['date']), file=out)
+    for differs in ('gdb', 'gcc', 'machine', 'cpus'):
+        if old['meta'].get(differs) != new['meta'].get(differs):
+            print("warning: {} differs: {} vs {}".format(
+                differs, old['meta'].get(differs),
+                new['meta'].get(differs)), file=out)
+
+    print("{:<8} {:>6} {:<16} {:>9} {:>9} {:>7}".format(
+        "scenario", "n", "key", "before", "after", "ratio"), file=out)
+    for entry, m in flatten(new).items():
+        before = old_results.get(entry)
+        if not before or not before['warm'] or not m['warm']:
+            continue
+        print("{:<8} {:>6} {:<16} {:>7.1f}ms {:>7.1f}ms {:>6.2f}x".format(
+            *entry, before['warm'] * 1000, m['warm'] * 1000,
+            m['warm'] / before['warm']), file=out)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('scenarios', nargs='*', metavar='SCENARIO',
+                        help="scenarios to run (default: all of {})".format(
+                            ", ".join(s.name for s in SCENARIOS)))
+    parser.add_argument('-n', '--sizes', type=lambda arg: [
+                            int(n) for n in arg.split(',')],
+                        help="comma separated sizes to run every scenario "
+                             "at instead of their own")
+    parser.add_argument('-r', '--repeat', type=int, default=REPEAT,
+                        help="warm runs of each command (default: "
+                             "%(default)s)")
+    parser.add_argument('-t', '--timeout', type=float, default=600,
+                        help="seconds to give each gdb (default: "
+                             "%(default)s)")
+    parser.add_argument('-w', '--workdir',
+                        help="where to build fixtures and keep the cores "
+                             "(default: a temporary directory)")
+    parser.add_argument('-o', '--output',
+                        help="write the results as JSON here")
+    parser.add_argument('-i', '--input',
+                        help="read results from here instead of running")
+    parser.add_argument('-c', '--compare', metavar='OLD',
+                        help="compare the results with an earlier run")
+    args = parser.parse_args(argv)
+
+    if args.input:
+        with open(args.input) as f:
+            report = json.load(f)
+    else:
+        for tool in ('gcc', 'gdb', 'gcore'):
+            if not shutil.which(tool):
+                parser.error("{} not found".format(tool))
+
+        scenarios = SCENARIOS
+        if args.scenarios:
+            known = {s.name: s for s in SCENARIOS}
+            unknown = set(args.scenarios) - set(known)
+            if unknown:
+                parser.error("unknown scenarios: " + ", ".join(unknown))
+            scenarios = [known[name] for name in args.scenarios]
+
+        report = {
+            'meta': environment(),
+            'results': [],
+        }
+        report['meta']['repeat'] = args.repeat
+
+        with tempfile.TemporaryDirectory() as tmpdir:
+            workdir = args.workdir or tmpdir
+            os.makedirs(workdir, exist_ok=True)
+            for scenario in scenarios:
+                for n in args.sizes or scenario.sizes:
+                    print("{} {}".format(scenario.name, n), file=sys.stderr)
+                    result = run(scenario, n, workdir, args.repeat,
+                                 args.timeout)
+                    if not args.workdir:
+                        # they add up quickly
+                        os.unlink(result['core'])
+                    report['results'].append(result)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=1)
+
+    print_results(report)
+    if args.compare:
+        with open(args.compare) as f:
+            compare(json.load(f), report)
+
+    return 0 if all(result['status'] == 'ok'
+                    for result in report['results']) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,49 @@
+"Base frame decorator, same interface as gdb's gdb.FrameDecorator"
+
+
+class FrameDecorator:
+    def __init__(self, base):
+        self._base = base
+
+    def elided(self):
+        if hasattr(self._base, 'elided'):
+            return self._base.elided()
+        return None
+
+    def function(self):
+        if hasattr(self._base, 'function') and \
+                not hasattr(self._base, 'pc'):
+            return self._base.function()
+        frame = self.inferior_frame()
+        function = frame.function()
+        return function.name if function else frame.pc()
+
+    def address(self):
+        if hasattr(self._base, 'address'):
+            return self._base.address()
+        return None
+
+    def filename(self):
+        if hasattr(self._base, 'filename'):
+            return self._base.filename()
+        return None
+
+    def frame_args(self):
+        if hasattr(self._base, 'frame_args'):
+            return self._base.frame_args()
+        return None
+
+    def frame_locals(self):
+        if hasattr(self._base, 'frame_locals'):
+            return self._base.frame_locals()
+        return None
+
+    def line(self):
+        if hasattr(self._base, 'line'):
+            return self._base.line()
+        return None
+
+    def inferior_frame(self):
+        if hasattr(self._base, 'inferior_frame'):
+            return self._base.inferior_frame()
+        return self._base
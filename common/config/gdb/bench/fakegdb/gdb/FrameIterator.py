@@ -0,0 +1,16 @@
+"Walks from a frame to the outermost one, same as gdb's gdb.FrameIterator"
+
+
+class FrameIterator:
+    def __init__(self, frame_obj):
+        self.frame = frame_obj
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        result = self.frame
+        if result is None:
+            raise StopIteration
+        self.frame = result.older()
+        return result
@@ -0,0 +1,956 @@
+"""A stand-in for the parts of gdb's Python API the extensions use
+
+Puts the printers and commands within reach of a plain Python process
+(pytest, cProfile, timeit) with no debugger around. Put the directory
+above this package first on sys.path and 'import gdb' picks it up, the
+program being debugged is then described in Python with program.Program.
+
+Only what the extensions touch is here, behaving the way gdb does as far
+as they can tell: values are lazy and only read memory when looked at,
+field lookups see through pointers, errors are gdb.error and
+gdb.MemoryError with gdb's messages, str() of a value goes through the
+pretty printers and 'print elements'. Types are laid out as on x86-64
+Linux (LP64, little endian).
+
+There is no process: no threads or frames, lookup_symbol() works as if a
+frame were selected and post_event() runs the callback straight away.
+Expressions go as far as the commands and benchmarks need: a symbol or a
+number followed through members and subscripts, dereferenced and cast.
+"""
+
+import bisect
+import contextlib
+import io
+import operator
+import re
+import shlex
+import types as _types
+
+
+VERSION = '14.0 (fake)'
+
+
+class error(RuntimeError):
+    pass
+
+
+class MemoryError(error):
+    pass
+
+
+class GdbError(Exception):
+    pass
+
+
+(TYPE_CODE_BITSTRING, TYPE_CODE_UNDEF, TYPE_CODE_PTR, TYPE_CODE_ARRAY,
+ TYPE_CODE_STRUCT, TYPE_CODE_UNION, TYPE_CODE_ENUM, TYPE_CODE_FLAGS,
+ TYPE_CODE_FUNC, TYPE_CODE_INT, TYPE_CODE_FLT, TYPE_CODE_VOID, TYPE_CODE_SET,
+ TYPE_CODE_RANGE, TYPE_CODE_STRING, TYPE_CODE_ERROR, TYPE_CODE_METHOD,
+ TYPE_CODE_METHODPTR, TYPE_CODE_MEMBERPTR, TYPE_CODE_REF,
+ TYPE_CODE_RVALUE_REF, TYPE_CODE_CHAR, TYPE_CODE_BOOL, TYPE_CODE_COMPLEX,
+ TYPE_CODE_TYPEDEF, TYPE_CODE_NAMESPACE, TYPE_CODE_DECFLOAT,
+ TYPE_CODE_INTERNAL_FUNCTION) = range(-1, 27)
+
+INTEGRAL = {TYPE_CODE_INT, TYPE_CODE_CHAR, TYPE_CODE_BOOL, TYPE_CODE_ENUM,
+            TYPE_CODE_FLAGS}
+
+(COMMAND_NONE, COMMAND_RUNNING, COMMAND_DATA, COMMAND_STACK, COMMAND_FILES,
+ COMMAND_SUPPORT, COMMAND_STATUS, COMMAND_BREAKPOINTS, COMMAND_TRACEPOINTS,
+ COMMAND_TUI, COMMAND_USER, COMMAND_OBSCURE,
+ COMMAND_MAINTENANCE) = range(-1, 12)
+
+COMPLETE_NONE = 0
+
+BYTE_ORDER = 'little'
+POINTER_SIZE = 8
+
+
+# Types
+
+class Field:
+    "A field of a struct, union or function type or a value of an enum"
+
+    def __init__(self, name, type, bitpos=None, enumval=None):
+        self.name = name
+        self.type = type
+        # there are no bit fields
+        self.bitsize = 0
+        # enumerators have a value instead of a position, like in gdb
+        if enumval is None:
+            self.bitpos = bitpos
+        else:
+            self.enumval = enumval
+
+
+class Type:
+    """A C type
+
+    Structs, unions and enums can be created incomplete and filled in
+    later (complete()) so that pointers to them can be made first. A type
+    is only equal to itself.
+    """
+
+    def __init__(self, code, name=None, tag=None, sizeof=0, alignof=None,
+                 target=None, fields=(), signed=False, length=None):
+        self.code = code
+        self.name = name
+        self.tag = tag
+        self._sizeof = sizeof
+        self._alignof = sizeof if alignof is None else alignof
+        self._target = target
+        self._fields = list(fields)
+        self._signed = signed
+        self._length = length
+        self._pointer = None
+
+    def complete(self, fields, sizeof, alignof):
+        "Fill in an incomplete struct, union or enum"
+        self._fields = fields
+        self._sizeof = sizeof
+        self._alignof = alignof
+
+    @property
+    def sizeof(self):
+        return self.strip_typedefs()._sizeof
+
+    @property
+    def alignof(self):
+        return self.strip_typedefs()._alignof
+
+    @property
+    def is_signed(self):
+        typ = self.strip_typedefs()
+        if typ.code not in INTEGRAL:
+            raise ValueError("Type must be a scalar type")
+        return typ._signed
+
+    def target(self):
+        if self._target is None:
+            raise RuntimeError("Type does not have a target.")
+        return self._target
+
+    def fields(self):
+        typ = self.strip_typedefs()
+        if typ.code not in (TYPE_CODE_STRUCT, TYPE_CODE_UNION,
+                            TYPE_CODE_ENUM, TYPE_CODE_FUNC):
+            raise TypeError("Type is not a structure, union, enum, or "
+                            "function type.")
+        return list(typ._fields)
+
+    def __getitem__(self, name):
+        "The field called name, like gdb.Type's mapping protocol"
+        for field in self.fields():
+            if field.name == name:
+                return field
+        raise KeyError(name)
+
+    def pointer(self):
+        if self._pointer is None:
+            self._pointer = Type(TYPE_CODE_PTR, sizeof=POINTER_SIZE,
+                                 target=self)
+        return self._pointer
+
+    def array(self, high):
+        if high < -1:
+            raise ValueError("Array length must not be negative")
+        return Type(TYPE_CODE_ARRAY, sizeof=self.sizeof * (high + 1),
+                    alignof=self.alignof, target=self, length=high + 1)
+
+    def strip_typedefs(self):
+        typ = self
+        while typ.code == TYPE_CODE_TYPEDEF:
+            typ = typ._target
+        return typ
+
+    def optimized_out(self):
+        return Value._make(self, data=bytes(self.sizeof))
+
+    def _declare(self, inner=''):
+        "Spell the type as C would with inner as the declarator"
+        if self.code == TYPE_CODE_PTR:
+            if self._target.code in (TYPE_CODE_ARRAY, TYPE_CODE_FUNC):
+                return self._target._declare('(*' + inner + ')')
+            return self._target._declare('*' + inner)
+        if self.code == TYPE_CODE_ARRAY:
+            return self._target._declare(inner + '[{}]'.format(self._length))
+        if self.code == TYPE_CODE_FUNC:
+            params = ', '.join(str(field.type) for field in self._fields)
+            return self._target._declare(inner + '(' + (params or 'void')
+                                         + ')')
+        if self.code == TYPE_CODE_STRUCT:
+            base = 'struct ' + (self.tag or '{...}')
+        elif self.code == TYPE_CODE_UNION:
+            base = 'union ' + (self.tag or '{...}')
+        elif self.code == TYPE_CODE_ENUM:
+            base = 'enum ' + (self.tag or '{...}')
+        else:
+            base = self.name
+        return base + ' ' + inner if inner else base
+
+    def __str__(self):
+        return self._declare()
+
+
+def _base(code, name, size, signed=False):
+    return Type(code, name=name, sizeof=size, signed=signed)
+
+
+_base_types = {
+    'void': _base(TYPE_CODE_VOID, 'void', 1),
+    'char': _base(TYPE_CODE_INT, 'char', 1, True),
+    'signed char': _base(TYPE_CODE_INT, 'signed char', 1, True),
+    'unsigned char': _base(TYPE_CODE_INT, 'unsigned char', 1),
+    'short': _base(TYPE_CODE_INT, 'short', 2, True),
+    'unsigned short': _base(TYPE_CODE_INT, 'unsigned short', 2),
+    'int': _base(TYPE_CODE_INT, 'int', 4, True),
+    'unsigned int': _base(TYPE_CODE_INT, 'unsigned int', 4),
+    'long': _base(TYPE_CODE_INT, 'long', 8, True),
+    'unsigned long': _base(TYPE_CODE_INT, 'unsigned long', 8),
+    'long long': _base(TYPE_CODE_INT, 'long long', 8, True),
+    'unsigned long long': _base(TYPE_CODE_INT, 'unsigned long long', 8),
+}
+
+_type_re = re.compile(r'^\s*(.*?)\s*((?:\*\s*)*)((?:\[\d+\]\s*)*)$')
+
+
+def _parse_type(spelling, lookup):
+    """Resolve a C type spelling ('struct foo *', 'char [16]')
+
+    lookup(name) finds the types that are not built in ('struct foo' or a
+    typedef name), returns None if there is no such type."""
+    match = _type_re.match(spelling)
+    if not match or not match.group(1):
+        return None
+
+    name = ' '.join(match.group(1).split())
+    typ = _base_types.get(name) or lookup(name)
+    if typ is None:
+        return None
+
+    for _ in range(match.group(2).count('*')):
+        typ = typ.pointer()
+    for length in reversed(re.findall(r'\d+', match.group(3))):
+        typ = typ.array(int(length) - 1)
+    return typ
+
+
+def _lookup_type(name):
+    for objfile in objfiles():
+        typ = objfile._types.get(name)
+        if typ is not None:
+            return typ
+    return None
+
+
+def lookup_type(name, block=None):
+    typ = _parse_type(name, _lookup_type)
+    if typ is None:
+        kind, _, tag = name.strip().partition(' ')
+        if kind in ('struct', 'union', 'enum') and tag:
+            raise error("No {} type named {}.".format(kind, tag.strip()))
+        raise error("No type named {}.".format(name.strip()))
+    return typ
+
+
+# Values
+
+def _to_int(typ, data):
+    return int.from_bytes(data, BYTE_ORDER,
+                          signed=typ.code in INTEGRAL and typ._signed)
+
+
+def _from_int(typ, number):
+    size = typ.sizeof
+    return (number & ((1 << (8 * size)) - 1)).to_bytes(size, BYTE_ORDER)
+
+
+class Value:
+    """A value in the program: either in memory (lazily read) or not
+
+    Values with an address read their contents the first time they are
+    looked at, taking a field or element of one does not read anything.
+    """
+
+    __hash__ = object.__hash__
+
+    def __init__(self, val):
+        if isinstance(val, Value):
+            self._init(val.type, val._address, val._data)
+        elif isinstance(val, int):
+            if -(1 << 63) <= val < (1 << 63):
+                typ = _base_types['long']
+            elif 0 <= val < (1 << 64):
+                typ = _base_types['unsigned long']
+            else:
+                raise error("Cannot convert value to long.")
+            self._init(typ, None, _from_int(typ, val))
+        else:
+            raise TypeError("Could not convert Python object: {!r}."
+                            .format(val))
+
+    def _init(self, type, address, data):
+        self.type = type
+        self._address = address
+        self._data = data
+
+    @classmethod
+    def _make(cls, type, address=None, data=None):
+        value = cls.__new__(cls)
+        value._init(type, address, data)
+        return value
+
+    @classmethod
+    def _from_int(cls, type, number):
+        return cls._make(type, data=_from_int(type.strip_typedefs(), number))
+
+    @property
+    def _bytes(self):
+        if self._data is None:
+            size = self.type.strip_typedefs().sizeof
+            self._data = bytes(_inferior.read_memory(self._address, size))
+        return self._data
+
+    @property
+    def address(self):
+        if self._address is None:
+            return None
+        return Value._from_int(self.type.pointer(), self._address)
+
+    def _at(self, typ, offset):
+        "The part of this value of type typ at offset"
+        if self._address is not None:
+            return Value._make(typ, self._address + offset)
+        size = typ.strip_typedefs().sizeof
+        return Value._make(typ, data=self._bytes[offset:offset + size])
+
+    def __getitem__(self, key):
+        if isinstance(key, (str, Field)):
+            value = self
+            typ = value.type.strip_typedefs()
+            while typ.code == TYPE_CODE_PTR:
+                value = value.dereference()
+                typ = value.type.strip_typedefs()
+            if typ.code not in (TYPE_CODE_STRUCT, TYPE_CODE_UNION):
+                raise error("Attempt to extract a component of a value "
+                            "that is not a structure.")
+            for field in typ._fields:
+                if field is key or field.name == key:
+                    return value._at(field.type, field.bitpos // 8)
+            if isinstance(key, Field):
+                raise TypeError("Invalid lookup for a field not "
+                                "contained in the value.")
+            raise error("There is no member named {}.".format(key))
+
+        index = operator.index(key)
+        typ = self.type.strip_typedefs()
+        element = typ.target() if typ.code in (TYPE_CODE_ARRAY,
+                                               TYPE_CODE_PTR) else None
+        if typ.code == TYPE_CODE_ARRAY:
+            return self._at(element, index * element.strip_typedefs().sizeof)
+        if typ.code == TYPE_CODE_PTR:
+            return Value._make(element, int(self) +
+                               index * element.strip_typedefs().sizeof)
+        raise error("Cannot subscript requested type.")
+
+    def dereference(self):
+        typ = self.type.strip_typedefs()
+        if typ.code != TYPE_CODE_PTR or \
+                typ.target().strip_typedefs().code == TYPE_CODE_VOID:
+            raise error("Attempt to take contents of a non-pointer value.")
+        return Value._make(typ.target(), int(self))
+
+    def cast(self, typ):
+        "Casts between integers and pointers, arrays and functions decay"
+        target = typ.strip_typedefs()
+        source = self.type.strip_typedefs()
+        if target.code not in INTEGRAL and target.code != TYPE_CODE_PTR:
+            raise error("Invalid cast.")
+
+        if source.code in (TYPE_CODE_ARRAY, TYPE_CODE_FUNC):
+            if self._address is None:
+                raise error("Attempt to take address of value not "
+                            "located in memory.")
+            number = self._address
+        elif source.code in INTEGRAL or source.code == TYPE_CODE_PTR:
+            number = int(self)
+        else:
+            raise error("Invalid cast.")
+        return Value._from_int(typ, number)
+
+    def assign(self, rhs):
+        "Store rhs (a Value, int or enumerator name) into this value"
+        if self._address is None:
+            raise error("Left operand of assignment is not an lvalue.")
+        typ = self.type.strip_typedefs()
+
+        if isinstance(rhs, str) and typ.code == TYPE_CODE_ENUM:
+            for field in typ._fields:
+                if field.name == rhs:
+                    break
+            else:
+                raise error('No symbol "{}" in current context.'.format(rhs))
+            data = _from_int(typ, field.enumval)
+        elif typ.code in INTEGRAL or typ.code == TYPE_CODE_PTR:
+            if not isinstance(rhs, Value):
+                rhs = Value(rhs)
+            data = rhs.cast(self.type)._bytes
+        else:
+            raise error("Invalid cast.")
+
+        _inferior.write_memory(self._address, data)
+        self._data = data
+
+    def __int__(self):
+        typ = self.type.strip_typedefs()
+        if typ.code in INTEGRAL:
+            return _to_int(typ, self._bytes)
+        if typ.code == TYPE_CODE_PTR:
+            return int.from_bytes(self._bytes, BYTE_ORDER)
+        raise error("Cannot convert value to long.")
+
+    __index__ = __int__
+
+    def __bool__(self):
+        typ = self.type.strip_typedefs()
+        if typ.code in INTEGRAL or typ.code == TYPE_CODE_PTR:
+            return int(self) != 0
+        return True
+
+    def string(self, encoding=None, errors='strict', length=-1):
+        length = int(length)
+        typ = self.type.strip_typedefs()
+        if typ.code == TYPE_CODE_ARRAY:
+            data = self._bytes
+            if length < 0:
+                data = data.split(b'\0', 1)[0]
+            else:
+                data = data[:length]
+        elif typ.code == TYPE_CODE_PTR:
+            data = _inferior._read_string(int(self), length)
+        else:
+            raise error("Trying to read string with inappropriate type `{}'."
+                        .format(self.type))
+        return data.decode(encoding or 'utf-8', errors)
+
+    def format_string(self, raw=False, symbols=True, max_elements=None,
+                      max_depth=-1, summary=False):
+        if max_elements is None:
+            max_elements = parameter('print elements')
+        elif max_elements == 0:
+            max_elements = None
+        formatter = _Formatter(raw, max_elements, symbols, summary)
+        return formatter.format(self, max_depth)
+
+    def __str__(self):
+        return self.format_string()
+
+    def _compare(self, other, function):
+        if other is None:
+            return function is operator.ne
+        if not isinstance(other, (Value, int)):
+            return NotImplemented
+        return function(int(self), int(other))
+
+    def __eq__(self, other):
+        return self._compare(other, operator.eq)
+
+    def __ne__(self, other):
+        return self._compare(other, operator.ne)
+
+
+def _quote(text):
+    return '"' + text.replace('\\', '\\\\').replace('"', '\\"') + '"'
+
+
+class _Formatter:
+    "Renders values the way 'print' does (on a single line)"
+
+    def __init__(self, raw, max_elements, symbols, summary):
+        self.raw = raw
+        self.max_elements = max_elements
+        self.symbols = symbols
+        self.summary = summary
+
+    def format(self, value, depth=-1):
+        if not self.raw:
+            printer = default_visualizer(value)
+            if printer is not None:
+                return self.printer(printer, depth)
+        return self.plain(value, depth)
+
+    def pointer(self, address):
+        text = '{:#x}'.format(address) if address else '0x0'
+        if self.symbols and address:
+            symbol = _symbol_at(address)
+            if symbol is not None:
+                symbol, offset = symbol
+                text += ' <{}{}>'.format(
+                    symbol.name, '+{}'.format(offset) if offset else '')
+        return text
+
+    def elements(self, items, depth):
+        parts = []
+        truncated = False
+        for i, item in enumerate(items):
+            if self.max_elements is not None and i >= self.max_elements:
+                truncated = True
+                break
+            parts.append(item(depth))
+        return ', '.join(parts) + ('...' if truncated else '')
+
+    def plain(self, value, depth):
+        typ = value.type.strip_typedefs()
+        code = typ.code
+
+        if code == TYPE_CODE_PTR:
+            return self.pointer(int(value))
+        if code == TYPE_CODE_ENUM:
+            number = int(value)
+            for field in typ._fields:
+                if field.enumval == number:
+                    return field.name
+            return str(number)
+        if code in INTEGRAL:
+            return str(int(value))
+        if code == TYPE_CODE_FUNC:
+            return '{{{}}} {}'.format(value.type,
+                                      self.pointer(value._address or 0))
+        if depth == 0 or self.summary:
+            return '{...}'
+        depth -= 1
+
+        if code == TYPE_CODE_ARRAY:
+            target = typ.target().strip_typedefs()
+            if target.code == TYPE_CODE_INT and target.sizeof == 1:
+                return _quote(value.string(errors='replace'))
+            return '{' + self.elements(
+                (lambda d, i=i: self.format(value[i], d)
+                 for i in range(typ._length)), depth) + '}'
+
+        return '{' + ', '.join(
+            '{} = {}'.format(field.name, self.format(value[field], depth))
+            for field in typ._fields) + '}'
+
+    def child(self, child, depth):
+        if isinstance(child, Value):
+            return self.format(child, depth)
+        if isinstance(child, str):
+            return _quote(child)
+        return str(child)
+
+    def printer(self, printer, depth):
+        text = None
+        if hasattr(printer, 'to_string'):
+            text = printer.to_string()
+            if isinstance(text, Value):
+                text = self.format(text, depth)
+        hint = printer.display_hint() \
+            if hasattr(printer, 'display_hint') else None
+        if hint == 'string' and isinstance(text, str):
+            text = _quote(text)
+        elif text is not None:
+            text = str(text)
+
+        if not hasattr(printer, 'children'):
+            return text if text is not None else ''
+        if depth == 0 or self.summary:
+            return (text + ' ' if text else '') + '{...}'
+        depth -= 1
+
+        children = printer.children()
+        if hint == 'map':
+            def pairs():
+                iterator = iter(children)
+                for _, key in iterator:
+                    _, item = next(iterator)
+                    yield lambda d, key=key, item=item: '[{}] = {}'.format(
+                        self.child(key, d), self.child(item, d))
+            items = pairs()
+        elif hint == 'array':
+            items = (lambda d, c=child: self.child(c, d)
+                     for _, child in children)
+        else:
+            items = (lambda d, n=name, c=child: '{} = {}'.format(
+                n, self.child(c, d)) for name, child in children)
+        body = self.elements(items, depth)
+        if not body:
+            # gdb prints no braces when there are no children
+            return text if text is not None else ''
+        return (text + ' ' if text else '') + '{' + body + '}'
+
+
+# Memory
+
+class Inferior:
+    """The (only) inferior, its memory is a set of mapped byte buffers
+
+    program.Program maps and fills them in, reading anything else raises
+    gdb.MemoryError like reading an unmapped address in a core would."""
+
+    def __init__(self, num, progspace):
+        self.num = num
+        self.pid = 0
+        self.progspace = progspace
+        self._starts = []
+        self._segments = []
+
+    def threads(self):
+        return ()
+
+    def map(self, address, size):
+        "Make [address, address + size) readable, zero filled"
+        index = bisect.bisect(self._starts, address)
+        self._starts.insert(index, address)
+        self._segments.insert(index, bytearray(size))
+
+    def unmap_all(self):
+        self._starts.clear()
+        self._segments.clear()
+
+    def _segment(self, address, length):
+        "The mapping holding [address, address + length) and the offset"
+        index = bisect.bisect(self._starts, address) - 1
+        if index >= 0:
+            segment = self._segments[index]
+            offset = address - self._starts[index]
+            if offset + length <= len(segment):
+                return segment, offset
+        raise MemoryError("Cannot access memory at address {:#x}"
+                          .format(address))
+
+    def read_memory(self, address, length):
+        address, length = int(address), int(length)
+        segment, offset = self._segment(address, length)
+        return memoryview(bytes(segment[offset:offset + length]))
+
+    def write_memory(self, address, buffer):
+        data = bytes(buffer)
+        segment, offset = self._segment(int(address), len(data))
+        segment[offset:offset + len(data)] = data
+
+    def _read_string(self, address, length=-1):
+        if length >= 0:
+            return bytes(self.read_memory(address, length))
+        segment, offset = self._segment(address, 1)
+        end = segment.find(b'\0', offset)
+        if end < 0:
+            raise MemoryError("Cannot access memory at address {:#x}"
+                              .format(address + len(segment) - offset))
+        return bytes(segment[offset:end])
+
+
+# Symbols, objfiles and program spaces
+
+class Symbol:
+    def __init__(self, name, type, address, static=False):
+        self.name = name
+        self.type = type
+        self._address = address
+        self._static = static
+
+    def value(self, frame=None):
+        return Value._make(self.type, self._address)
+
+
+class Objfile:
+    def __init__(self, filename, progspace, build_id=None):
+        self.filename = filename
+        self.progspace = progspace
+        self.build_id = build_id
+        self.owner = None
+        self.pretty_printers = []
+        self.frame_filters = {}
+        self._types = {}
+        self._symbols = {}
+        self._index = None
+
+    def is_valid(self):
+        return self in self.progspace._objfiles
+
+    def _add_symbol(self, symbol):
+        self._symbols[symbol.name] = symbol
+        self._index = None
+
+    def lookup_global_symbol(self, name, domain=None):
+        symbol = self._symbols.get(name)
+        if symbol is not None and not symbol._static:
+            return symbol
+        return None
+
+    def lookup_static_symbol(self, name, domain=None):
+        symbol = self._symbols.get(name)
+        if symbol is not None and symbol._static:
+            return symbol
+        return None
+
+    def _symbol_at(self, address):
+        if self._index is None:
+            self._index = sorted((symbol._address, symbol.name)
+                                 for symbol in self._symbols.values())
+        index = bisect.bisect(self._index, (address, '\U0010ffff')) - 1
+        if index < 0:
+            return None
+        start, name = self._index[index]
+        symbol = self._symbols[name]
+        size = max(symbol.type.strip_typedefs().sizeof, 1)
+        if address < start + size:
+            return symbol, address - start
+        return None
+
+
+class Progspace:
+    def __init__(self):
+        self.filename = None
+        self.pretty_printers = []
+        self._objfiles = []
+
+    def objfiles(self):
+        return list(self._objfiles)
+
+
+_progspace = Progspace()
+_inferior = Inferior(1, _progspace)
+
+
+def current_progspace():
+    return _progspace
+
+
+def selected_inferior():
+    return _inferior
+
+
+def objfiles():
+    return _progspace.objfiles()
+
+
+def lookup_global_symbol(name, domain=None):
+    for objfile in objfiles():
+        symbol = objfile.lookup_global_symbol(name, domain)
+        if symbol is not None:
+            return symbol
+    return None
+
+
+def lookup_static_symbol(name, domain=None):
+    for objfile in objfiles():
+        symbol = objfile.lookup_static_symbol(name, domain)
+        if symbol is not None:
+            return symbol
+    return None
+
+
+def lookup_symbol(name, block=None, domain=None):
+    symbol = lookup_global_symbol(name, domain) or \
+        lookup_static_symbol(name, domain)
+    return symbol, False
+
+
+def _symbol_at(address):
+    for objfile in objfiles():
+        found = objfile._symbol_at(address)
+        if found is not None:
+            return found
+    return None
+
+
+# Threads and frames, there are none
+
+def selected_thread():
+    return None
+
+
+def selected_frame():
+    raise error("No frame selected.")
+
+
+def newest_frame():
+    raise error("No stack.")
+
+
+frame_filters = {}
+
+
+# Pretty printers
+
+pretty_printers = []
+
+
+def _apply_printers(printers, value):
+    for function in printers:
+        if not getattr(function, 'enabled', True):
+            continue
+        printer = function(value)
+        if printer is not None:
+            return printer
+    return None
+
+
+def default_visualizer(value):
+    for objfile in objfiles():
+        printer = _apply_printers(objfile.pretty_printers, value)
+        if printer is not None:
+            return printer
+    return _apply_printers(_progspace.pretty_printers, value) or \
+        _apply_printers(pretty_printers, value)
+
+
+# Events
+
+class EventRegistry:
+    def __init__(self):
+        self._listeners = []
+
+    def connect(self, function):
+        self._listeners.append(function)
+
+    def disconnect(self, function):
+        if function in self._listeners:
+            self._listeners.remove(function)
+
+    def _emit(self, event):
+        for function in list(self._listeners):
+            function(event)
+
+
+events = _types.SimpleNamespace(**{name: EventRegistry() for name in (
+    'stop', 'cont', 'exited', 'new_objfile', 'clear_objfiles',
+    'free_objfile',
+)})
+
+
+def post_event(event):
+    # no event loop to wait for
+    event()
+
+
+# Parameters, 'print elements' is the one the extensions look at
+
+_DEFAULTS = {
+    'print elements': 200,
+}
+_parameters = dict(_DEFAULTS)
+
+
+def parameter(name):
+    name = ' '.join(name.split())
+    try:
+        return _parameters[name]
+    except KeyError:
+        raise RuntimeError("Could not find parameter `{}'.".format(name))
+
+
+# Commands
+
+_commands = {}
+
+
+class Command:
+    def __init__(self, name, command_class, completer_class=COMPLETE_NONE,
+                 prefix=False):
+        _commands[' '.join(name.split())] = self
+
+    def dont_repeat(self):
+        pass
+
+
+def string_to_argv(argument):
+    return shlex.split(argument)
+
+
+# what has been printed, for the $N
+_history = []
+
+
+def _print(expression):
+    value = parse_and_eval(expression)
+    _history.append(value)
+    text = _Formatter(False, parameter('print elements'), True, False) \
+        .format(value)
+    if value.type.strip_typedefs().code == TYPE_CODE_PTR and \
+            default_visualizer(value) is None:
+        text = '({}) {}'.format(value.type, text)
+    print('${} = {}'.format(len(_history), text))
+
+
+def _execute(command, from_tty):
+    for length in (3, 2, 1):
+        parts = command.split(None, length)
+        name = ' '.join(parts[:length])
+        if len(parts) >= length and name in _commands:
+            try:
+                _commands[name].invoke(parts[length] if len(parts) > length
+                                       else '', from_tty)
+            except GdbError as e:
+                # the message is all gdb shows of it
+                raise error(str(e)) from None
+            return
+
+    word, _, rest = command.partition(' ')
+    if word in ('print', 'p'):
+        _print(rest)
+    elif word == 'set' and rest.split()[:2] == ['print', 'elements']:
+        limit = rest.split()[-1]
+        if limit != 'unlimited' and not limit.isdigit():
+            raise error('integer {} out of range'.format(limit))
+        _parameters['print elements'] = None if limit in ('unlimited', '0') \
+            else int(limit)
+    elif command == 'show endian':
+        print("The target endianness is set automatically (currently "
+              "{} endian).".format(BYTE_ORDER))
+    else:
+        raise error('Undefined command: "{}".  Try "help".'.format(word))
+
+
+def execute(command, from_tty=False, to_string=False):
+    command = command.strip()
+    if not to_string:
+        _execute(command, from_tty)
+        return None
+    output = io.StringIO()
+    with contextlib.redirect_stdout(output):
+        _execute(command, from_tty)
+    return output.getvalue()
+
+
+# Expressions
+
+_expression_re = re.compile(r'''\s*
+    (?:\(\s*(?P<cast>[^()]+?)\s*\))?\s*     # (type)
+    (?P<unary>[*&\s]*)                      # applied right to left
+    (?P<primary>0[xX][0-9a-fA-F]+|\d+|[A-Za-z_]\w*)
+    (?P<postfix>(?:\s*(?:(?:\.|->)\s*[A-Za-z_]\w*|\[\s*\d+\s*\]))*)
+    \s*$''', re.VERBOSE)
+_postfix_re = re.compile(r'(?:\.|->)\s*([A-Za-z_]\w*)|\[\s*(\d+)\s*\]')
+
+
+def parse_and_eval(expression, global_context=False):
+    match = _expression_re.match(expression)
+    if not match:
+        raise error("A syntax error in expression, near `{}'."
+                    .format(expression.strip()))
+
+    primary = match.group('primary')
+    if primary[0].isdigit():
+        value = Value(int(primary, 0))
+    else:
+        symbol = lookup_symbol(primary)[0]
+        if symbol is None:
+            raise error('No symbol "{}" in current context.'.format(primary))
+        value = symbol.value()
+
+    for member, index in _postfix_re.findall(match.group('postfix')):
+        value = value[member or int(index)]
+
+    for op in reversed(match.group('unary').replace(' ', '')):
+        if op == '*':
+            value = value.dereference()
+        elif value.address is None:
+            raise error("Attempt to take address of value not located in "
+                        "memory.")
+        else:
+            value = value.address
+
+    if match.group('cast'):
+        value = value.cast(lookup_type(match.group('cast')))
+    return value
@@ -0,0 +1,6 @@
+"Frame filter plumbing, there are never any frames to filter here"
+
+
+def execute_frame_filters(frame, frame_low, frame_high):
+    # None means 'no filters apply, use the frames as they are'
+    return None
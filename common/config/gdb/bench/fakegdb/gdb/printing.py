@@ -0,0 +1,78 @@
+"Pretty printer registration, same interface as gdb's gdb.printing"
+
+import re
+
+import gdb
+import gdb.types
+
+
+class PrettyPrinter:
+    def __init__(self, name, subprinters=None):
+        self.name = name
+        self.subprinters = subprinters
+        self.enabled = True
+
+    def __call__(self, val):
+        raise NotImplementedError("PrettyPrinter __call__")
+
+
+class SubPrettyPrinter:
+    def __init__(self, name):
+        self.name = name
+        self.enabled = True
+
+
+class RegexpCollectionPrettyPrinter(PrettyPrinter):
+    "Printers chosen by a regexp search on the type's basic name"
+
+    class RegexpSubprinter(SubPrettyPrinter):
+        def __init__(self, name, regexp, gen_printer):
+            super().__init__(name)
+            self.regexp = regexp
+            self.gen_printer = gen_printer
+            self.compiled_re = re.compile(regexp)
+
+    def __init__(self, name):
+        super().__init__(name, [])
+
+    def add_printer(self, name, regexp, gen_printer):
+        self.subprinters.append(self.RegexpSubprinter(name, regexp,
+                                                      gen_printer))
+
+    def __call__(self, val):
+        typename = gdb.types.get_basic_type(val.type).tag
+        if not typename:
+            typename = val.type.name
+        if not typename:
+            return None
+
+        for printer in self.subprinters:
+            if printer.enabled and printer.compiled_re.search(typename):
+                return printer.gen_printer(val)
+        return None
+
+
+def register_pretty_printer(obj, printer, replace=False):
+    "Install printer with obj (an objfile, progspace, gdb or None)"
+    if not hasattr(printer, '__name__') and not hasattr(printer, 'name'):
+        raise TypeError("printer missing attribute: name")
+    if hasattr(printer, 'name') and not hasattr(printer, 'enabled'):
+        raise TypeError("printer missing attribute: enabled")
+    if not hasattr(printer, '__call__'):
+        raise TypeError("printer missing attribute: __call__")
+
+    if obj is None:
+        obj = gdb
+
+    if hasattr(printer, 'name'):
+        if ';' in printer.name:
+            raise ValueError("semicolon ';' in printer name")
+        for i, other in enumerate(obj.pretty_printers):
+            if getattr(other, 'name', None) == printer.name:
+                if not replace:
+                    raise RuntimeError("pretty-printer already registered: "
+                                       "{}".format(printer.name))
+                del obj.pretty_printers[i]
+                break
+
+    obj.pretty_printers.insert(0, printer)
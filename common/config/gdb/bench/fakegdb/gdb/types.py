@@ -0,0 +1,6 @@
+"Type utilities, same interface as gdb's gdb.types"
+
+
+def get_basic_type(type_):
+    "The type with typedefs removed, there are no references or qualifiers"
+    return type_.strip_typedefs()
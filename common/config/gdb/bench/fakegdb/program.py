@@ -0,0 +1,286 @@
+"""Describe a program for the fake gdb to look at
+
+Types are declared much like in C and laid out the way gcc does on x86-64,
+objects are allocated in the fake inferior's memory and filled in through
+gdb.Value.assign() (or keyword arguments for the common case):
+
+    import program
+    prog = program.Program('lloadd')
+    prog.struct('LloadConnection', typedef='LloadConnection')
+    prog.struct('lload_c_head', [
+        ('cqh_first', 'LloadConnection *'),
+        ('cqh_last', 'LloadConnection *'),
+    ])
+    prog.struct('LloadConnection', [
+        ('c_connid', 'unsigned long'),
+        ('c_next', prog.struct(None, [
+            ('cqe_next', 'LloadConnection *'),
+            ('cqe_prev', 'LloadConnection *'),
+        ])),
+    ])
+    clients = prog.variable('clients', 'struct lload_c_head')
+    conn = prog.new('LloadConnection', c_connid=1)
+    prog.load()
+
+load() makes the objfile visible to gdb and announces it with a
+new_objfile event, registering printers against it is up to the caller
+(as the auto_load handlers would). stop() tells the extensions the
+inferior has moved on so that whatever they cache per stop is dropped.
+"""
+
+import types
+
+import gdb
+
+
+# where the next mapping goes, shared by all programs
+_cursor = 0x400000
+CHUNK = 1 << 20
+
+
+def _align(value, alignment):
+    return (value + alignment - 1) // alignment * alignment
+
+
+class Arena:
+    "Bump allocator over chunks of the inferior's memory"
+
+    def __init__(self):
+        self.next = self.end = 0
+
+    def alloc(self, size, alignment=16):
+        global _cursor
+
+        address = _align(self.next, alignment)
+        if not self.next or address + size > self.end:
+            chunk = _align(max(size, CHUNK), 0x1000)
+            gdb.selected_inferior().map(_cursor, chunk)
+            address, self.end = _cursor, _cursor + chunk
+            # leave a hole so that running off the end is noticed
+            _cursor += chunk + 0x1000
+        self.next = address + max(size, 1)
+        return address
+
+
+class Program:
+    """Types, symbols and memory of one objfile
+
+    Type arguments can be gdb.Type objects or C spellings ('char *',
+    'struct berval', 'LloadConnection **', 'char [16]').
+    """
+
+    def __init__(self, filename='a.out', build_id=None):
+        self.objfile = gdb.Objfile(filename, gdb.current_progspace(),
+                                   build_id)
+        self.text = Arena()
+        self.data = Arena()
+        self.heap = Arena()
+
+    # types
+
+    def type(self, spec):
+        if isinstance(spec, gdb.Type):
+            return spec
+
+        def lookup(name):
+            typ = self.objfile._types.get(name)
+            if typ is None:
+                for objfile in gdb.objfiles():
+                    typ = objfile._types.get(name)
+                    if typ is not None:
+                        break
+            return typ
+
+        typ = gdb._parse_type(spec, lookup)
+        if typ is None:
+            raise gdb.error("No type named {}.".format(spec))
+        return typ
+
+    def _composite(self, kind, code, name):
+        key = '{} {}'.format(kind, name)
+        typ = self.objfile._types.get(key) if name else None
+        if typ is None:
+            typ = gdb.Type(code, name=name, tag=name)
+            if name:
+                self.objfile._types[key] = typ
+        return typ
+
+    def struct(self, name, fields=None, typedef=None, union=False):
+        """Declare struct name, laying it out if fields are given
+
+        fields is a list of (name, type) pairs. Call without fields first
+        to refer to the struct before it is complete. Returns the struct
+        type (not the typedef).
+        """
+        kind, code = ('union', gdb.TYPE_CODE_UNION) if union \
+            else ('struct', gdb.TYPE_CODE_STRUCT)
+        typ = self._composite(kind, code, name)
+        if typedef:
+            self.typedef(typedef, typ)
+        if fields is not None:
+            if typ._fields:
+                raise ValueError("{} is complete already".format(typ))
+            self._layout(typ, fields, union)
+        return typ
+
+    def union(self, name, fields=None, typedef=None):
+        return self.struct(name, fields, typedef, union=True)
+
+    def _layout(self, typ, fields, union):
+        members = []
+        offset = size = 0
+        alignment = 1
+
+        for name, ftype in fields:
+            ftype = self.type(ftype)
+            base = ftype.strip_typedefs()
+            if base.code in (gdb.TYPE_CODE_STRUCT, gdb.TYPE_CODE_UNION) \
+                    and not base._fields:
+                raise ValueError("field {} has incomplete type {}".format(
+                    name, ftype))
+
+            alignment = max(alignment, base.alignof)
+            if union:
+                position = 0
+                size = max(size, base.sizeof)
+            else:
+                position = offset = _align(offset, base.alignof)
+                offset += base.sizeof
+            members.append(gdb.Field(name, ftype, bitpos=8 * position))
+
+        if not union:
+            size = offset
+        typ.complete(members, _align(size, alignment), alignment)
+
+    def enum(self, name, values, typedef=None):
+        """Declare an enum, values is a list of names (numbered from 0),
+        of (name, value) pairs or a dict"""
+        if isinstance(values, dict):
+            values = list(values.items())
+        values = [(value, i) if isinstance(value, str) else value
+                  for i, value in enumerate(values)]
+
+        typ = self._composite('enum', gdb.TYPE_CODE_ENUM, name)
+        typ._signed = any(number < 0 for _, number in values)
+        size = 8 if any(number >= 1 << 32 or number < -(1 << 31)
+                        for _, number in values) else 4
+        typ.complete([gdb.Field(enumerator, typ, enumval=number)
+                      for enumerator, number in values], size, size)
+        if typedef:
+            self.typedef(typedef, typ)
+        return typ
+
+    def typedef(self, name, spec):
+        typ = gdb.Type(gdb.TYPE_CODE_TYPEDEF, name=name,
+                       target=self.type(spec))
+        self.objfile._types[name] = typ
+        return typ
+
+    def function_type(self, returns='void', args=()):
+        return gdb.Type(gdb.TYPE_CODE_FUNC, sizeof=1, alignof=1,
+                        target=self.type(returns),
+                        fields=[gdb.Field(None, self.type(arg))
+                                for arg in args])
+
+    # symbols and memory
+
+    def _symbol(self, name, typ, address, static):
+        symbol = gdb.Symbol(name, typ, address, static)
+        self.objfile._add_symbol(symbol)
+        return symbol
+
+    def function(self, name, returns='void', args=(), static=False):
+        "Define a function, returns its value (assignable to pointers)"
+        typ = self.function_type(returns, args)
+        address = self.text.alloc(16)
+        return self._symbol(name, typ, address, static).value()
+
+    def variable(self, name, spec, static=False, **fields):
+        "Define a global variable, returns it as an lvalue"
+        typ = self.type(spec)
+        address = self.data.alloc(typ.sizeof, max(typ.alignof, 1))
+        value = self._symbol(name, typ, address, static).value()
+        fill(value, fields)
+        return value
+
+    def alloc(self, spec, count=1):
+        "Allocate zeroed memory for count objects, returns the address"
+        typ = self.type(spec)
+        return self.heap.alloc(typ.sizeof * count, max(typ.alignof, 16))
+
+    def new(self, spec, **fields):
+        "Allocate and fill in an object, returns a pointer to it"
+        typ = self.type(spec)
+        pointer = gdb.Value._from_int(typ.pointer(), self.alloc(typ))
+        fill(pointer.dereference(), fields)
+        return pointer
+
+    def string(self, text):
+        "A NUL terminated copy of text, returns a char pointer"
+        data = text.encode() if isinstance(text, str) else bytes(text)
+        address = self.heap.alloc(len(data) + 1, 1)
+        gdb.selected_inferior().write_memory(address, data)
+        return gdb.Value._from_int(self.type('char').pointer(), address)
+
+    # lifetime
+
+    def load(self):
+        "Make the objfile known to gdb, the way loading a file would"
+        progspace = self.objfile.progspace
+        if self.objfile not in progspace._objfiles:
+            progspace._objfiles.append(self.objfile)
+            if progspace.filename is None:
+                progspace.filename = self.objfile.filename
+            gdb.events.new_objfile._emit(types.SimpleNamespace(
+                new_objfile=self.objfile))
+        return self.objfile
+
+    def unload(self):
+        progspace = self.objfile.progspace
+        if self.objfile in progspace._objfiles:
+            gdb.events.free_objfile._emit(types.SimpleNamespace(
+                objfile=self.objfile))
+            progspace._objfiles.remove(self.objfile)
+
+
+def fill(value, fields):
+    """Assign fields (a dict) to the members of value
+
+    Dicts fill in nested structures, lists the elements of arrays,
+    anything else is handed to gdb.Value.assign()."""
+    for name, field in fields.items():
+        member = value[name]
+        if isinstance(field, dict):
+            fill(member, field)
+        elif isinstance(field, (list, tuple)):
+            for i, element in enumerate(field):
+                if isinstance(element, dict):
+                    fill(member[i], element)
+                else:
+                    member[i].assign(element)
+        else:
+            member.assign(field)
+
+
+def stop():
+    "Pretend the inferior ran and stopped again"
+    gdb.events.cont._emit(types.SimpleNamespace(inferior_thread=None))
+    gdb.events.stop._emit(types.SimpleNamespace(inferior_thread=None))
+
+
+def reset():
+    "Forget every program, its memory, printers and settings"
+    global _cursor
+
+    progspace = gdb.current_progspace()
+    gdb.events.clear_objfiles._emit(types.SimpleNamespace(
+        progspace=progspace))
+    progspace._objfiles.clear()
+    progspace.filename = None
+    progspace.pretty_printers.clear()
+    gdb.pretty_printers.clear()
+    gdb.selected_inferior().unmap_all()
+    gdb._parameters.clear()
+    gdb._parameters.update(gdb._DEFAULTS)
+    gdb._history.clear()
+    _cursor = 0x400000
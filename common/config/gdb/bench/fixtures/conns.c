@@ -0,0 +1,252 @@
+/*
+ * lloadd-like connection lists, for lload-census/find-conn and printers
+ *
+ * conns N [OPS]: N client connections with OPS operations each in their
+ * c_ops trees and a backend with N/10 upstream connections
+ *
+ * Only the fields the extensions look at are reproduced, with the names
+ * and types lloadd uses.
+ */
+#include <stdint.h>
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <sys/queue.h>
+#include <unistd.h>
+
+typedef unsigned long ber_tag_t;
+typedef unsigned long ber_len_t;
+
+struct berval {
+	ber_len_t bv_len;
+	char *bv_val;
+};
+
+#define AVL_CHILD 0
+#define AVL_THREAD 1
+
+typedef struct tavlnode {
+	void *avl_data;
+	struct tavlnode *avl_link[2];
+	char avl_bits[2];
+	signed char avl_bf;
+} TAvlnode;
+
+enum sc_state {
+	LLOAD_C_INVALID = 0,
+	LLOAD_C_READY,
+	LLOAD_C_CLOSING,
+	LLOAD_C_ACTIVE,
+	LLOAD_C_BINDING,
+	LLOAD_C_DYING,
+};
+
+enum sc_conn_type {
+	LLOAD_C_OPEN = 0,
+	LLOAD_C_PREPARING,
+	LLOAD_C_BIND,
+	LLOAD_C_PRIVILEGED,
+};
+
+enum op_restriction {
+	LLOAD_OP_NOT_RESTRICTED = 0,
+	LLOAD_OP_RESTRICTED_WRITE,
+	LLOAD_OP_RESTRICTED_BACKEND,
+	LLOAD_OP_RESTRICTED_UPSTREAM,
+	LLOAD_OP_RESTRICTED_ISOLATE,
+};
+
+typedef struct LloadConnection LloadConnection;
+typedef struct LloadOperation LloadOperation;
+typedef struct LloadBackend LloadBackend;
+
+CIRCLEQ_HEAD(lload_c_head, LloadConnection);
+
+struct LloadConnection {
+	enum sc_state c_state;
+	enum sc_conn_type c_type;
+	uintptr_t c_refcnt, c_live;
+	void (*c_destroy)( LloadConnection *c );
+
+	unsigned long c_connid;
+
+	TAvlnode *c_ops;
+	long c_n_ops_executing;
+
+	enum op_restriction c_restricted;
+	unsigned long c_restricted_inflight;
+	unsigned long c_pin_id;
+
+	void *c_currentber;
+	void *c_pendingber;
+
+	LloadBackend *c_backend;
+	CIRCLEQ_ENTRY(LloadConnection) c_next;
+	void *c_private;
+};
+
+struct LloadOperation {
+	LloadConnection *o_client;
+	unsigned long o_client_connid;
+	int o_client_msgid;
+	int o_saved_msgid;
+
+	LloadConnection *o_upstream;
+	unsigned long o_upstream_connid;
+	int o_upstream_msgid;
+
+	ber_tag_t o_tag;
+	unsigned long o_pin_id;
+	struct berval o_ctrls;
+};
+
+struct LloadBackend {
+	struct berval b_name;
+
+	int b_numconns, b_numbindconns;
+	int b_bindavail, b_active, b_opening, b_failed;
+	struct lload_c_head b_conns, b_bindconns, b_preparing;
+	LIST_HEAD(ConnectingSt, LloadPendingConnection) b_connecting;
+	LloadConnection *b_last_conn, *b_last_bindconn;
+
+	long b_max_pending, b_n_ops_executing;
+
+	CIRCLEQ_ENTRY(LloadBackend) b_next;
+};
+
+struct lload_c_head clients;
+CIRCLEQ_HEAD(lload_b_head, LloadBackend) backend;
+
+void
+client_destroy( LloadConnection *c )
+{
+}
+
+void
+upstream_destroy( LloadConnection *c )
+{
+}
+
+/* makes gdb.py treat us as lloadd and register its printers */
+void
+lload_start_daemon( void )
+{
+}
+
+static unsigned long next_connid;
+
+static LloadConnection *
+connection_new( void (*destroy)( LloadConnection * ) )
+{
+	LloadConnection *c = calloc( 1, sizeof(LloadConnection) );
+
+	c->c_connid = next_connid++;
+	c->c_state = LLOAD_C_READY;
+	c->c_refcnt = 1;
+	c->c_live = 1;
+	c->c_destroy = destroy;
+	return c;
+}
+
+/* balanced threaded tree over nodes[lo..hi) */
+static TAvlnode *
+tavl_build( TAvlnode *nodes, int lo, int hi, TAvlnode *prev, TAvlnode *next )
+{
+	int mid = ( lo + hi ) / 2;
+	TAvlnode *node = &nodes[mid];
+
+	if ( mid > lo ) {
+		node->avl_link[0] = tavl_build( nodes, lo, mid, prev, node );
+		node->avl_bits[0] = AVL_CHILD;
+	} else {
+		node->avl_link[0] = prev;
+		node->avl_bits[0] = AVL_THREAD;
+	}
+	if ( mid + 1 < hi ) {
+		node->avl_link[1] = tavl_build( nodes, mid + 1, hi, node, next );
+		node->avl_bits[1] = AVL_CHILD;
+	} else {
+		node->avl_link[1] = next;
+		node->avl_bits[1] = AVL_THREAD;
+	}
+	return node;
+}
+
+static void
+add_operations( LloadConnection *client, LloadConnection *upstream, int n )
+{
+	TAvlnode *nodes;
+	int i;
+
+	if ( !n ) return;
+
+	nodes = calloc( n, sizeof(TAvlnode) );
+	for ( i = 0; i < n; i++ ) {
+		LloadOperation *op = calloc( 1, sizeof(LloadOperation) );
+
+		op->o_client = client;
+		op->o_client_connid = client->c_connid;
+		op->o_client_msgid = i + 1;
+		op->o_upstream = upstream;
+		op->o_upstream_connid = upstream ? upstream->c_connid : 0;
+		op->o_upstream_msgid = upstream ? i + 1 : 0;
+		op->o_tag = 0x63; /* search request */
+		nodes[i].avl_data = op;
+	}
+	client->c_ops = tavl_build( nodes, 0, n, NULL, NULL );
+	client->c_n_ops_executing = n;
+}
+
+int
+main( int argc, char **argv )
+{
+	LloadBackend *b;
+	LloadConnection *upstream = NULL;
+	int i, n, ops = 0;
+
+	if ( argc < 2 ) {
+		fprintf( stderr, "usage: %s N [OPS]\n", argv[0] );
+		return 1;
+	}
+	n = atoi( argv[1] );
+	if ( argc > 2 ) ops = atoi( argv[2] );
+
+	CIRCLEQ_INIT( &clients );
+	CIRCLEQ_INIT( &backend );
+
+	b = calloc( 1, sizeof(LloadBackend) );
+	b->b_name.bv_val = "bench";
+	b->b_name.bv_len = strlen( b->b_name.bv_val );
+	b->b_max_pending = 100;
+	CIRCLEQ_INIT( &b->b_conns );
+	CIRCLEQ_INIT( &b->b_bindconns );
+	CIRCLEQ_INIT( &b->b_preparing );
+	CIRCLEQ_INSERT_TAIL( &backend, b, b_next );
+
+	for ( i = 0; i < n / 10 + 1; i++ ) {
+		upstream = connection_new( upstream_destroy );
+		upstream->c_backend = b;
+		CIRCLEQ_INSERT_TAIL( &b->b_conns, upstream, c_next );
+		b->b_numconns++;
+		b->b_active++;
+	}
+	b->b_last_conn = upstream;
+
+	for ( i = 0; i < n; i++ ) {
+		LloadConnection *c = connection_new( client_destroy );
+
+		/* a few of the interesting cases */
+		if ( i % 100 == 1 ) c->c_pin_id = i;
+		if ( i % 250 == 2 ) c->c_restricted = LLOAD_OP_RESTRICTED_WRITE;
+		if ( i % 500 == 3 ) c->c_state = LLOAD_C_CLOSING;
+
+		add_operations( c, upstream, ops );
+		b->b_n_ops_executing += ops;
+		CIRCLEQ_INSERT_TAIL( &clients, c, c_next );
+	}
+
+	printf( "ready\n" );
+	fflush( stdout );
+	pause();
+	return 0;
+}
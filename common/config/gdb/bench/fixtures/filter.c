@@ -0,0 +1,63 @@
+/*
+ * A wide OR filter like (|(uid=...)(uid=...)...) for the Filter printers
+ *
+ * filter N: the top level OR has N components, linked through f_next
+ *
+ * Components are SLAPD_FILTER_COMPUTED so no schema needs reproducing.
+ */
+#include <stdio.h>
+#include <stdlib.h>
+#include <unistd.h>
+
+typedef unsigned long ber_tag_t;
+
+#define SLAPD_FILTER_COMPUTED 0
+#define LDAP_FILTER_OR 0xa1
+
+typedef struct Filter {
+	ber_tag_t f_choice;
+	union f_un_u {
+		int f_un_result;
+		struct Filter *f_un_complex;
+		void *f_un_ava;
+		void *f_un_ssa;
+		void *f_un_mra;
+		void *f_un_desc;
+	} f_un;
+	struct Filter *f_next;
+} Filter;
+
+Filter *filter;
+
+/* makes gdb.py treat us as slapd and register its printers */
+char *slap_known_controls[] = { NULL };
+
+int
+main( int argc, char **argv )
+{
+	Filter **tail;
+	int i, n;
+
+	if ( argc != 2 ) {
+		fprintf( stderr, "usage: %s N\n", argv[0] );
+		return 1;
+	}
+	n = atoi( argv[1] );
+
+	filter = calloc( 1, sizeof(Filter) );
+	filter->f_choice = LDAP_FILTER_OR;
+	tail = &filter->f_un.f_un_complex;
+	for ( i = 0; i < n; i++ ) {
+		Filter *f = calloc( 1, sizeof(Filter) );
+
+		f->f_choice = SLAPD_FILTER_COMPUTED;
+		f->f_un.f_un_result = i % 3;
+		*tail = f;
+		tail = &f->f_next;
+	}
+
+	printf( "ready\n" );
+	fflush( stdout );
+	pause();
+	return 0;
+}
@@ -0,0 +1,76 @@
+/*
+ * Threads stuck on pthread mutexes, for deadlock/lockstat/bt
+ *
+ * locks convoy N: main holds a mutex, N threads queue up behind it
+ * locks cycle N: N threads each hold a mutex and wait for the next one's
+ */
+#include <pthread.h>
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <unistd.h>
+
+static int nthreads;
+static pthread_mutex_t *mutexes;
+static pthread_barrier_t barrier;
+
+static void *
+convoy_waiter( void *arg )
+{
+	pthread_mutex_lock( &mutexes[0] );
+	return NULL;
+}
+
+static void *
+cycle_member( void *arg )
+{
+	long i = (long)arg;
+
+	pthread_mutex_lock( &mutexes[i] );
+	pthread_barrier_wait( &barrier );
+	pthread_mutex_lock( &mutexes[( i + 1 ) % nthreads] );
+	return NULL;
+}
+
+int
+main( int argc, char **argv )
+{
+	pthread_attr_t attr;
+	pthread_t tid;
+	int cycle;
+	long i;
+
+	if ( argc != 3 ) {
+		fprintf( stderr, "usage: %s convoy|cycle N\n", argv[0] );
+		return 1;
+	}
+	cycle = !strcmp( argv[1], "cycle" );
+	nthreads = atoi( argv[2] );
+
+	mutexes = calloc( nthreads, sizeof(pthread_mutex_t) );
+	for ( i = 0; i < nthreads; i++ ) {
+		pthread_mutex_init( &mutexes[i], NULL );
+	}
+
+	/* keep the cores small */
+	pthread_attr_init( &attr );
+	pthread_attr_setstacksize( &attr, 64 * 1024 );
+
+	if ( cycle ) {
+		pthread_barrier_init( &barrier, NULL, nthreads );
+	} else {
+		pthread_mutex_lock( &mutexes[0] );
+	}
+
+	for ( i = 0; i < nthreads; i++ ) {
+		pthread_create( &tid, &attr, cycle ? cycle_member : convoy_waiter,
+				(void *)i );
+	}
+
+	/* give everyone time to get stuck */
+	sleep( 1 );
+	printf( "ready\n" );
+	fflush( stdout );
+	pause();
+	return 0;
+}
@@ -0,0 +1,165 @@
+/*
+ * A libldap thread pool with a backlog, for the pool command
+ *
+ * pool N [QUEUES] [paused]: N pending tasks spread over QUEUES (4) work
+ * queues, with the pool paused if asked to
+ *
+ * The structures follow libldap/tpool.c.
+ */
+#include <pthread.h>
+#include <stdio.h>
+#include <stdlib.h>
+#include <string.h>
+#include <sys/queue.h>
+#include <unistd.h>
+
+typedef void *(ldap_pvt_thread_start_t)( void *ctx, void *arg );
+
+typedef struct ldap_int_thread_task_s {
+	union {
+		STAILQ_ENTRY(ldap_int_thread_task_s) q;
+		SLIST_ENTRY(ldap_int_thread_task_s) l;
+	} ltt_next;
+	ldap_pvt_thread_start_t *ltt_start_routine;
+	void *ltt_arg;
+	struct ldap_int_thread_poolq_s *ltt_queue;
+} ldap_int_thread_task_t;
+
+typedef STAILQ_HEAD(tcq, ldap_int_thread_task_s) ldap_int_tpool_plist_t;
+
+struct ldap_int_thread_poolq_s {
+	void *ltp_free;
+	struct ldap_int_thread_pool_s *ltp_pool;
+	pthread_mutex_t ltp_mutex;
+	pthread_cond_t ltp_cond;
+	ldap_int_tpool_plist_t *ltp_work_list;
+	ldap_int_tpool_plist_t ltp_pending_list;
+	SLIST_HEAD(tcl, ldap_int_thread_task_s) ltp_free_list;
+	int ltp_max_count;
+	int ltp_max_pending;
+	int ltp_pending_count;
+	int ltp_active_count;
+	int ltp_open_count;
+	int ltp_starting;
+};
+
+struct ldap_int_thread_pool_s {
+	STAILQ_ENTRY(ldap_int_thread_pool_s) ltp_next;
+	struct ldap_int_thread_poolq_s **ltp_wqs;
+	int ltp_numqs;
+	pthread_mutex_t ltp_mutex;
+	pthread_cond_t ltp_cond;
+	pthread_cond_t ltp_pcond;
+	int ltp_finishing;
+	int ltp_pause;
+	int ltp_max_count;
+	int ltp_conf_max_count;
+	int ltp_max_pending;
+	int ltp_pending_count;
+	int ltp_active_count;
+	int ltp_open_count;
+	int ltp_starting;
+	int ltp_active_queues;
+};
+
+typedef struct ldap_int_thread_pool_s *ldap_pvt_thread_pool_t;
+
+/* what ltp_work_list points at while the pool is paused */
+static ldap_int_tpool_plist_t empty_pending_list =
+	STAILQ_HEAD_INITIALIZER(empty_pending_list);
+
+STAILQ_HEAD(tpq, ldap_int_thread_pool_s) ldap_int_thread_pool_list;
+ldap_pvt_thread_pool_t connection_pool;
+
+void *
+connection_read_thread( void *ctx, void *arg )
+{
+	return NULL;
+}
+
+void *
+connection_operation( void *ctx, void *arg )
+{
+	return NULL;
+}
+
+void *
+syncrepl_task( void *ctx, void *arg )
+{
+	return NULL;
+}
+
+/* makes gdb.py treat us as libldap and register its printers */
+int
+ldap_pvt_thread_pool_submit( ldap_pvt_thread_pool_t *pool,
+		ldap_pvt_thread_start_t *start, void *arg )
+{
+	return 0;
+}
+
+static ldap_pvt_thread_start_t *routines[] = {
+	connection_read_thread,
+	connection_read_thread,
+	connection_operation,
+	syncrepl_task,
+};
+
+int
+main( int argc, char **argv )
+{
+	struct ldap_int_thread_pool_s *pool;
+	int i, n, numqs = 4, paused;
+
+	if ( argc < 2 ) {
+		fprintf( stderr, "usage: %s N [QUEUES] [paused]\n", argv[0] );
+		return 1;
+	}
+	n = atoi( argv[1] );
+	if ( argc > 2 ) numqs = atoi( argv[2] );
+	paused = argc > 3 && !strcmp( argv[3], "paused" );
+
+	STAILQ_INIT( &ldap_int_thread_pool_list );
+
+	pool = calloc( 1, sizeof(*pool) );
+	pthread_mutex_init( &pool->ltp_mutex, NULL );
+	pool->ltp_numqs = numqs;
+	pool->ltp_pause = paused ? 2 : 0;
+	pool->ltp_max_count = 16 * numqs;
+	pool->ltp_conf_max_count = pool->ltp_max_count;
+	pool->ltp_max_pending = 2 * n;
+	pool->ltp_wqs = calloc( numqs, sizeof(*pool->ltp_wqs) );
+	for ( i = 0; i < numqs; i++ ) {
+		struct ldap_int_thread_poolq_s *pq = calloc( 1, sizeof(*pq) );
+
+		pq->ltp_pool = pool;
+		pthread_mutex_init( &pq->ltp_mutex, NULL );
+		STAILQ_INIT( &pq->ltp_pending_list );
+		pq->ltp_work_list = paused ?
+			&empty_pending_list : &pq->ltp_pending_list;
+		pq->ltp_max_count = 16;
+		pq->ltp_max_pending = pool->ltp_max_pending / numqs;
+		pq->ltp_active_count = pq->ltp_open_count = 16;
+		pool->ltp_active_count += 16;
+		pool->ltp_open_count += 16;
+		pool->ltp_wqs[i] = pq;
+	}
+
+	for ( i = 0; i < n; i++ ) {
+		struct ldap_int_thread_poolq_s *pq = pool->ltp_wqs[i % numqs];
+		ldap_int_thread_task_t *task = calloc( 1, sizeof(*task) );
+
+		task->ltt_start_routine = routines[i % 4];
+		task->ltt_queue = pq;
+		STAILQ_INSERT_TAIL( &pq->ltp_pending_list, task, ltt_next.q );
+		pq->ltp_pending_count++;
+		pool->ltp_pending_count++;
+	}
+
+	STAILQ_INSERT_TAIL( &ldap_int_thread_pool_list, pool, ltp_next );
+	connection_pool = pool;
+
+	printf( "ready\n" );
+	fflush( stdout );
+	pause();
+	return 0;
+}
@@ -0,0 +1,459 @@
+#!/usr/bin/env python3
+"""Micro-benchmarks of the printers and commands without a debugger
+
+Lays out the same structures as the C fixtures straight in the fake gdb's
+memory (see fakegdb/) and times the extensions in this very process, no
+gcc, gdb or cores needed and each run takes moments:
+
+    ~/.gdb/bench/micro.py -o before.json
+    ... hack ...
+    ~/.gdb/bench/micro.py --compare before.json
+    python3 -m cProfile -s cumtime ~/.gdb/bench/micro.py conns -n 10000
+
+Scenarios, sizes, commands and the results format are shared with
+bench.py so the numbers can be compared the same way. The lock scenarios
+need threads and are left to bench.py.
+"""
+
+import argparse
+import json
+import os
+import runpy
+import sys
+
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+GDB_DIR = os.path.dirname(BENCH_DIR)
+
+sys.path[:0] = [os.path.join(BENCH_DIR, 'fakegdb'), GDB_DIR, BENCH_DIR]
+
+import gdb  # noqa: E402
+import program  # noqa: E402
+
+import bench  # noqa: E402
+
+
+def circleq(head, elements, field):
+    "Link elements (pointers) on the CIRCLEQ at head"
+    end = head.address.cast(head['cqh_first'].type)
+    for i, element in enumerate(elements):
+        element[field]['cqe_next'].assign(
+            elements[i + 1] if i + 1 < len(elements) else end)
+        element[field]['cqe_prev'].assign(elements[i - 1] if i else end)
+    head['cqh_first'].assign(elements[0] if elements else end)
+    head['cqh_last'].assign(elements[-1] if elements else end)
+
+
+def tavl(nodes, lo, hi, prev, next):
+    "Balanced threaded tree over nodes[lo:hi], as tavl_build() in conns.c"
+    mid = (lo + hi) // 2
+    node = nodes[mid]
+    for side, (start, end, neighbour) in enumerate(((lo, mid, prev),
+                                                    (mid + 1, hi, next))):
+        if start < end:
+            child = tavl(nodes, start, end, *(
+                (prev, node) if side == 0 else (node, next)))
+            node['avl_link'][side].assign(child)
+            node['avl_bits'][side].assign(0)
+        else:
+            node['avl_link'][side].assign(neighbour)
+            node['avl_bits'][side].assign(1)
+    return node
+
+
+def conns(n, ops=4):
+    "lloadd connections like fixtures/conns.c"
+    p = program.Program('conns')
+
+    p.typedef('uintptr_t', 'unsigned long')
+    p.struct('berval', [('bv_len', 'unsigned long'), ('bv_val', 'char *')])
+    p.struct('tavlnode', typedef='TAvlnode')
+    p.struct('tavlnode', [
+        ('avl_data', 'void *'),
+        ('avl_link', 'TAvlnode *[2]'),
+        ('avl_bits', 'char [2]'),
+        ('avl_bf', 'signed char'),
+    ])
+    p.enum('sc_state', ['LLOAD_C_INVALID', 'LLOAD_C_READY', 'LLOAD_C_CLOSING',
+                        'LLOAD_C_ACTIVE', 'LLOAD_C_BINDING', 'LLOAD_C_DYING'])
+    p.enum('sc_conn_type', ['LLOAD_C_OPEN', 'LLOAD_C_PREPARING',
+                            'LLOAD_C_BIND', 'LLOAD_C_PRIVILEGED'])
+    p.enum('op_restriction', [
+        'LLOAD_OP_NOT_RESTRICTED', 'LLOAD_OP_RESTRICTED_WRITE',
+        'LLOAD_OP_RESTRICTED_BACKEND', 'LLOAD_OP_RESTRICTED_UPSTREAM',
+        'LLOAD_OP_RESTRICTED_ISOLATE'])
+
+    p.struct('LloadConnection', typedef='LloadConnection')
+    p.struct('LloadOperation', typedef='LloadOperation')
+    p.struct('LloadBackend', typedef='LloadBackend')
+    p.struct('LloadPendingConnection')
+    p.struct('lload_c_head', [
+        ('cqh_first', 'LloadConnection *'),
+        ('cqh_last', 'LloadConnection *'),
+    ])
+    p.struct('LloadConnection', [
+        ('c_state', 'enum sc_state'),
+        ('c_type', 'enum sc_conn_type'),
+        ('c_refcnt', 'uintptr_t'),
+        ('c_live', 'uintptr_t'),
+        ('c_destroy',
+         p.function_type('void', ['LloadConnection *']).pointer()),
+        ('c_connid', 'unsigned long'),
+        ('c_ops', 'TAvlnode *'),
+        ('c_n_ops_executing', 'long'),
+        ('c_restricted', 'enum op_restriction'),
+        ('c_restricted_inflight', 'unsigned long'),
+        ('c_pin_id', 'unsigned long'),
+        ('c_currentber', 'void *'),
+        ('c_pendingber', 'void *'),
+        ('c_backend', 'LloadBackend *'),
+        ('c_next', p.struct(None, [
+            ('cqe_next', 'LloadConnection *'),
+            ('cqe_prev', 'LloadConnection *'),
+        ])),
+        ('c_private', 'void *'),
+    ])
+    p.struct('LloadOperation', [
+        ('o_client', 'LloadConnection *'),
+        ('o_client_connid', 'unsigned long'),
+        ('o_client_msgid', 'int'),
+        ('o_saved_msgid', 'int'),
+        ('o_upstream', 'LloadConnection *'),
+        ('o_upstream_connid', 'unsigned long'),
+        ('o_upstream_msgid', 'int'),
+        ('o_tag', 'unsigned long'),
+        ('o_pin_id', 'unsigned long'),
+        ('o_ctrls', 'struct berval'),
+    ])
+    p.struct('LloadBackend', [
+        ('b_name', 'struct berval'),
+        ('b_numconns', 'int'),
+        ('b_numbindconns', 'int'),
+        ('b_bindavail', 'int'),
+        ('b_active', 'int'),
+        ('b_opening', 'int'),
+        ('b_failed', 'int'),
+        ('b_conns', 'struct lload_c_head'),
+        ('b_bindconns', 'struct lload_c_head'),
+        ('b_preparing', 'struct lload_c_head'),
+        ('b_connecting', p.struct('ConnectingSt', [
+            ('lh_first', 'struct LloadPendingConnection *')])),
+        ('b_last_conn', 'LloadConnection *'),
+        ('b_last_bindconn', 'LloadConnection *'),
+        ('b_max_pending', 'long'),
+        ('b_n_ops_executing', 'long'),
+        ('b_next', p.struct(None, [
+            ('cqe_next', 'LloadBackend *'),
+            ('cqe_prev', 'LloadBackend *'),
+        ])),
+    ])
+    p.struct('lload_b_head', [
+        ('cqh_first', 'LloadBackend *'),
+        ('cqh_last', 'LloadBackend *'),
+    ])
+
+    client_destroy = p.function('client_destroy', 'void',
+                                ['LloadConnection *'])
+    upstream_destroy = p.function('upstream_destroy', 'void',
+                                  ['LloadConnection *'])
+    p.function('lload_start_daemon')
+    clients = p.variable('clients', 'struct lload_c_head')
+    backend = p.variable('backend', 'struct lload_b_head')
+
+    b = p.new('LloadBackend', b_max_pending=100, b_name={
+        'bv_val': p.string('bench'), 'bv_len': len('bench')})
+    circleq(b['b_bindconns'], [], 'c_next')
+    circleq(b['b_preparing'], [], 'c_next')
+    circleq(backend, [b], 'b_next')
+
+    connid = 0
+    upstreams = []
+    for _ in range(n // 10 + 1):
+        upstreams.append(p.new('LloadConnection', c_connid=connid,
+                               c_state='LLOAD_C_READY', c_refcnt=1, c_live=1,
+                               c_destroy=upstream_destroy, c_backend=b))
+        connid += 1
+    circleq(b['b_conns'], upstreams, 'c_next')
+    b['b_numconns'].assign(len(upstreams))
+    b['b_active'].assign(len(upstreams))
+    upstream = upstreams[-1]
+    b['b_last_conn'].assign(upstream)
+
+    connections = []
+    for i in range(n):
+        c = p.new('LloadConnection', c_connid=connid, c_state='LLOAD_C_READY',
+                  c_refcnt=1, c_live=1, c_destroy=client_destroy)
+        connid += 1
+        if i % 100 == 1:
+            c['c_pin_id'].assign(i)
+        if i % 250 == 2:
+            c['c_restricted'].assign('LLOAD_OP_RESTRICTED_WRITE')
+        if i % 500 == 3:
+            c['c_state'].assign('LLOAD_C_CLOSING')
+
+        if ops:
+            nodes = []
+            for msgid in range(1, ops + 1):
+                op = p.new('LloadOperation', o_client=c, o_client_msgid=msgid,
+                           o_client_connid=c['c_connid'], o_upstream=upstream,
+                           o_upstream_connid=upstream['c_connid'],
+                           o_upstream_msgid=msgid, o_tag=0x63)
+                nodes.append(p.new('TAvlnode', avl_data=op))
+            c['c_ops'].assign(tavl(nodes, 0, ops, 0, 0))
+            c['c_n_ops_executing'].assign(ops)
+        connections.append(c)
+    circleq(clients, connections, 'c_next')
+    b['b_n_ops_executing'].assign(n * ops)
+    return p
+
+
+def pool(n, queues=4, paused=False):
+    "A libldap thread pool backlog like fixtures/pool.c"
+    p = program.Program('pool')
+
+    p.union('pthread_mutex_t', [('__size', 'char [40]'), ('__align', 'long')],
+            typedef='pthread_mutex_t')
+    p.union('pthread_cond_t', [('__size', 'char [48]'),
+                               ('__align', 'long long')],
+            typedef='pthread_cond_t')
+    start = p.function_type('void *', ['void *', 'void *'])
+    p.typedef('ldap_pvt_thread_start_t', start)
+
+    p.struct('ldap_int_thread_task_s', typedef='ldap_int_thread_task_t')
+    p.struct('ldap_int_thread_poolq_s')
+    p.struct('ldap_int_thread_pool_s', typedef='ldap_pvt_thread_pool_t')
+    p.typedef('ldap_pvt_thread_pool_t',
+              p.type('struct ldap_int_thread_pool_s *'))
+    p.struct('ldap_int_thread_task_s', [
+        ('ltt_next', p.union(None, [
+            ('q', p.struct(None, [
+                ('stqe_next', 'struct ldap_int_thread_task_s *')])),
+            ('l', p.struct(None, [
+                ('sle_next', 'struct ldap_int_thread_task_s *')])),
+        ])),
+        ('ltt_start_routine', 'ldap_pvt_thread_start_t *'),
+        ('ltt_arg', 'void *'),
+        ('ltt_queue', 'struct ldap_int_thread_poolq_s *'),
+    ])
+    p.struct('tcq', [
+        ('stqh_first', 'struct ldap_int_thread_task_s *'),
+        ('stqh_last', 'struct ldap_int_thread_task_s **'),
+    ], typedef='ldap_int_tpool_plist_t')
+    p.struct('ldap_int_thread_poolq_s', [
+        ('ltp_free', 'void *'),
+        ('ltp_pool', 'struct ldap_int_thread_pool_s *'),
+        ('ltp_mutex', 'pthread_mutex_t'),
+        ('ltp_cond', 'pthread_cond_t'),
+        ('ltp_work_list', 'ldap_int_tpool_plist_t *'),
+        ('ltp_pending_list', 'ldap_int_tpool_plist_t'),
+        ('ltp_free_list', p.struct('tcl', [
+            ('slh_first', 'struct ldap_int_thread_task_s *')])),
+        ('ltp_max_count', 'int'),
+        ('ltp_max_pending', 'int'),
+        ('ltp_pending_count', 'int'),
+        ('ltp_active_count', 'int'),
+        ('ltp_open_count', 'int'),
+        ('ltp_starting', 'int'),
+    ])
+    p.struct('ldap_int_thread_pool_s', [
+        ('ltp_next', p.struct(None, [
+            ('stqe_next', 'struct ldap_int_thread_pool_s *')])),
+        ('ltp_wqs', 'struct ldap_int_thread_poolq_s **'),
+        ('ltp_numqs', 'int'),
+        ('ltp_mutex', 'pthread_mutex_t'),
+        ('ltp_cond', 'pthread_cond_t'),
+        ('ltp_pcond', 'pthread_cond_t'),
+        ('ltp_finishing', 'int'),
+        ('ltp_pause', 'int'),
+        ('ltp_max_count', 'int'),
+        ('ltp_conf_max_count', 'int'),
+        ('ltp_max_pending', 'int'),
+        ('ltp_pending_count', 'int'),
+        ('ltp_active_count', 'int'),
+        ('ltp_open_count', 'int'),
+        ('ltp_starting', 'int'),
+        ('ltp_active_queues', 'int'),
+    ])
+    p.struct('tpq', [
+        ('stqh_first', 'struct ldap_int_thread_pool_s *'),
+        ('stqh_last', 'struct ldap_int_thread_pool_s **'),
+    ])
+
+    routines = [p.function(name, 'void *', ['void *', 'void *'])
+                for name in ('connection_read_thread',
+                             'connection_read_thread_',
+                             'connection_operation', 'syncrepl_task')]
+    routines[1] = routines[0]
+    p.function('ldap_pvt_thread_pool_submit', 'int')
+    pool_list = p.variable('ldap_int_thread_pool_list', 'struct tpq')
+    connection_pool = p.variable('connection_pool', 'ldap_pvt_thread_pool_t')
+    empty_pending_list = p.variable('empty_pending_list',
+                                    'ldap_int_tpool_plist_t')
+    empty_pending_list['stqh_last'].assign(
+        empty_pending_list['stqh_first'].address)
+
+    pool = p.new('struct ldap_int_thread_pool_s', ltp_numqs=queues,
+                 ltp_pause=2 if paused else 0,
+                 ltp_max_count=16 * queues, ltp_conf_max_count=16 * queues,
+                 ltp_max_pending=2 * n, ltp_active_count=16 * queues,
+                 ltp_open_count=16 * queues, ltp_pending_count=n)
+    wqs = gdb.Value._from_int(
+        p.type('struct ldap_int_thread_poolq_s *').pointer(),
+        p.alloc('struct ldap_int_thread_poolq_s *', queues))
+    pool['ltp_wqs'].assign(wqs)
+
+    tails = []
+    for i in range(queues):
+        pq = p.new('struct ldap_int_thread_poolq_s', ltp_pool=pool,
+                   ltp_max_count=16, ltp_max_pending=2 * n // queues,
+                   ltp_active_count=16, ltp_open_count=16)
+        wqs[i].assign(pq)
+        if paused:
+            pq['ltp_work_list'].assign(empty_pending_list.address)
+        else:
+            pq['ltp_work_list'].assign(pq['ltp_pending_list'].address)
+        tails.append(pq['ltp_pending_list']['stqh_first'].address)
+
+    for i in range(n):
+        pq = wqs[i % queues]
+        task = p.new('ldap_int_thread_task_t', ltt_queue=pq,
+                     ltt_start_routine=routines[i % 4])
+        tails[i % queues].dereference().assign(task)
+        tails[i % queues] = task['ltt_next']['q']['stqe_next'].address
+        pq['ltp_pending_count'].assign(int(pq['ltp_pending_count']) + 1)
+    for i in range(queues):
+        wqs[i]['ltp_pending_list']['stqh_last'].assign(tails[i])
+
+    pool_list['stqh_first'].assign(pool)
+    pool_list['stqh_last'].assign(pool['ltp_next']['stqe_next'].address)
+    connection_pool.assign(pool)
+    return p
+
+
+def filter(n):
+    "A wide OR filter like fixtures/filter.c"
+    p = program.Program('filter')
+
+    p.struct('Filter', typedef='Filter')
+    p.struct('Filter', [
+        ('f_choice', 'unsigned long'),
+        ('f_un', p.union('f_un_u', [
+            ('f_un_result', 'int'),
+            ('f_un_complex', 'struct Filter *'),
+            ('f_un_ava', 'void *'),
+            ('f_un_ssa', 'void *'),
+            ('f_un_mra', 'void *'),
+            ('f_un_desc', 'void *'),
+        ])),
+        ('f_next', 'struct Filter *'),
+    ])
+    p.variable('slap_known_controls', 'char *[1]')
+    top = p.variable('filter', 'Filter *')
+
+    f = p.new('Filter', f_choice=0xa1)
+    top.assign(f)
+    tail = f['f_un']['f_un_complex']
+    for i in range(n):
+        component = p.new('Filter', f_un={'f_un_result': i % 3})
+        tail.assign(component)
+        tail = component['f_next']
+    return p
+
+
+BUILDERS = {
+    'conns': conns,
+    'pool': pool,
+    'filter': filter,
+}
+
+
+def run(scenario, n, repeat):
+    "Benchmark scenario at size n, returns a result like bench.run()"
+    program.reset()
+    BUILDERS[scenario.name](n).load()
+
+    result = {
+        'scenario': scenario.name,
+        'n': n,
+        'python': sys.version.split()[0],
+        'gdb': gdb.VERSION,
+        'commands': {},
+        'walks': {},
+        'errors': {},
+        'status': 'ok',
+    }
+    for key, command in scenario.commands:
+        try:
+            result['commands'][key] = bench.time_command(
+                command.format(n=n), repeat)
+        except gdb.error as e:
+            result['errors'][key] = str(e)
+    for expression in scenario.walks:
+        try:
+            result['walks'][expression] = bench.time_walk(expression, repeat)
+        except gdb.error as e:
+            result['errors'][expression] = str(e)
+    return result
+
+
+def main(argv=None):
+    scenarios = [s for s in bench.SCENARIOS if s.name in BUILDERS]
+
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('scenarios', nargs='*', metavar='SCENARIO',
+                        help="scenarios to run (default: all of {})".format(
+                            ", ".join(s.name for s in scenarios)))
+    parser.add_argument('-n', '--sizes', type=lambda arg: [
+                            int(n) for n in arg.split(',')],
+                        help="comma separated sizes to run every scenario "
+                             "at instead of their own")
+    parser.add_argument('-r', '--repeat', type=int, default=bench.REPEAT,
+                        help="warm runs of each command (default: "
+                             "%(default)s)")
+    parser.add_argument('-o', '--output',
+                        help="write the results as JSON here")
+    parser.add_argument('-c', '--compare', metavar='OLD',
+                        help="compare the results with an earlier run")
+    args = parser.parse_args(argv)
+
+    if args.scenarios:
+        known = {s.name: s for s in scenarios}
+        unknown = set(args.scenarios) - set(known)
+        if unknown:
+            parser.error("unknown scenarios: " + ", ".join(unknown))
+        scenarios = [known[name] for name in args.scenarios]
+
+    # the extensions as gdb would load them, their chatter is not wanted
+    with open(os.devnull, 'w') as devnull:
+        stdout, sys.stdout = sys.stdout, devnull
+        try:
+            runpy.run_path(os.path.join(GDB_DIR, 'gdb.py'))
+        finally:
+            sys.stdout = stdout
+
+    meta = bench.environment()
+    meta.update(gdb=gdb.VERSION, gcc=None, cflags=None, repeat=args.repeat)
+    report = {
+        'meta': meta,
+        'results': [],
+    }
+    for scenario in scenarios:
+        for n in args.sizes or scenario.sizes:
+            print("{} {}".format(scenario.name, n), file=sys.stderr)
+            report['results'].append(run(scenario, n, args.repeat))
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=1)
+
+    bench.print_results(report)
+    if args.compare:
+        with open(args.compare) as f:
+            bench.compare(json.load(f), report)
+
+    return 0 if not any(result['errors']
+                        for result in report['results']) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,250 @@
+"""The printers and commands run on the fake gdb, under pytest
+
+    python3 -m pytest ~/.gdb/bench
+
+The programs are the ones micro.py benchmarks (see there and fakegdb/),
+each test lays its own out after a program.reset().
+"""
+
+import contextlib
+import io
+import os
+import runpy
+import subprocess
+import sys
+
+import pytest
+
+import micro
+from micro import GDB_DIR, gdb, program
+
+
+@pytest.fixture(scope='module', autouse=True)
+def extensions():
+    "Load the extensions once, the way gdb would at startup"
+    with contextlib.redirect_stdout(io.StringIO()):
+        runpy.run_path(os.path.join(GDB_DIR, 'gdb.py'))
+
+
+def load(p):
+    "Make p the program being debugged, printers registered as gdb would"
+    with contextlib.redirect_stdout(io.StringIO()):
+        p.load()
+    return p
+
+
+@pytest.fixture
+def conns():
+    program.reset()
+    return load(micro.conns(3, ops=2))
+
+
+def execute(command):
+    return gdb.execute(command, to_string=True)
+
+
+def children(value):
+    return dict(gdb.default_visualizer(value).children())
+
+
+def test_commands_loaded():
+    for command in ('deadlock', 'lockstat', 'bt-unique', 'sample', 'pool',
+                    'slap-ops', 'lload-census', 'find-conn', 'evbase'):
+        with pytest.raises(gdb.error, match='^(?!Undefined command)'):
+            execute(command + ' --no-such-option')
+
+
+def test_static_daemon_registers_printers_once():
+    # slapd, lloadd and libldap linked into one executable: the objfile is
+    # there before gdb.py is loaded and matches every marker
+    script = (
+        "import runpy, sys\n"
+        "sys.path[:0] = {path!r}\n"
+        "import gdb, program\n"
+        "p = program.Program('/usr/sbin/slapd')\n"
+        "for marker in ('slap_known_controls', 'lload_start_daemon',\n"
+        "               'ldap_pvt_thread_pool_submit'):\n"
+        "    p.function(marker)\n"
+        "p.load()\n"
+        "runpy.run_path({gdb_py!r})\n"
+        "print(*(printer.name for printer in p.objfile.pretty_printers))\n"
+    ).format(path=sys.path[:3], gdb_py=os.path.join(GDB_DIR, 'gdb.py'))
+    output = subprocess.run([sys.executable, '-c', script], check=True,
+                            stdout=subprocess.PIPE, universal_newlines=True)
+    printers = output.stdout.splitlines()[-1].split()
+    assert sorted(printers) == ['OpenLDAP', 'lloadd', 'queue.h']
+
+
+def test_print_clients(conns):
+    output = execute('print clients')
+    assert output.startswith('$1 = CircleQ {Client connid=1 {')
+    assert 'c_state = LLOAD_C_READY' in output
+    assert 'c_refcnt = "1+1"' in output
+    assert 'c_ops = "2 operations"' in output
+    assert 'c_ops[0] = Search request msgid=(1, 1)' in output
+    assert 'prev = "end of list", next = "connid=2"' in output
+
+
+def test_operations_limit():
+    program.reset()
+    load(micro.conns(1, ops=4))
+    conn = gdb.lookup_global_symbol('clients').value()['cqh_first']
+
+    execute('set print elements 4')
+    ops = children(conn)
+    assert ops['c_ops'] == '4 operations'
+    assert 'c_ops[3]' in ops
+
+    execute('set print elements 3')
+    ops = children(conn)
+    assert ops['c_ops'] == '3+ operations'
+    assert 'c_ops[2]' in ops and 'c_ops[3]' not in ops
+
+
+def test_queue_summary_limit():
+    program.reset()
+    # two upstream connections
+    load(micro.conns(19, ops=0))
+    backend = gdb.lookup_global_symbol('backend').value()['cqh_first']
+
+    execute('set print elements 2')
+    assert children(backend)['b_conns'] == 'Upstream connid=0-1 (2 total)'
+
+    execute('set print elements 1')
+    assert children(backend)['b_conns'] == 'Upstream connid=0-1 (1+ total)'
+
+
+def test_lload_census(conns):
+    output = execute('lload-census')
+    assert 'clients: 3 connections' in output
+    assert 'ops executing: 6' in output
+    assert 'backend bench: pending ops 6/100, conns 1/1' in output
+    assert 'refcount anomalies' not in output
+
+
+def test_lload_census_refcount_underflow(conns):
+    clients = gdb.lookup_global_symbol('clients').value()
+    clients['cqh_first']['c_refcnt'].assign(2 ** 64 - 1)
+    program.stop()
+
+    output = execute('lload-census')
+    assert 'refcount anomalies (1)' in output
+    assert 'refcnt=-1+1' in output
+
+
+def test_find_conn(conns):
+    assert execute('find-conn 2').startswith('$1 = Client connid=2 {')
+
+
+def test_pool():
+    program.reset()
+    load(micro.pool(5))
+    output = execute('pool')
+    assert 'running, active 64/64 threads, open 64, pending 5/10, ' \
+        'SATURATED' in output
+    assert 'syncrepl_task' in output
+
+
+def test_pool_paused():
+    # the work lists point at an empty list, the tasks are still pending
+    program.reset()
+    load(micro.pool(5, paused=True))
+    output = execute('pool')
+    assert ': paused, active 64/64 threads' in output
+    assert '1 syncrepl_task' in output
+    assert '2 connection_read_thread' in output
+
+
+@pytest.mark.parametrize('command', [
+    'pool --limit x',
+    'lload-census --top x',
+    'slap-ops --limit x',
+    'evbase --top x',
+    'sample -n x',
+    'sample -n 0',
+])
+def test_bad_option(conns, command):
+    with pytest.raises(gdb.error, match='needs a number\nUsage: '):
+        execute(command)
+
+
+def test_print_filter():
+    program.reset()
+    load(micro.filter(3))
+    output = execute('print *filter')
+    assert output.startswith('$1 = LDAP_FILTER_OR {')
+    assert 'SLAPD_FILTER_COMPUTED' in output
+
+
+def attribute(numvals, normalise=None):
+    """An Attribute of numvals values
+
+    Unless normalise is given, a_nvals is a_vals, otherwise an array of its
+    own holding normalise(value) for each value."""
+    p = program.Program('slapd')
+    p.struct('berval', [('bv_len', 'unsigned long'), ('bv_val', 'char *')])
+    p.typedef('BerValue', 'struct berval')
+    p.typedef('BerVarray', 'BerValue *')
+    p.struct('AttributeDescription', [
+        ('ad_next', 'void *'),
+        ('ad_type', 'void *'),
+        ('ad_cname', 'struct berval'),
+    ], typedef='AttributeDescription')
+    p.struct('Attribute', typedef='Attribute')
+    p.struct('Attribute', [
+        ('a_desc', 'AttributeDescription *'),
+        ('a_vals', 'BerVarray'),
+        ('a_nvals', 'BerVarray'),
+        ('a_numvals', 'unsigned int'),
+        ('a_flags', 'unsigned int'),
+        ('a_next', 'Attribute *'),
+    ])
+    p.variable('slap_known_controls', 'char *[1]')
+
+    def berval(text):
+        return {'bv_val': p.string(text), 'bv_len': len(text)}
+
+    desc = p.new('AttributeDescription', ad_cname=berval('cn'))
+    vals = gdb.Value._from_int(p.type('BerValue *'),
+                               p.alloc('BerValue', numvals + 1))
+    for i in range(numvals):
+        program.fill(vals[i], berval('value{}'.format(i)))
+
+    nvals = vals
+    if normalise:
+        nvals = gdb.Value._from_int(p.type('BerValue *'),
+                                    p.alloc('BerValue', numvals + 1))
+        for i in range(numvals):
+            program.fill(nvals[i], berval(normalise('value{}'.format(i))))
+    p.variable('attr', 'Attribute *').assign(
+        p.new('Attribute', a_desc=desc, a_vals=vals, a_nvals=nvals,
+              a_numvals=numvals))
+    return p
+
+
+def test_attribute_values():
+    program.reset()
+    load(attribute(5))
+
+    output = execute('print attr')
+    assert 'a_vals[4] = "value4"' in output
+    assert '"more"' not in output
+
+    execute('set print elements 4')
+    output = execute('print attr')
+    assert 'a_vals[1] = "value1", ... = "3 more"' in output
+
+
+def test_attribute_normalised_values():
+    program.reset()
+    # equal strings stored apart from the values
+    load(attribute(3, normalise=str))
+    output = execute('print attr')
+    assert 'a_vals[2] = "value2"' in output
+    assert 'a_nvals' not in output
+
+    program.reset()
+    load(attribute(3, normalise=lambda value: value.replace('1', 'one')))
+    output = execute('print attr')
+    assert 'a_vals[0] = "value0", a_vals[1] = "value1", ' \
+        'a_nvals[1] = "valueone", a_vals[2] = "value2",' in output
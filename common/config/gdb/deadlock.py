@@ -1,24 +1,81 @@
 #!/usr/bin/env python3
 
 import gdb
+from gdb.FrameDecorator import FrameDecorator
+
+import collections
+import json
+import time
+
+import snapshot
+from pretty_printers.decoder import StructLayout
+
+
+# (syscall number register, SYS_futex, (uaddr register, op register))
+FUTEX_SYSCALL = {
+    'i386:x86-64': ('orig_rax', 202, ('rdi', 'rsi')),
+    'i386': ('orig_eax', 240, ('ebx', 'ecx')),
+    'aarch64': ('x8', 98, ('x0', 'x1')),
+}
+
+FUTEX_CMD_MASK = ~(128 | 256)  # FUTEX_PRIVATE_FLAG | FUTEX_CLOCK_REALTIME
+FUTEX_LOCK_OPS = {
+    0,  # FUTEX_WAIT
+    6,  # FUTEX_LOCK_PI
+    9,  # FUTEX_WAIT_BITSET
+    13,  # FUTEX_LOCK_PI2
+}
+FUTEX_TID_MASK = 0x3fffffff
+
+PTHREAD_MUTEX_ROBUST = 0x10
+PTHREAD_MUTEX_PRIO_INHERIT = 0x20
+PTHREAD_MUTEX_PRIO_PROTECT = 0x40
+PTHREAD_MUTEX_KIND_BITS = 0x3ff
+
+# Functions between the caller and the futex syscall when locking a mutex,
+# covering both the pre- and post-2.34 glibc names
+LOCK_FRAMES = {
+    'syscall',
+    'futex_wait', 'futex_lock_pi64', '__futex_lock_pi64',
+    '__futex_abstimed_wait_common', '__futex_abstimed_wait_common64',
+    '__futex_abstimed_wait64', '__futex_clocklock64', '__futex_clocklock_wait64',
+    '__lll_lock_wait', '__lll_lock_wait_private', '__lll_clocklock_wait',
+    '__pthread_mutex_lock', '___pthread_mutex_lock', 'pthread_mutex_lock',
+    '__pthread_mutex_lock_full', '__pthread_mutex_cond_lock',
+    '__pthread_mutex_cond_lock_full', '__pthread_mutex_clocklock_common',
+    '__pthread_mutex_timedlock', '___pthread_mutex_timedlock',
+    'pthread_mutex_timedlock',
+    'ldap_pvt_thread_mutex_lock',
+}
+LOCK_FRAMES_DEPTH = 4
+
+
+def frame_name(frame):
+    "Function name of frame without symbol versions and the __GI_ prefix"
+    name = frame.name()
+    if not name:
+        return name
+    if name.find('@@') >= 0:
+        name = name[:name.find('@@')]
+    return name.removeprefix('__GI_')
+
+
+def _mutex_layout(snapshot):
+    try:
+        return StructLayout.get('pthread_mutex_t')
+    except (gdb.error, KeyError):
+        return None
 
 
 class ThreadEntry:
     "Representable thread object"
 
-    def __init__(self, thread):
-        saved_thread = gdb.selected_thread()
-
+    def __init__(self, thread, snapshot):
         self.thread = thread
-
-        self.thread.switch()
-        self.frame = gdb.newest_frame()
+        self.frame = snapshot.newest_frame(thread)
 
         self.pid, self.lwp_id, _ = thread.ptid
 
-        if not saved_thread:
-            saved_thread.switch()
-
     def __hash__(self):
         return self.lwp_id
 
@@ -32,34 +89,32 @@ class WaiterEntry(ThreadEntry):
     FLAG_STRANDED = 1 << 0
     FLAG_SELF_LOCKED = 1 << 1
 
-    def __init__(self, thread):
-        saved_thread = gdb.selected_thread()
-        super().__init__(thread)
-        self.thread.switch()
+    def __init__(self, thread, snapshot):
+        super().__init__(thread, snapshot)
 
         self._flags = 0
+        self._caller = None
 
         self.owner_lwp_id = None
         self.root = None
         self.children = set()
         self.mutex = None
 
-        if not self._populate(self.frame.name()):
+        if not self._populate_futex(snapshot) and \
+                not self._populate_frames(self.frame):
             self.root = self.lwp_id
 
         if self.lwp_id == self.owner_lwp_id:
             self._flags |= self.FLAG_SELF_LOCKED
             self.root = self.lwp_id
 
-        if not saved_thread:
-            saved_thread.switch()
-
     def __repr__(self):
         self.thread.switch()
-        sal = self.frame.find_sal()
+        frame = self.caller
+        sal = frame.find_sal()
 
         fmt = "Thread #{thread.num} (LWP {self.lwp_id})"
-        if self.frame.name():
+        if frame.name():
             fmt += " in {name}()"
         if sal.is_valid() and sal.symtab and sal.symtab.is_valid():
             fmt += " at {sal.symtab.filename}:{sal.line}"
@@ -68,73 +123,200 @@ class WaiterEntry(ThreadEntry):
         if self._flags & self.FLAG_SELF_LOCKED:
             fmt += " (waiting on itself)"
 
-        return fmt.format(self=self, thread=self.thread, frame=self.frame,
-                          name=self.frame.name(), sal=sal)
-
-    def _populate(self, name):
-        if name == '__pthread_mutex_lock_full':
-            self.mutex = self.frame.read_var('mutex')
-            self.frame = self.frame.older()
-        elif name == '__lll_lock_wait':
-            self.mutex = self.frame.older().read_var('mutex')
-            self.frame = self.frame.older().older()
-            if self.frame.name() == 'ldap_pvt_thread_mutex_lock':
-                self.frame = self.frame.older()
+        return fmt.format(self=self, thread=self.thread, frame=frame,
+                          name=frame.name(), sal=sal)
+
+    @property
+    def caller(self):
+        """The first frame outside of the locking functions
+
+        Only unwinds (with the thread selected) when first asked for."""
+        if self._caller is None:
+            frame = self.frame
+            if self.mutex is not None:
+                while frame.older() and frame_name(frame) in LOCK_FRAMES:
+                    frame = frame.older()
+            self._caller = frame
+        return self._caller
+
+    def _populate_futex(self, snapshot):
+        "Find the mutex from the futex syscall arguments, no unwinding needed"
+        syscall = FUTEX_SYSCALL.get(self.frame.architecture().name())
+        layout = snapshot.memo('pthread_mutex_t', _mutex_layout)
+        if not syscall or not layout:
+            return None
+
+        nr_register, nr_futex, (addr_register, op_register) = syscall
+        try:
+            if int(self.frame.read_register(nr_register)) != nr_futex:
+                return None
+            op = int(self.frame.read_register(op_register)) & FUTEX_CMD_MASK
+            address = int(self.frame.read_register(addr_register))
+        except (gdb.error, ValueError):
+            return None
+
+        if op not in FUTEX_LOCK_OPS:
+            return None
+
+        # the futex word is __data.__lock which starts the mutex, this holds
+        # for ldap_pvt_thread_mutex_t as well
+        try:
+            record = layout.read(address)
+            lock = record['__data.__lock']
+            owner = record['__data.__owner']
+            kind = record['__data.__kind']
+        except (gdb.error, KeyError):
+            return None
+
+        # make sure this is a mutex and not a condition variable, semaphore...
+        if not owner or kind & ~PTHREAD_MUTEX_KIND_BITS:
+            return None
+        if kind & (PTHREAD_MUTEX_ROBUST | PTHREAD_MUTEX_PRIO_INHERIT):
+            if lock & FUTEX_TID_MASK != owner:
+                return None
+        elif not kind & PTHREAD_MUTEX_PRIO_PROTECT and lock not in (1, 2):
+            return None
+
+        self.mutex = record.value()
+        self.owner_lwp_id = owner
+        return self.owner_lwp_id
+
+    def _populate_frames(self, frame):
+        "Fallback for when the registers are not available, has to unwind"
+        if frame_name(frame) not in LOCK_FRAMES:
+            return None
+
+        for _ in range(LOCK_FRAMES_DEPTH):
+            try:
+                self.mutex = frame.read_var('mutex')
+                break
+            except ValueError:
+                pass
+
+            frame = frame.older()
+            if not frame or frame_name(frame) not in LOCK_FRAMES:
+                return None
         else:
             return None
 
-        self.owner_lwp_id = int(self.mutex['__data']['__owner'])
+        try:
+            self.owner_lwp_id = int(self.mutex['__data']['__owner'])
+        except gdb.error:
+            # optimised out or not readable
+            self.mutex = None
         return self.owner_lwp_id
 
 
+def strongly_connected_components(vertices, successors):
+    """Tarjan's algorithm with an explicit stack
+
+    Yields lists of vertices, a component is only yielded after all the
+    components reachable from it.
+    """
+    index = {}
+    lowlink = {}
+    stack = []
+    on_stack = set()
+
+    for start in vertices:
+        if start in index:
+            continue
+
+        index[start] = lowlink[start] = len(index)
+        stack.append(start)
+        on_stack.add(start)
+        work = [(start, iter(successors(start)))]
+
+        while work:
+            v, edges = work[-1]
+            for w in edges:
+                if w not in index:
+                    index[w] = lowlink[w] = len(index)
+                    stack.append(w)
+                    on_stack.add(w)
+                    work.append((w, iter(successors(w))))
+                    break
+                elif w in on_stack:
+                    lowlink[v] = min(lowlink[v], index[w])
+            else:
+                work.pop()
+                if work:
+                    u = work[-1][0]
+                    lowlink[u] = min(lowlink[u], lowlink[v])
+
+                if lowlink[v] == index[v]:
+                    component = []
+                    while True:
+                        w = stack.pop()
+                        on_stack.discard(w)
+                        component.append(w)
+                        if w == v:
+                            break
+                    yield component
+
+
 class LockGraph:
     "Generate the lock waiting graph for a given inferior"
 
-    def __init__(self, inferior):
-        self.inferior = inferior
+    def __init__(self, snapshot):
+        self.inferior = snapshot.inferior
         self.threads = {}
-        self.roots = set()
-        self.cycles = set()
-
-        self._todo = set()
-        for t in self.inferior.threads():
-            thread = WaiterEntry(t)
+        self.roots = []
+        self.cycles = []
+        self.edges = 0
+        self.cycle_threads = 0
+
+        start = time.perf_counter()
+        for t in snapshot:
+            thread = WaiterEntry(t, snapshot)
             self.threads[thread.lwp_id] = thread
-            if thread.root:
-                self.roots.add(thread)
-            else:
-                self._todo.add(thread)
-
-        while self._todo:
-            self._resolve(self._todo.pop())
+        self.classify_time = time.perf_counter() - start
 
-    def _resolve(self, thread):
-        assert thread.root is None, "thread %d has already been resolved" % thread.lwp_id
-        self._todo.discard(thread)
+        start = time.perf_counter()
+        self._link()
+        self.resolve_time = time.perf_counter() - start
 
-        parent = self.threads.get(thread.owner_lwp_id)
-        if not parent:
-            self.roots.add(thread)
-            thread.root = thread.lwp_id
-            if thread.owner_lwp_id:
-                thread._flags |= thread.FLAG_STRANDED
-            return thread.root
+    @classmethod
+    def get(cls, snapshot):
+        "Return the (cached) lock graph for the snapshot"
+        return snapshot.memo(cls, cls)
 
-        thread.parent = parent
-        parent.children.add(thread)
+    def _link(self):
+        for thread in self.threads.values():
+            if thread.root:
+                continue
 
-        if parent.root:
-            thread.root = parent.root
-        else:
-            if parent in self._todo:
-                thread.root = self._resolve(parent)
+            parent = self.threads.get(thread.owner_lwp_id)
+            if not parent:
+                thread._flags |= thread.FLAG_STRANDED
+                thread.root = thread.lwp_id
+                continue
+
+            thread.parent = parent
+            parent.children.add(thread)
+            self.edges += 1
+
+        def successors(lwp_id):
+            parent = getattr(self.threads[lwp_id], 'parent', None)
+            return (parent.lwp_id,) if parent else ()
+
+        # components come out with the one a thread waits on first so its
+        # root is always known by then
+        for component in strongly_connected_components(
+                sorted(self.threads), successors):
+            if len(component) > 1:
+                anchor = self.threads[min(component)]
+                self.cycles.append(anchor)
+                self.cycle_threads += len(component)
+                for lwp_id in component:
+                    self.threads[lwp_id].root = anchor.lwp_id
+                continue
+
+            thread = self.threads[component[0]]
+            if thread.root:
+                self.roots.append(thread)
             else:
-                # we have just hit a cycle, parent is being resolved somewhere
-                # up the stack
-                thread.root = parent.lwp_id
-                self.cycles.add(parent)
-
-        return thread.root
+                thread.root = thread.parent.root
 
 
 class CommandDeadlockPrint(gdb.Command):
@@ -149,8 +331,19 @@ class CommandDeadlockPrint(gdb.Command):
     In the above, thread #3 is blocked waiting on a lock that thread #9 holds
     and vice versa. Thread #4 is blocked waiting on thread #9 to unlock
     something as well.
+
+    Options:
+    --stats         also print the size of the lock graph and how long it
+                    took to build
+    --json FILE     write the graph to FILE as JSON instead: roots, cycles,
+                    waiter->owner edges with the mutexes involved and the
+                    top frames of every thread taking part
+    --frames N      how many (filtered) frames per thread to write, 5 by
+                    default
     """
 
+    json_frames = 5
+
     def __init__(self):
         super().__init__("deadlock", gdb.COMMAND_USER)
         print("Command 'deadlock' loaded")
@@ -158,29 +351,249 @@ class CommandDeadlockPrint(gdb.Command):
     def invoke(self, arg, from_tty):
         "Resolves and prints deadlocks"
 
-        saved_thread = gdb.selected_thread()
-        graph = LockGraph(gdb.selected_inferior())
-
-        for root in graph.roots:
-            if root.owner_lwp_id or root.children:
-                self.print_deps(root)
+        stats = False
+        json_file = None
+        frames = self.json_frames
+
+        argv = gdb.string_to_argv(arg)
+        while argv:
+            option = argv.pop(0)
+            if option == '--stats':
+                stats = True
+            elif option in ('--json', '--frames'):
+                if not argv:
+                    raise gdb.GdbError("Option {} needs an argument"
+                                       .format(option))
+                if option == '--json':
+                    json_file = argv.pop(0)
+                else:
+                    try:
+                        frames = int(argv.pop(0))
+                    except ValueError:
+                        raise gdb.GdbError(
+                            "Option --frames needs a number\nUsage: deadlock "
+                            "[--stats] [--json FILE] [--frames N]") from None
+            else:
+                raise gdb.GdbError("Unknown option " + option)
+
+        with snapshot.SelectionSaver():
+            graph = LockGraph.get(snapshot.get())
+
+            if json_file:
+                with open(json_file, 'w') as out:
+                    self.write_json(graph, out, frames)
+                if stats:
+                    self.print_stats(graph)
+                return
+
+            for root in graph.roots:
+                if root.owner_lwp_id or root.children:
+                    self.print_deps(root)
+                    print()
+
+            if graph.cycles:
+                print("Cycles:")
+            for cycle in graph.cycles:
+                self.print_deps(cycle)
                 print()
 
-        if graph.cycles:
-            print("Cycles:")
-        for cycle in graph.cycles:
-            self.print_deps(cycle)
-            print()
+        if stats:
+            self.print_stats(graph)
 
-        if saved_thread:
-            saved_thread.switch()
+    def print_deps(self, thread):
+        "Print the part of the component related to thread (anchored at it)"
 
-    def print_deps(self, thread, depth=0, root=None):
-        "Print the part of the component related to thread (anchored at root)"
+        root = thread
+        stack = [(thread, 0)]
+        while stack:
+            thread, depth = stack.pop()
+            if depth and thread is root:
+                print("\t" * depth + "deadlock from root")
+                continue
 
-        if root == thread:
-            print("\t" * depth + "deadlock from root")
-        else:
             print("\t" * depth + repr(thread))
-            for child in thread.children:
-                self.print_deps(child, depth+1, root or thread)
+            children = sorted(thread.children, key=lambda t: t.lwp_id,
+                              reverse=True)
+            stack.extend((child, depth+1) for child in children)
+
+    def print_stats(self, graph):
+        waiting = sum(1 for thread in graph.threads.values()
+                      if thread.owner_lwp_id)
+        print("Lock graph: {} threads, {} waiting, {} edges, {} roots, "
+              "{} cycles ({} threads), classified in {:.1f}ms, "
+              "resolved in {:.1f}ms".format(
+                  len(graph.threads), waiting, graph.edges, len(graph.roots),
+                  len(graph.cycles), graph.cycle_threads,
+                  graph.classify_time * 1000, graph.resolve_time * 1000))
+
+    def write_json(self, graph, out, frames):
+        "Stream the graph into out, one record at a time"
+
+        involved = [thread for thread in graph.threads.values()
+                    if thread.owner_lwp_id or thread.children]
+
+        def cycle(anchor):
+            result = [anchor.lwp_id]
+            thread = anchor.parent
+            while thread is not anchor:
+                result.append(thread.lwp_id)
+                thread = thread.parent
+            return result
+
+        def edge(thread):
+            address, symbol = snapshot.describe_address(thread.mutex)
+            return {
+                'waiter': thread.lwp_id,
+                'owner': thread.owner_lwp_id,
+                'mutex': hex(address),
+                'symbol': symbol,
+            }
+
+        def thread_record(thread):
+            thread.thread.switch()
+            return {
+                'num': thread.thread.num,
+                'lwp': thread.lwp_id,
+                'name': thread.thread.name,
+                'root': thread.root,
+                'stranded': bool(thread._flags & thread.FLAG_STRANDED),
+                'self_locked': bool(thread._flags & thread.FLAG_SELF_LOCKED),
+                'frames': [frame_record(frame) for frame in
+                           snapshot.filtered_frames(thread.frame, frames)],
+            }
+
+        def frame_record(frame):
+            function = frame.function()
+            if isinstance(function, int):
+                function = hex(function)
+            return {
+                'function': function,
+                'address': hex(frame.address() or 0),
+                'file': frame.filename(),
+                'line': frame.line(),
+            }
+
+        def write_list(name, records, last=False):
+            out.write('  {}: ['.format(json.dumps(name)))
+            separator = '\n    '
+            for record in records:
+                out.write(separator)
+                out.write(json.dumps(record))
+                separator = ',\n    '
+            out.write('\n  ]\n' if last else '\n  ],\n')
+
+        out.write('{\n')
+        out.write('  "pid": {},\n'.format(graph.inferior.pid))
+        out.write('  "stats": {},\n'.format(json.dumps({
+            'threads': len(graph.threads),
+            'edges': graph.edges,
+            'roots': len(graph.roots),
+            'cycles': len(graph.cycles),
+            'cycle_threads': graph.cycle_threads,
+            'classify_ms': graph.classify_time * 1000,
+            'resolve_ms': graph.resolve_time * 1000,
+        })))
+        write_list('roots', (root.lwp_id for root in graph.roots
+                             if root.owner_lwp_id or root.children))
+        write_list('cycles', (cycle(anchor) for anchor in graph.cycles))
+        write_list('edges', (edge(thread) for thread in involved
+                             if thread.mutex is not None))
+        write_list('threads', (thread_record(thread) for thread in involved),
+                   last=True)
+        out.write('}\n')
+
+
+class CommandLockStat(gdb.Command):
+    """Prints mutexes that threads are waiting on, most contended first, e.g.
+    (gdb) lockstat
+    0x7ffff26b46a0 <clients_mutex>: 3 waiters, held by Thread #9 (LWP 27268)
+            #0 connections_walk() at connection.c:387
+            #1 clients_walk() at client.c:603
+               2 in client_destroy() at client.c:544
+               1 in client_init() at client.c:414
+
+    Each waiter is accounted to the first frame that is not part of the
+    locking functions.
+
+    Options:
+    --top N         only show the N most contended mutexes
+    --frames N      how many (filtered) frames of the owner to show, 5 by
+                    default
+    """
+
+    owner_frames = 5
+
+    def __init__(self):
+        super().__init__("lockstat", gdb.COMMAND_USER)
+        print("Command 'lockstat' loaded")
+
+    def invoke(self, arg, from_tty):
+        "Collects and prints mutex contention"
+
+        top = None
+        frames = self.owner_frames
+
+        argv = gdb.string_to_argv(arg)
+        while argv:
+            option = argv.pop(0)
+            if option not in ('--top', '--frames'):
+                raise gdb.GdbError("Unknown option " + option)
+            if not argv:
+                raise gdb.GdbError("Option {} needs an argument"
+                                   .format(option))
+            try:
+                number = int(argv.pop(0))
+            except ValueError:
+                raise gdb.GdbError("Option {} needs a number\nUsage: lockstat "
+                                   "[--top N] [--frames N]".format(option)) \
+                    from None
+            if option == '--top':
+                top = number
+            else:
+                frames = number
+
+        with snapshot.SelectionSaver():
+            current = snapshot.get()
+            graph = LockGraph.get(current)
+
+            mutexes = collections.defaultdict(list)
+            for thread in graph.threads.values():
+                if thread.mutex is not None:
+                    mutexes[int(thread.mutex)].append(thread)
+
+            contended = sorted(mutexes.values(), key=len, reverse=True)
+            for waiters in contended[:top]:
+                self.print_mutex(current, waiters, frames)
+
+    def print_mutex(self, current, waiters, frames):
+        address, symbol = snapshot.describe_address(waiters[0].mutex)
+        owner_lwp_id = waiters[0].owner_lwp_id
+
+        line = hex(address)
+        if symbol:
+            line += " <{}>".format(symbol)
+        line += ": {} waiter{}".format(len(waiters),
+                                       "s" if len(waiters) > 1 else "")
+
+        owner = current.thread(owner_lwp_id)
+        if owner:
+            line += ", held by Thread #{} (LWP {})".format(owner.num,
+                                                           owner_lwp_id)
+        else:
+            line += ", held by nonexistent LWP {}".format(owner_lwp_id)
+        print(line)
+
+        if owner:
+            frame = current.newest_frame(owner)
+            for level, decorator in enumerate(
+                    snapshot.filtered_frames(frame, frames)):
+                print("\t#{} {}".format(level,
+                                         snapshot.format_frame(decorator)))
+
+        callers = collections.Counter()
+        for waiter in waiters:
+            waiter.thread.switch()
+            callers[snapshot.format_frame(FrameDecorator(waiter.caller))] += 1
+        for caller, count in callers.most_common():
+            print("\t{:4} in {}".format(count, caller))
+        print()
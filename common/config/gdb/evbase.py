@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+
+import gdb
+
+import collections
+
+import snapshot
+from pretty_printers.common import resolver
+from pretty_printers.decoder import StructLayout, read_pointers
+from pretty_printers.libevent import EV_INTERNAL, event_what, internal_flags
+from pretty_printers.queue import CorruptQueue, List, TailQ
+
+
+# the upper bits of tv_usec mark common timeouts (see libevent/event.c)
+MICROSECONDS_MASK = 0x000fffff
+
+# set on callbacks that are part of an initialised struct event
+EVLIST_INIT = 0x80
+
+
+def lloadd_bases():
+    "Yield (name, base) for the event bases lloadd runs"
+    for name in ('listener_base', 'daemon_base'):
+        base = resolver.value(name)
+        if base is not None and base:
+            yield name, base
+
+    daemons = resolver.value('lload_daemon')
+    threads = resolver.value('lload_daemon_threads')
+    if daemons is None or threads is None:
+        return
+    for i in range(int(threads)):
+        base = daemons[i]['base']
+        if base:
+            yield "lload_daemon[{}]".format(i), base
+
+
+def timeval(record, prefix):
+    return record[prefix + '.tv_sec'] + \
+        (record[prefix + '.tv_usec'] & MICROSECONDS_MASK) / 1000000
+
+
+class EventBase:
+    """Every event registered with a base, each decoded once"""
+
+    def __init__(self, base):
+        self.base = base
+        b = base.dereference()
+
+        self.event_type = b['timeheap']['p'].type.target().target()
+        self.layout = StructLayout.get(self.event_type)
+        self.inferior = gdb.selected_inferior()
+
+        # address -> Record
+        self.events = collections.OrderedDict()
+        self.deferred = 0
+        self.errors = []
+
+        self.cached_time = timeval(StructLayout.get(b.type).read(int(base)),
+                                   'tv_cache')
+
+    def add(self, address):
+        if address not in self.events:
+            self.events[address] = self.layout.read(address, self.inferior)
+
+    def walk(self):
+        b = self.base.dereference()
+
+        io = b['io']
+        if 'entries' in (f.name for f in io.type.strip_typedefs().fields()):
+            self.walk_io(io)
+        else:
+            self.errors.append("io map is a hash table, not walked")
+
+        heap = b['timeheap']
+        count = int(heap['n'])
+        if count:
+            for address in read_pointers(int(heap['p']), count,
+                                         self.inferior):
+                self.add(address)
+
+        for i in range(int(b['n_common_timeouts'])):
+            ctl = b['common_timeout_queues'][i]
+            self.walk_list(TailQ(ctl['events'],
+                                 'ev_timeout_pos.ev_next_with_common_timeout'),
+                           'common timeout')
+
+        # event_callback starts struct event, the addresses are the same
+        queues = b['activequeues']
+        for i in range(int(b['nactivequeues'])):
+            self.walk_callbacks(queues[i], 'active')
+        self.walk_callbacks(b['active_later_queue'], 'active later')
+
+    def walk_io(self, io):
+        evmap_io = resolver.type('struct evmap_io').pointer()
+        nentries = int(io['nentries'])
+        if not nentries:
+            return
+
+        entries = read_pointers(int(io['entries']), nentries, self.inferior)
+        for entry in entries:
+            if not entry:
+                continue
+            events = gdb.Value(entry).cast(evmap_io)['events']
+            self.walk_list(List(events, 'ev_.ev_io.ev_io_next'), 'io')
+
+    def walk_list(self, queue, where):
+        try:
+            for address in queue.addresses():
+                self.add(address)
+        except CorruptQueue as e:
+            self.errors.append("{} list: {}".format(where, e))
+
+    def walk_callbacks(self, head, where):
+        callbacks = StructLayout.get(head['tqh_first'].type.target())
+        try:
+            for address in TailQ(head, 'evcb_active_next').addresses():
+                # deferred callbacks are not part of an event
+                if callbacks.read_field(address, 'evcb_flags',
+                                        self.inferior) & EVLIST_INIT:
+                    self.add(address)
+                else:
+                    self.deferred += 1
+        except CorruptQueue as e:
+            self.errors.append("{} queue: {}".format(where, e))
+
+    def overdue(self):
+        "Yield (seconds late, event record) for timers due before now"
+        if not self.cached_time:
+            return
+        for event in self.events.values():
+            flags = event['ev_evcallback.evcb_flags']
+            if not flags & EV_INTERNAL['EVLIST_TIMEOUT']:
+                continue
+            late = self.cached_time - timeval(event, 'ev_timeout')
+            if late > 0:
+                yield late, event
+
+
+class CommandEventBase(gdb.Command):
+    """Summarises the events registered with libevent bases, e.g.
+    (gdb) evbase
+    lload_daemon[0] 0x5555556d4c90: 10012 events, cached time 1234.567890
+            state: 10008 EVLIST_INSERTED, 4 EVLIST_TIMEOUT|EVLIST_INSERTED
+            what: 10008 EV_READ, 4 EV_TIMEOUT
+            2 timers overdue:
+               1.250s late: fd=27 connection_read_cb
+    ...
+
+    Walks the IO map, the timer heap, common timeout queues and the active
+    queues of each base, counting events by their EVLIST_* state and what
+    they wait for and listing timers that are due by the base's cached time
+    (only kept while the base is dispatching). Without an argument, every
+    base lloadd runs is examined, otherwise the one given.
+
+    Options:
+    --top N         how many overdue timers to list, 10 by default
+    """
+
+    top = 10
+
+    def __init__(self):
+        super().__init__("evbase", gdb.COMMAND_DATA)
+        print("Command 'evbase' loaded")
+
+    def invoke(self, arg, from_tty):
+        "Walks and summarises event bases"
+
+        top = self.top
+        expression = None
+
+        argv = gdb.string_to_argv(arg)
+        while argv:
+            option = argv.pop(0)
+            if option == '--top':
+                if not argv:
+                    raise gdb.GdbError("Option {} needs an argument"
+                                       .format(option))
+                try:
+                    top = int(argv.pop(0))
+                except ValueError:
+                    raise gdb.GdbError("Option --top needs a number\n"
+                                       "Usage: evbase [--top N] [BASE]") \
+                        from None
+            elif option.startswith('-') or expression is not None:
+                raise gdb.GdbError("Unknown option " + option)
+            else:
+                expression = option
+
+        if expression:
+            bases = [(expression, gdb.parse_and_eval(expression))]
+        else:
+            bases = list(lloadd_bases())
+            if not bases:
+                raise gdb.GdbError("No event bases found")
+
+        callbacks = {}
+        for name, base in bases:
+            try:
+                self.print_base(name, base, top, callbacks)
+            except gdb.error as e:
+                print("{}: cannot walk: {}".format(name, e))
+
+    def callback(self, address, callbacks):
+        "Name of the callback at address, remembered in callbacks"
+        try:
+            return callbacks[address]
+        except KeyError:
+            pass
+        pointer = gdb.Value(address).cast(resolver.type('void').pointer())
+        _, symbol = snapshot.describe_address(pointer)
+        name = callbacks[address] = symbol or hex(address)
+        return name
+
+    def print_base(self, name, base, top, callbacks):
+        if base.type.strip_typedefs().code != gdb.TYPE_CODE_PTR:
+            base = base.address
+
+        evbase = EventBase(base)
+        evbase.walk()
+
+        line = "{} {:#x}: {} events".format(name, int(base),
+                                            len(evbase.events))
+        if evbase.cached_time:
+            line += ", cached time {:.6f}".format(evbase.cached_time)
+        else:
+            line += ", no cached time"
+        if evbase.deferred:
+            line += ", {} deferred callbacks active".format(evbase.deferred)
+        print(line)
+        for error in evbase.errors:
+            print("\t" + error)
+
+        states = collections.Counter()
+        what = collections.Counter()
+        for event in evbase.events.values():
+            flags = event['ev_evcallback.evcb_flags']
+            states["|".join(internal_flags(flags)) or "inactive"] += 1
+            what["|".join(event_what(event['ev_events'], event['ev_res'],
+                                     flags))] += 1
+
+        for title, counter in (('state', states), ('what', what)):
+            if counter:
+                print("\t{}: {}".format(title, ", ".join(
+                    "{} {}".format(count, value)
+                    for value, count in counter.most_common())))
+
+        overdue = sorted(evbase.overdue(), key=lambda entry: entry[0],
+                         reverse=True)
+        if overdue:
+            print("\t{} timer{} overdue:".format(
+                len(overdue), "s" if len(overdue) > 1 else ""))
+        for late, event in overdue[:top]:
+            print("\t\t{:8.3f}s late: fd={} {}".format(
+                late, event['ev_fd'], self.callback(
+                    event['ev_evcallback.evcb_cb_union.evcb_callback'],
+                    callbacks)))
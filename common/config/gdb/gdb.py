@@ -2,16 +2,46 @@
 
 import sys
 import os.path
+import time
+import types
 from importlib import import_module
 
+_start = time.perf_counter()
+
 print("python version is "+sys.version)
 
 sys.path.append(os.path.expanduser('~/.gdb'))
 
 import gdb
 
-import pretty_printers
+import backtraces
 import deadlock
+import evbase
+import gdbext
+import lload
+import sample
+import slap
+
+
+# objfile basename -> auto_load module handling it, anything else is only
+# tried once
+HANDLERS = {
+    'libc': 'libc',
+    'libevent': 'libevent',
+    'libevent_core': 'libevent',
+    'libldap': 'libldap',
+    'libldap_r': 'libldap',
+    'libpthread': 'libpthread',
+    'lloadd': 'lloadd',
+    'slapd': 'slapd',
+}
+
+# symbols betraying code linked statically into the main executable
+MARKERS = {
+    'slap_known_controls': 'slapd',
+    'lload_start_daemon': 'lloadd',
+    'ldap_pvt_thread_pool_submit': 'libldap',
+}
 
 
 class ObjFileHandler(object):
@@ -19,31 +49,111 @@ class ObjFileHandler(object):
         self.loaded_modules = {}
         self.loaded_modules['gdb'] = None
 
-    def __call__(self, event):
-        name = event.new_objfile.filename
+        # basenames with no auto_load module
+        self.missing = set()
+        # (progspace, build-id or filename), module -> objfile set up
+        self.handled = {}
+
+    @staticmethod
+    def basename(name):
         basename = os.path.basename(name)
         basename = basename.split('.')[0]
         if basename.startswith("lt-"):
             basename = basename.split('-', 1)[1]
-        basename = basename.split('-')[0]
+        return basename.split('-')[0]
+
+    @staticmethod
+    def key(objfile):
+        return objfile.progspace, objfile.build_id or objfile.filename
+
+    def __call__(self, event):
+        objfile = event.new_objfile
+        if objfile.owner is not None:
+            # separate debug info, its owner has been handled already
+            return
+
+        name = objfile.filename
+        basename = self.basename(name)
+
+        handlers = [HANDLERS.get(basename, basename)]
+        if name == objfile.progspace.filename:
+            with gdbext.timed("autoload markers"):
+                for symbol, handler in MARKERS.items():
+                    if handler not in handlers and \
+                            (objfile.lookup_global_symbol(symbol) or
+                             objfile.lookup_static_symbol(symbol)):
+                        handlers.append(handler)
+
+        key = self.key(objfile)
+        for handler in handlers:
+            # without free_objfile events, a rerun brings new objfiles with
+            # the same build-id, the old ones are invalid by then
+            done = self.handled.get((key, handler))
+            if done is not None and done.is_valid():
+                continue
+            if self.load(handler, event):
+                self.handled[key, handler] = objfile
+
+    def load(self, basename, event):
+        if basename in self.missing:
+            return False
 
         mod = self.loaded_modules.get(basename)
         if not mod:
+            if basename in self.loaded_modules:
+                return False
             try:
                 mod = import_module("auto_load." + basename)
                 self.loaded_modules[basename] = mod
             except ImportError:
-                return
-        f = getattr(mod, "new_objfile")
-        if f:
+                self.missing.add(basename)
+                return False
+        f = getattr(mod, "new_objfile", None)
+        if not f:
+            return False
+        with gdbext.timed("autoload " + basename):
             f(event)
+        return True
+
+    def forget(self, event):
+        "Objfiles going away will need setting up again if reloaded"
+        objfile = getattr(event, 'objfile', None)
+        if objfile is not None:
+            key = self.key(objfile)
+            self.handled = {entry: done
+                            for entry, done in self.handled.items()
+                            if entry[0] != key}
+        else:
+            self.handled = {entry: done
+                            for entry, done in self.handled.items()
+                            if entry[0][0] != event.progspace}
 
 
 new_objfile_handler = ObjFileHandler()
 
 gdb.events.new_objfile.connect(new_objfile_handler)
+gdb.events.clear_objfiles.connect(new_objfile_handler.forget)
+if hasattr(gdb.events, 'free_objfile'):
+    gdb.events.free_objfile.connect(new_objfile_handler.forget)
 
-# TODO: remaining printers until we can detect statically loaded libraries
-pretty_printers.register()
+# when sourced with -x, the program and core have been loaded already
+for objfile in gdb.objfiles():
+    new_objfile_handler(types.SimpleNamespace(new_objfile=objfile))
+
+# printers are registered with the slapd, lloadd and libldap objfiles as
+# they appear (see auto_load), statically linked ones found by MARKERS
 
 deadlock.CommandDeadlockPrint()
+deadlock.CommandLockStat()
+lload.CommandLloadCensus()
+lload.CommandFindConnection()
+lload.CommandFindOperation()
+evbase.CommandEventBase()
+slap.CommandPool()
+slap.CommandOperations()
+sample.CommandSample()
+backtraces.CommandUniqueBacktraces()
+gdbext.CommandTiming()
+gdbext.CommandProfile()
+
+gdbext.record("startup", time.perf_counter() - _start)
@@ -0,0 +1,297 @@
+#!/usr/bin/env python3
+"""Bookkeeping about the extensions themselves
+
+Keeps track of how long loading the extensions and each objfile's
+autoloading took so that a slow gdb startup can be explained, and can
+profile the printers and frame filters on demand.
+"""
+
+import gdb
+
+import collections
+import contextlib
+import functools
+import inspect
+import time
+
+from auto_load._common import FrameFilter
+from pretty_printers import decoder
+from pretty_printers.common import CollectionPrinter
+from pretty_printers.queue import QueueHeadLookup
+
+
+# name -> [count, total seconds, max seconds]
+timings = collections.OrderedDict()
+
+
+def record(name, elapsed):
+    entry = timings.get(name)
+    if entry is None:
+        entry = timings[name] = [0, 0.0, 0.0]
+    entry[0] += 1
+    entry[1] += elapsed
+    entry[2] = max(entry[2], elapsed)
+
+
+@contextlib.contextmanager
+def timed(name):
+    "Record how long the body takes under name"
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - start)
+
+
+class CommandTiming(gdb.Command):
+    """Shows how long loading the extensions and autoloading took, e.g.
+    (gdb) gdbext-timing
+       total    calls      max  name
+      81.2ms        1   81.2ms  startup
+       3.1ms        2    2.9ms  printers OpenLDAP
+    ...
+
+    Options:
+    --sort          most expensive first rather than in order of appearance
+    """
+
+    def __init__(self):
+        super().__init__("gdbext-timing", gdb.COMMAND_MAINTENANCE)
+        print("Command 'gdbext-timing' loaded")
+
+    def invoke(self, arg, from_tty):
+        "Prints the recorded timings"
+
+        argv = gdb.string_to_argv(arg)
+        order = list(timings.items())
+        for option in argv:
+            if option != '--sort':
+                raise gdb.GdbError("Unknown option " + option)
+            order.sort(key=lambda item: item[1][1], reverse=True)
+
+        print("{:>8} {:>8} {:>8}  name".format("total", "calls", "max"))
+        for name, (count, total, longest) in order:
+            print("{:>6.1f}ms {:8} {:>6.1f}ms  {}".format(
+                total * 1000, count, longest * 1000, name))
+
+
+PRINTER_METHODS = ('to_string', 'children', 'display_hint')
+DECORATOR_METHODS = ('function', 'frame_args', 'frame_locals', 'filename',
+                     'line', 'address')
+
+
+class Profiler:
+    """Opt-in instrumentation of printers and frame filters
+
+    Nothing is wrapped until profiling is switched on and everything is put
+    back when it is switched off, there is no cost while disabled. Times
+    are inclusive of nested calls, memory reads are those done through the
+    decoder.
+    """
+
+    def __init__(self):
+        self.enabled = False
+
+        # name -> [calls, total seconds, max seconds, memory reads]
+        self.stats = collections.OrderedDict()
+
+        # (owner, attribute) -> (original, whether owner defined it)
+        self._patched = collections.OrderedDict()
+        # decorator function -> wrapper
+        self._decorators = {}
+
+    def account(self, name, elapsed, reads):
+        entry = self.stats.get(name)
+        if entry is None:
+            entry = self.stats[name] = [0, 0.0, 0.0, 0]
+        entry[0] += 1
+        entry[1] += elapsed
+        entry[2] = max(entry[2], elapsed)
+        entry[3] += reads
+
+    def timed(self, name, function):
+        "Wrap function, generators are timed across all of their steps"
+        profiler = self
+
+        if inspect.isgeneratorfunction(function):
+            @functools.wraps(function)
+            def wrapper(*args, **kwargs):
+                elapsed = 0.0
+                reads = 0
+                try:
+                    start = time.perf_counter()
+                    before = decoder.reads
+                    iterator = function(*args, **kwargs)
+                    while True:
+                        try:
+                            item = next(iterator)
+                        except StopIteration:
+                            return
+                        finally:
+                            elapsed += time.perf_counter() - start
+                            reads += decoder.reads - before
+                        yield item
+                        start = time.perf_counter()
+                        before = decoder.reads
+                finally:
+                    profiler.account(name, elapsed, reads)
+            return wrapper
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            before = decoder.reads
+            try:
+                return function(*args, **kwargs)
+            finally:
+                profiler.account(name, time.perf_counter() - start,
+                                 decoder.reads - before)
+        return wrapper
+
+    def _original(self, owner, attribute):
+        "What owner.attribute resolves to without our wrappers"
+        for cls in owner.__mro__:
+            if (cls, attribute) in self._patched:
+                return self._patched[(cls, attribute)][0]
+            if attribute in cls.__dict__:
+                return cls.__dict__[attribute]
+
+    def patch(self, owner, attribute, name):
+        "Replace owner.attribute (defined there or inherited) with a timer"
+        if (owner, attribute) in self._patched:
+            return
+        original = self._original(owner, attribute)
+        if not inspect.isfunction(original):
+            return
+        self._patched[(owner, attribute)] = (original,
+                                             attribute in owner.__dict__)
+        setattr(owner, attribute, self.timed(name, original))
+
+    def instrument(self, cls, methods):
+        "Time the methods of cls, accounted to cls even if inherited"
+        for method in methods:
+            self.patch(cls, method, "{}.{}".format(cls.__qualname__, method))
+
+    def on(self):
+        if self.enabled:
+            return
+        self.enabled = True
+        profiler = self
+
+        # printers are instrumented as the lookups hand them out
+        for lookup in (CollectionPrinter, QueueHeadLookup):
+            original = lookup.__call__
+
+            def dispatch(printer, val, *args, original=original):
+                start = time.perf_counter()
+                before = decoder.reads
+                try:
+                    result = original(printer, val, *args)
+                finally:
+                    profiler.account("lookup " + printer.name,
+                                     time.perf_counter() - start,
+                                     decoder.reads - before)
+                if result is not None:
+                    profiler.instrument(type(result), PRINTER_METHODS)
+                return result
+
+            self._patched[(lookup, '__call__')] = (original, True)
+            lookup.__call__ = dispatch
+
+        classes = FrameFilter.__subclasses__()
+        while classes:
+            cls = classes.pop()
+            self.instrument(cls, ['filter'])
+            classes.extend(cls.__subclasses__())
+
+        original = FrameFilter.decide
+
+        def decide(frame_filter, name):
+            decorator = original(frame_filter, name)
+            if decorator is None:
+                return None
+            return profiler.decorator(decorator)
+
+        self._patched[(FrameFilter, 'decide')] = (original, True)
+        FrameFilter.decide = decide
+
+    def decorator(self, decorator):
+        "Timed stand-in for a frame decorator (class or function)"
+        wrapper = self._decorators.get(decorator)
+        if wrapper is None:
+            if inspect.isclass(decorator):
+                self.instrument(decorator, DECORATOR_METHODS)
+            name = getattr(decorator, '__qualname__', repr(decorator))
+            wrapper = self._decorators[decorator] = self.timed(name,
+                                                               decorator)
+        return wrapper
+
+    def off(self):
+        for (owner, attribute), (original, own) in self._patched.items():
+            if own:
+                setattr(owner, attribute, original)
+            else:
+                delattr(owner, attribute)
+        self._patched.clear()
+        self._decorators.clear()
+        self.enabled = False
+
+    def reset(self):
+        self.stats.clear()
+
+
+profiler = Profiler()
+
+
+class CommandProfile(gdb.Command):
+    """Profiles printers, frame filters and frame decorators, e.g.
+    (gdb) gdbext-profile on
+    (gdb) bt
+    (gdb) gdbext-profile show
+       calls    total      max    reads  name
+          40   12.3ms    1.2ms        0  LockDecorator.function
+    ...
+
+    Subcommands:
+    on              start instrumenting (off by default, free when off)
+    off             stop instrumenting, statistics are kept
+    reset           drop the statistics collected
+    show            print the statistics, most expensive first (default)
+    """
+
+    def __init__(self):
+        super().__init__("gdbext-profile", gdb.COMMAND_MAINTENANCE)
+        print("Command 'gdbext-profile' loaded")
+
+    def invoke(self, arg, from_tty):
+        "Runs the subcommand"
+
+        argv = gdb.string_to_argv(arg) or ['show']
+        if len(argv) != 1:
+            raise gdb.GdbError("Expected one of: on, off, reset, show")
+
+        command = argv[0]
+        if command == 'on':
+            profiler.on()
+        elif command == 'off':
+            profiler.off()
+        elif command == 'reset':
+            profiler.reset()
+        elif command == 'show':
+            self.show()
+        else:
+            raise gdb.GdbError("Unknown subcommand " + command)
+
+    def show(self):
+        if not profiler.stats:
+            print("Nothing recorded{}".format(
+                "" if profiler.enabled else ", profiling is off"))
+            return
+
+        print("{:>8} {:>8} {:>8} {:>8}  name".format("calls", "total", "max",
+                                                    "reads"))
+        for name, (calls, total, longest, reads) in sorted(
+                profiler.stats.items(), key=lambda item: item[1][1],
+                reverse=True):
+            print("{:8} {:>6.1f}ms {:>6.1f}ms {:8}  {}".format(
+                calls, total * 1000, longest * 1000, reads, name))
@@ -0,0 +1,405 @@
+#!/usr/bin/env python3
+
+import gdb
+
+import collections
+import heapq
+import time
+
+import snapshot
+from pretty_printers.common import resolver
+from pretty_printers.decoder import StructLayout
+from pretty_printers.lloadd import connection_kind
+from pretty_printers.queue import CircleQ, CorruptQueue, STailQ
+from pretty_printers.tavl import TAVL, CorruptTree
+
+
+def backends():
+    "Yield (tier name, backend) for every configured backend"
+    tiers = resolver.value('tiers')
+    if tiers is None:
+        # before tiers were introduced
+        for backend in CircleQ(resolver.value('backend'), 'b_next'):
+            yield None, backend
+        return
+
+    for tier in STailQ(tiers, 't_next'):
+        name = tier['t_name'] or tier['t_type']['tier_name']
+        for backend in CircleQ(tier['t_backends'], 'b_next'):
+            yield name.string(), backend
+
+
+def connection_lists():
+    "Yield (name, head) of the clients list and every backend's lists"
+    yield 'clients', resolver.value('clients')
+    for _, backend in backends():
+        name = backend['b_name']
+        name = name['bv_val'].string(length=int(name['bv_len']))
+        for field in ('b_conns', 'b_bindconns', 'b_preparing'):
+            yield "{} {}".format(name, field), backend[field]
+
+
+class Index:
+    """Connections by connid and operations by (connid, msgid)
+
+    Operations are indexed on both their client and upstream side."""
+
+    def __init__(self, current=None):
+        self.connections = {}
+        self.operations = collections.defaultdict(list)
+        self.errors = []
+
+        op_layout = StructLayout.get('LloadOperation')
+        seen = set()
+        for name, head in connection_lists():
+            try:
+                for conn in CircleQ(head, 'c_next').records():
+                    self.connections[conn['c_connid']] = conn.address
+                    for op in TAVL(conn['c_ops']).data():
+                        if op in seen:
+                            continue
+                        seen.add(op)
+                        self.add_operation(op_layout.read(op))
+            except (CorruptQueue, CorruptTree) as e:
+                self.errors.append("{}: {}".format(name, e))
+            except gdb.error as e:
+                self.errors.append("{}: cannot read: {}".format(name, e))
+
+    def add_operation(self, op):
+        for side in ('o_client', 'o_upstream'):
+            key = (op[side + '_connid'], op[side + '_msgid'])
+            self.operations[key].append(op.address)
+
+    @classmethod
+    def get(cls):
+        "Return the index for the current stop, building it if needed"
+        return snapshot.get().memo('lload-index', cls)
+
+    def connection(self, connid):
+        address = self.connections.get(connid)
+        if address is not None:
+            return gdb.Value(address).cast(
+                resolver.type('LloadConnection').pointer())
+
+    def operation(self, connid, msgid):
+        pointer = resolver.type('LloadOperation').pointer()
+        return [gdb.Value(address).cast(pointer)
+                for address in self.operations.get((connid, msgid), [])]
+
+
+def lookup_index():
+    if resolver.value('clients') is None:
+        raise gdb.GdbError("No lloadd symbols found")
+    try:
+        index = Index.get()
+    except gdb.error as e:
+        raise gdb.GdbError("Cannot index connections: {}".format(e))
+    for error in index.errors:
+        print("corrupt list {}".format(error))
+    return index
+
+
+def parse_ints(arg, names):
+    argv = gdb.string_to_argv(arg)
+    if len(argv) != len(names):
+        raise gdb.GdbError("Expected arguments: " + " ".join(names))
+    try:
+        return [int(value, 0) for value in argv]
+    except ValueError as e:
+        raise gdb.GdbError(str(e))
+
+
+class CommandFindConnection(gdb.Command):
+    """Finds an lloadd connection (client or upstream) by its connid, e.g.
+    (gdb) find-conn 51566
+    $1 = (LloadConnection *) 0x7fffe4012340
+
+    The index of all connections and operations is built on first use and
+    kept until the process is resumed.
+    """
+
+    def __init__(self):
+        super().__init__("find-conn", gdb.COMMAND_DATA)
+        print("Command 'find-conn' loaded")
+
+    def invoke(self, arg, from_tty):
+        "Looks up the connection"
+        connid, = parse_ints(arg, ["CONNID"])
+
+        conn = lookup_index().connection(connid)
+        if conn is None:
+            raise gdb.GdbError("No connection with connid {}".format(connid))
+        gdb.execute("print ({}){:#x}".format(conn.type, int(conn)))
+
+
+class CommandFindOperation(gdb.Command):
+    """Finds lloadd operations by connid and msgid, e.g.
+    (gdb) find-op 51566 7
+    $1 = (LloadOperation *) 0x7fffe40a8b10
+
+    Either side of an operation matches: client connid and msgid or the
+    upstream connid and the msgid the request was forwarded with.
+    """
+
+    def __init__(self):
+        super().__init__("find-op", gdb.COMMAND_DATA)
+        print("Command 'find-op' loaded")
+
+    def invoke(self, arg, from_tty):
+        "Looks up the operation"
+        connid, msgid = parse_ints(arg, ["CONNID", "MSGID"])
+
+        ops = lookup_index().operation(connid, msgid)
+        if not ops:
+            raise gdb.GdbError("No operation with connid {} msgid {}"
+                               .format(connid, msgid))
+        for op in ops:
+            gdb.execute("print ({}){:#x}".format(op.type, int(op)))
+
+
+class Census:
+    """Aggregates over a set of connections, decoded with StructLayout"""
+
+    def __init__(self, top):
+        self.top = top
+
+        layout = StructLayout.get('LloadConnection')
+        self.states = layout.enum('c_state')
+        self.types = layout.enum('c_type')
+        self.restrictions = layout.enum('c_restricted')
+        # the counts are uintptr_t, an underflow reads as ~2**64
+        self.counter_bits = 8 * layout.fields['c_refcnt'][1].size
+
+        try:
+            self.ber = StructLayout.get('BerElement')
+            if 'ber_ptr' not in self.ber.fields:
+                self.ber = None
+        except gdb.error:
+            # opaque outside of liblber
+            self.ber = None
+
+        self.total = 0
+        self.groups = collections.OrderedDict()
+
+        # (value, description) of every connection, top N printed
+        self.refcounts = []
+        self.pending_ops = []
+        self.backlogs = []
+        self.anomalies = []
+
+    def signed(self, count):
+        "Read a reference count the way it would be if it were signed"
+        if count >= 1 << (self.counter_bits - 1):
+            count -= 1 << self.counter_bits
+        return count
+
+    def pending_bytes(self, address):
+        "Bytes of an outgoing BerElement not yet written (or None)"
+        if not self.ber:
+            return None
+        ber = self.ber.read(address)
+        start = ber['ber_rwptr'] or ber['ber_buf']
+        return ber['ber_ptr'] - start
+
+    def walk(self, name, head, limit=None):
+        "Account for every connection on the list at head"
+        group = self.groups[name] = {
+            'count': 0,
+            'states': collections.Counter(),
+            'types': collections.Counter(),
+            'restricted': collections.Counter(),
+            'pinned': 0,
+            'pending_ops': 0,
+            'pendingber': 0,
+            'pendingber_bytes': 0,
+            'error': None,
+        }
+
+        try:
+            for conn in CircleQ(head, 'c_next').records(limit):
+                self.add(group, conn)
+        except CorruptQueue as e:
+            group['error'] = str(e)
+        except gdb.error as e:
+            group['error'] = "cannot read: {}".format(e)
+        return group
+
+    def add(self, group, conn):
+        get = lambda field: conn[field] if field in conn else 0
+
+        group['count'] += 1
+        self.total += 1
+
+        state = self.states.get(conn['c_state'], conn['c_state'])
+        conn_type = self.types.get(conn['c_type'], conn['c_type'])
+        group['states'][state] += 1
+        group['types'][conn_type] += 1
+
+        desc, _ = connection_kind(conn['c_destroy'], conn_type)
+        desc = "{} connid={} at {:#x}".format(desc or "Connection",
+                                              conn['c_connid'], conn.address)
+
+        refcnt, live = (self.signed(conn[field])
+                        for field in ('c_refcnt', 'c_live'))
+        self.refcounts.append((refcnt + live, desc))
+        # negative counts or a dead, unreferenced connection still linked
+        if refcnt < 0 or live < 0 or not (refcnt or live):
+            self.anomalies.append((refcnt + live, "{} refcnt={}+{} {}".format(
+                desc, refcnt, live, state)))
+
+        ops = get('c_n_ops_executing')
+        group['pending_ops'] += ops
+        self.pending_ops.append((ops, desc))
+
+        restricted = get('c_restricted')
+        if restricted:
+            group['restricted'][self.restrictions.get(restricted,
+                                                      restricted)] += 1
+        if get('c_pin_id'):
+            group['pinned'] += 1
+
+        pendingber = get('c_pendingber')
+        if pendingber:
+            group['pendingber'] += 1
+            size = self.pending_bytes(pendingber)
+            if size is not None:
+                group['pendingber_bytes'] += size
+                self.backlogs.append((size, desc))
+            else:
+                self.backlogs.append((1, desc))
+
+    def print_group(self, name):
+        group = self.groups[name]
+        print("{}: {} connection{}".format(
+            name, group['count'], "" if group['count'] == 1 else "s"))
+        if group['error']:
+            print("\tcorrupt list: {}".format(group['error']))
+        if not group['count']:
+            return
+
+        for key in ('states', 'types', 'restricted'):
+            if group[key]:
+                print("\t{}: {}".format(key, ", ".join(
+                    "{} {}".format(count, value)
+                    for value, count in group[key].most_common())))
+        if group['pinned']:
+            print("\tpinned: {}".format(group['pinned']))
+        if group['pending_ops']:
+            print("\tops executing: {}".format(group['pending_ops']))
+        if group['pendingber']:
+            line = "\twith pending output: {}".format(group['pendingber'])
+            if self.ber:
+                line += " ({} bytes)".format(group['pendingber_bytes'])
+            print(line)
+
+    def print_top(self, title, entries, unit=''):
+        entries = heapq.nlargest(self.top, (e for e in entries if e[0] > 0))
+        if not entries:
+            return
+        print("\ntop {} by {}:".format(len(entries), title))
+        for value, desc in entries:
+            print("\t{:8}{} {}".format(value, unit, desc))
+
+
+class CommandLloadCensus(gdb.Command):
+    """Summarises all lloadd client and upstream connections at once, e.g.
+    (gdb) lload-census
+    clients: 50012 connections
+            states: 50004 LLOAD_C_READY, 8 LLOAD_C_CLOSING
+    ...
+    backend ldap1 (tier roundrobin): pending ops 3/100, conns 5/5
+    ldap1 b_conns: 5 connections
+    ...
+
+    Walks the clients list and each backend's b_conns, b_bindconns and
+    b_preparing lists once, counting connections by state and type, pinned
+    and restricted clients, operations executing and connections with
+    pending output, then lists the top connections by reference count,
+    operations executing and output backlog along with any connection
+    whose c_refcnt+c_live looks wrong.
+
+    Options:
+    --top N         how many connections to list for each metric, 10 by
+                    default
+    --limit N       walk no more than N connections per list
+    """
+
+    top = 10
+
+    def __init__(self):
+        super().__init__("lload-census", gdb.COMMAND_DATA)
+        print("Command 'lload-census' loaded")
+
+    def invoke(self, arg, from_tty):
+        "Walks the connection lists and prints the aggregates"
+
+        top = self.top
+        limit = None
+
+        argv = gdb.string_to_argv(arg)
+        while argv:
+            option = argv.pop(0)
+            if option not in ('--top', '--limit'):
+                raise gdb.GdbError("Unknown option " + option)
+            if not argv:
+                raise gdb.GdbError("Option {} needs an argument"
+                                   .format(option))
+            try:
+                number = int(argv.pop(0))
+            except ValueError:
+                raise gdb.GdbError("Option {} needs a number\nUsage: "
+                                   "lload-census [--top N] [--limit N]"
+                                   .format(option)) from None
+            if option == '--top':
+                top = number
+            else:
+                limit = number
+
+        clients = resolver.value('clients')
+        if clients is None:
+            raise gdb.GdbError("No lloadd symbols found")
+
+        start = time.perf_counter()
+        try:
+            census = Census(top)
+        except gdb.error as e:
+            raise gdb.GdbError("Cannot decode LloadConnection: {}".format(e))
+
+        census.walk('clients', clients, limit)
+        census.print_group('clients')
+
+        for tier, backend in backends():
+            b_name = backend['b_name']
+            name = b_name['bv_val'].string(length=int(b_name['bv_len']))
+            line = "\nbackend {}".format(name)
+            if tier:
+                line += " (tier {})".format(tier)
+
+            executing = int(backend['b_n_ops_executing'])
+            max_pending = int(backend['b_max_pending'])
+            line += ": pending ops {}/{}".format(executing, max_pending)
+            if max_pending and executing >= max_pending:
+                line += " FULL"
+            line += ", conns {}/{}, bind conns {}/{}".format(
+                backend['b_active'], backend['b_numconns'],
+                backend['b_bindavail'], backend['b_numbindconns'])
+            print(line)
+
+            for field in ('b_conns', 'b_bindconns', 'b_preparing'):
+                group = "{} {}".format(name, field)
+                census.walk(group, backend[field], limit)
+                if census.groups[group]['count']:
+                    census.print_group(group)
+
+        census.print_top("reference count", census.refcounts)
+        census.print_top("operations executing", census.pending_ops)
+        census.print_top("pending output", census.backlogs,
+                         ' bytes' if census.ber else '')
+
+        if census.anomalies:
+            print("\nrefcount anomalies ({}):".format(len(census.anomalies)))
+            for _, desc in heapq.nlargest(top, census.anomalies):
+                print("\t" + desc)
+
+        print("\n{} connections in {:.2f}s".format(
+            census.total, time.perf_counter() - start))
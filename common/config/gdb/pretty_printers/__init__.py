@@ -1,9 +1,25 @@
 #!/usr/bin/env python3
 
+import gdb
+
 from . import openldap
 from . import lloadd
+from . import queue
+
+
+def register(objfile=None):
+    "Register all OpenLDAP and lloadd printers with objfile"
+    register_openldap(objfile)
+    lloadd.register(objfile)
+
 
+def register_openldap(objfile=None):
+    "Register the printers for libldap/slapd types with objfile, just once"
+    # a static slapd or lloadd has libldap in it too, both handlers get here
+    printers = (objfile or gdb).pretty_printers
+    if any(getattr(printer, 'name', None) == 'OpenLDAP'
+           for printer in printers):
+        return
 
-def register():
-    openldap.register(None)
-    lloadd.register(None)
+    openldap.register(objfile)
+    queue.register(objfile)
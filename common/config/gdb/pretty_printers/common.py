@@ -6,6 +6,7 @@ import gdb.types
 
 from collections import OrderedDict
 from enum import IntFlag
+import re
 
 
 def target_type(value):
@@ -17,11 +18,100 @@ def target_type(value):
     return typ
 
 
+def print_elements_limit():
+    "The 'print elements' setting, None if unlimited"
+    return gdb.parameter('print elements') or None
+
+
 def type_to_fields_dict(typ):
     typ = target_type(typ)
     return {field.name: field for field in typ.fields()}
 
 
+class Resolver:
+    """Cache of global symbol and type lookups
+
+    Entries are kept per program space (and objfile when one is given) and
+    all of a program space's entries are dropped when its objfiles change.
+    Symbol values are not cached themselves as they would go stale.
+    """
+
+    def __init__(self):
+        self._cache = {}
+        self._tracked = []
+
+    def track(self, memo):
+        "Have memo (a dict) cleared whenever the cache is invalidated"
+        self._tracked.append(memo)
+
+    def _lookup(self, kind, name, objfile, lookup):
+        progspace = objfile.progspace if objfile else gdb.current_progspace()
+        cache = self._cache.setdefault(progspace, {})
+
+        key = (kind, name, objfile)
+        try:
+            return cache[key]
+        except KeyError:
+            pass
+
+        result = cache[key] = lookup()
+        return result
+
+    def symbol(self, name, objfile=None):
+        "Return the symbol called name (or None)"
+        def lookup():
+            # not gdb.lookup_symbol, what that finds depends on the
+            # selected frame's block and would not be fit to cache
+            scope = objfile or gdb
+            return scope.lookup_global_symbol(name) or \
+                scope.lookup_static_symbol(name)
+        return self._lookup('symbol', name, objfile, lookup)
+
+    def value(self, name, objfile=None):
+        "Return the current value of symbol name (or None)"
+        symbol = self.symbol(name, objfile)
+        if symbol:
+            return symbol.value()
+
+    def address(self, name, objfile=None):
+        "Return the address of symbol name as an int (or None)"
+        def lookup():
+            symbol = self.symbol(name, objfile)
+            if not symbol:
+                return None
+            return int(symbol.value().address)
+        return self._lookup('address', name, objfile, lookup)
+
+    def type(self, name):
+        "Same as gdb.lookup_type but cached, raises gdb.error if not found"
+        return self._lookup('type', name, None,
+                            lambda: gdb.lookup_type(name))
+
+    def invalidate(self, event=None):
+        progspace = None
+        if event is not None:
+            objfile = getattr(event, 'new_objfile', None) or \
+                getattr(event, 'objfile', None)
+            progspace = objfile.progspace if objfile else \
+                getattr(event, 'progspace', None)
+
+        if progspace is None:
+            self._cache.clear()
+        else:
+            self._cache.pop(progspace, None)
+
+        for memo in self._tracked:
+            memo.clear()
+
+
+resolver = Resolver()
+
+gdb.events.new_objfile.connect(resolver.invalidate)
+gdb.events.clear_objfiles.connect(resolver.invalidate)
+if hasattr(gdb.events, 'free_objfile'):
+    gdb.events.free_objfile.connect(resolver.invalidate)
+
+
 class NullPrinter:
     def __init__(self, val):
         pass
@@ -37,6 +127,20 @@ class CollectionPrinter(gdb.printing.RegexpCollectionPrettyPrinter):
             super().__init__(name, regexp, gen_printer)
             self.pointer = pointer
 
+    # regexps that only ever match a single type name
+    exact_re = re.compile(r'^\^([A-Za-z_][A-Za-z0-9_]*)\$$')
+
+    def __init__(self, name):
+        super().__init__(name)
+
+        # (type name, pointer) -> subprinters for that exact name
+        self._exact = {}
+        # subprinters that need an actual regexp search
+        self._patterns = []
+        # (name, code, pointer) of the type as given -> candidate subprinters
+        self._memo = {}
+        resolver.track(self._memo)
+
     def __call__(self, val, *args):
         typ = val.type
         pointer = False
@@ -45,16 +149,17 @@ class CollectionPrinter(gdb.printing.RegexpCollectionPrettyPrinter):
             typ = typ.target()
             pointer = True
 
-        # Get the type name.
-        typename = gdb.types.get_basic_type(typ).tag
-        if not typename:
-            typename = typ.name
-        if not typename:
-            return None
-
-        for printer in self.subprinters:
-            if printer.enabled and printer.pointer == pointer \
-                    and printer.compiled_re.search(typename):
+        key = None
+        if typ.name:
+            key = (typ.name, typ.code, pointer)
+            candidates = self._memo.get(key)
+        if key is None or candidates is None:
+            candidates = self._candidates(typ, pointer)
+            if key is not None:
+                self._memo[key] = candidates
+
+        for printer in candidates:
+            if printer.enabled:
                 if not val:
                     return NullPrinter(val)
                 try:
@@ -65,11 +170,35 @@ class CollectionPrinter(gdb.printing.RegexpCollectionPrettyPrinter):
         # Fallback to None
         return None
 
+    def _candidates(self, typ, pointer):
+        "Subprinters that apply to typ in the order they were added"
+
+        # Get the type name.
+        typename = gdb.types.get_basic_type(typ).tag
+        if not typename:
+            typename = typ.name
+        if not typename:
+            return ()
+
+        candidates = list(self._exact.get((typename, pointer), []))
+        candidates += [printer for printer in self._patterns
+                       if printer.pointer == pointer
+                       and printer.compiled_re.search(typename)]
+        candidates.sort(key=self.subprinters.index)
+        return tuple(candidates)
+
     def add_printer(self, name, regexp, gen_printer, pointer=False):
-        self.subprinters.append(
-                self.RegexpPointerSubprinter(name, regexp, gen_printer,
-                                             pointer)
-        )
+        printer = self.RegexpPointerSubprinter(name, regexp, gen_printer,
+                                               pointer)
+        self.subprinters.append(printer)
+
+        match = self.exact_re.match(regexp)
+        if match:
+            self._exact.setdefault((match.group(1), pointer), []) \
+                .append(printer)
+        else:
+            self._patterns.append(printer)
+        self._memo.clear()
 
     def add_pointer_printer(self, name, regexp, gen_printer):
         return self.add_printer(name, regexp, gen_printer, pointer=True)
@@ -79,45 +208,49 @@ class StructPrinter:
     def __init__(self, value):
         self.value = value
 
-    def children_dict(self, fields=None):
+    def iter_children(self, fields=None):
+        """Yield (name, value) for each field, as gdb asks for them
+
+        Nothing is read before gdb (or an MI varobj) requests the child, so
+        only as many fields as 'print elements' or the requested child range
+        allow are ever touched.
+        """
         value = self.value
-        result = OrderedDict()
 
         if value.type.code == gdb.TYPE_CODE_PTR:
             value = value.dereference()
 
         if fields is None:
             for field in target_type(value).fields():
-                result[field.name] = value[field]
+                yield field.name, value[field]
         else:
             for name in fields:
-                result[name] = value[name]
+                yield name, value[name]
 
-        return result
+    def children_dict(self, fields=None):
+        return OrderedDict(self.iter_children(fields))
 
     def children(self):
-        return self.children_dict().items()
+        return self.iter_children()
 
 
 class AnnotatedStructPrinter(StructPrinter):
-    def children_dict(self, fields=None):
-        result = super().children_dict(fields)
-
+    def iter_children(self, fields=None):
         exclude = getattr(self, 'exclude', [])
         exclude_false = getattr(self, 'exclude_false', [])
         short = getattr(self, 'short', [])
 
-        for name in list(result.keys()):
+        for name, value in super().iter_children(fields):
             if name in exclude:
-                del result[name]
-            elif name in exclude_false and not result[name]:
-                del result[name]
+                continue
+            elif name in exclude_false and not value:
+                continue
             elif name in short:
-                visualiser = gdb.default_visualizer(result[name])
+                visualiser = gdb.default_visualizer(value)
                 if visualiser:
-                    result[name] = visualiser.to_string()
+                    value = visualiser.to_string()
 
-        return result
+            yield name, value
 
 class FlagsPrinter(IntFlag):
     # TODO: allow setting up with prefix(es?) to remove from the returned names
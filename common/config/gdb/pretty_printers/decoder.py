@@ -0,0 +1,197 @@
+#!/usr/bin/env python3
+"""Read whole structures from the inferior with a single memory access
+
+Every gdb.Value field access is its own trip through gdb (and over
+gdbserver its own memory read). When walking thousands of objects, work
+out where each scalar field lives once per type, read the object with one
+inferior.read_memory() and decode the fields with struct.unpack_from.
+"""
+
+import gdb
+
+import struct
+
+from pretty_printers.common import resolver
+
+
+SCALARS = {
+    gdb.TYPE_CODE_INT, gdb.TYPE_CODE_ENUM, gdb.TYPE_CODE_CHAR,
+    gdb.TYPE_CODE_BOOL, gdb.TYPE_CODE_PTR,
+}
+FORMATS = {1: 'b', 2: 'h', 4: 'i', 8: 'q'}
+
+_layouts = {}
+_target = {}
+resolver.track(_layouts)
+resolver.track(_target)
+
+# how many times we went to the inferior, for profiling
+reads = 0
+
+
+def read_memory(inferior, address, size):
+    global reads
+    reads += 1
+    return inferior.read_memory(address, size)
+
+
+def byte_order():
+    "struct module prefix matching the target's endianness"
+    try:
+        return _target['byte_order']
+    except KeyError:
+        pass
+    endian = gdb.execute("show endian", to_string=True)
+    order = _target['byte_order'] = '>' if 'big endian' in endian else '<'
+    return order
+
+
+def pointer_format():
+    try:
+        return _target['pointer']
+    except KeyError:
+        pass
+    size = resolver.type('void').pointer().sizeof
+    fmt = _target['pointer'] = struct.Struct(byte_order() + FORMATS[size]
+                                             .upper())
+    return fmt
+
+
+def read_pointer(address, inferior=None):
+    "Read a pointer at address, returned as an int"
+    inferior = inferior or gdb.selected_inferior()
+    fmt = pointer_format()
+    return fmt.unpack(read_memory(inferior, address, fmt.size))[0]
+
+
+def read_pointers(address, count, inferior=None):
+    "Read an array of count pointers at address, returned as ints"
+    inferior = inferior or gdb.selected_inferior()
+    fmt = pointer_format()
+    buffer = read_memory(inferior, address, fmt.size * count)
+    return [pointer for pointer, in fmt.iter_unpack(buffer)]
+
+
+def is_signed(typ):
+    signed = getattr(typ, 'is_signed', None)
+    if signed is not None:
+        return signed
+    # gdb < 12
+    return gdb.Value(-1).cast(typ) < 0
+
+
+class Record:
+    "A decoded object, scalar fields are decoded on access"
+
+    __slots__ = ('layout', 'address', 'buffer')
+
+    def __init__(self, layout, address, buffer):
+        self.layout = layout
+        self.address = address
+        self.buffer = buffer
+
+    def __getitem__(self, name):
+        offset, fmt = self.layout.fields[name]
+        return fmt.unpack_from(self.buffer, offset)[0]
+
+    def __contains__(self, name):
+        return name in self.layout.fields
+
+    def __int__(self):
+        return self.address
+
+    def value(self):
+        "The record as a gdb.Value pointer, for handing over to printers"
+        return gdb.Value(self.address).cast(self.layout.type.pointer())
+
+
+class StructLayout:
+    """Offsets and formats of every scalar field of a type
+
+    Fields of nested structures and unions are named the way you would
+    spell them in C ('__data.__owner'), arrays of chars are exposed as
+    bytes, other arrays of scalars element by element ('avl_link[1]'). Bit
+    fields are left out.
+    """
+
+    def __init__(self, typ):
+        self.type = typ
+        self.size = typ.sizeof
+        self.fields = {}
+
+        self._collect(typ.strip_typedefs(), 0, '')
+
+    @classmethod
+    def get(cls, typ):
+        "Return the (cached) layout for a type or a type name"
+        if isinstance(typ, str):
+            typ = resolver.type(typ)
+        key = (typ.name, typ.tag, typ.code, typ.sizeof) \
+            if (typ.name or typ.tag) else str(typ)
+        try:
+            return _layouts[key]
+        except KeyError:
+            pass
+        layout = _layouts[key] = cls(typ)
+        return layout
+
+    def _collect(self, typ, base, prefix):
+        order = byte_order()
+        for field in typ.fields():
+            if not hasattr(field, 'bitpos') or field.bitsize \
+                    or field.bitpos % 8:
+                continue
+
+            offset = base + field.bitpos // 8
+            ftype = field.type.strip_typedefs()
+            name = prefix + field.name if field.name else prefix[:-1]
+
+            if ftype.code in SCALARS and ftype.sizeof in FORMATS:
+                self.fields[name] = (offset, self._format(ftype, order))
+            elif ftype.code in (gdb.TYPE_CODE_STRUCT, gdb.TYPE_CODE_UNION):
+                self._collect(ftype, offset, name + '.' if name else '')
+            elif ftype.code == gdb.TYPE_CODE_ARRAY:
+                target = ftype.target().strip_typedefs()
+                if target.code == gdb.TYPE_CODE_INT and target.sizeof == 1:
+                    self.fields[name] = (
+                        offset, struct.Struct('{}s'.format(ftype.sizeof)))
+                elif target.code in SCALARS and target.sizeof in FORMATS:
+                    fmt = self._format(target, order)
+                    for i in range(ftype.sizeof // target.sizeof):
+                        self.fields["{}[{}]".format(name, i)] = \
+                            (offset + i * target.sizeof, fmt)
+
+    @staticmethod
+    def _format(typ, order):
+        fmt = FORMATS[typ.sizeof]
+        if typ.code == gdb.TYPE_CODE_PTR or not is_signed(typ):
+            fmt = fmt.upper()
+        return struct.Struct(order + fmt)
+
+    def offset(self, name):
+        return self.fields[name][0]
+
+    def enum(self, name):
+        "Map the values of an enum typed field to their names"
+        typ = self.type
+        try:
+            for part in name.split('.'):
+                typ = typ.strip_typedefs()[part].type
+        except KeyError:
+            return {}
+        typ = typ.strip_typedefs()
+        if typ.code != gdb.TYPE_CODE_ENUM:
+            return {}
+        return {int(f.enumval): f.name for f in typ.fields()}
+
+    def read(self, address, inferior=None):
+        "Read the object at address with one memory access"
+        inferior = inferior or gdb.selected_inferior()
+        return Record(self, address, read_memory(inferior, address, self.size))
+
+    def read_field(self, address, name, inferior=None):
+        "Read a single field of the object at address"
+        inferior = inferior or gdb.selected_inferior()
+        offset, fmt = self.fields[name]
+        return fmt.unpack(read_memory(inferior, address + offset,
+                                      fmt.size))[0]
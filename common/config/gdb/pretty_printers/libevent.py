@@ -28,6 +28,44 @@ EV_INTERNAL = {
 }
 
 
+def event_what(events, res, flags):
+    "Names of what an event is waiting for, like event_pending() reports"
+    what = 0
+    names = []
+
+    # taken from libevent/event.c
+    what |= events & (
+        EV_FLAGS['EV_READ'] |
+        EV_FLAGS['EV_WRITE'] |
+        EV_FLAGS['EV_CLOSED'] |
+        EV_FLAGS['EV_SIGNAL'] |
+        EV_FLAGS['EV_PERSIST'] )
+
+    if flags & (EV_INTERNAL['EVLIST_ACTIVE']|EV_INTERNAL['EVLIST_ACTIVE_LATER']):
+        what |= res
+    if flags & EV_INTERNAL['EVLIST_TIMEOUT']:
+        what |= EV_FLAGS['EV_TIMEOUT']
+
+    what &= (
+            EV_FLAGS['EV_TIMEOUT'] |
+            EV_FLAGS['EV_READ'] |
+            EV_FLAGS['EV_WRITE'] |
+            EV_FLAGS['EV_CLOSED'] |
+            EV_FLAGS['EV_SIGNAL']
+    )
+
+    for name, flag in EV_FLAGS.items():
+        if what & flag:
+            names.append(name)
+
+    return names or ['nothing']
+
+
+def internal_flags(flags):
+    "Names of the EVLIST_* flags set"
+    return [name for name, flag in EV_INTERNAL.items() if flags & flag]
+
+
 class EventPrinter:
     """Pretty printer for struct event"""
 
@@ -38,45 +76,14 @@ class EventPrinter:
         self.flags = event['ev_evcallback']['evcb_flags']
 
     def to_string(self):
-        res = []
-        for name, flag in EV_INTERNAL.items():
-            if self.flags & flag:
-                res.append(name)
+        res = internal_flags(self.flags)
         if not res:
             return "inactive"
         return "|".join(res)
 
     def what(self):
-        ev = self.event
-        flags = 0
-        res = []
-
-        # taken from libevent/event.c
-        flags |= ev['ev_events'] & (
-            EV_FLAGS['EV_READ'] |
-            EV_FLAGS['EV_WRITE'] |
-            EV_FLAGS['EV_CLOSED'] |
-            EV_FLAGS['EV_SIGNAL'] |
-            EV_FLAGS['EV_PERSIST'] )
-
-        if self.flags & (EV_INTERNAL['EVLIST_ACTIVE']|EV_INTERNAL['EVLIST_ACTIVE_LATER']):
-            flags |= ev['ev_res']
-        if self.flags & EV_INTERNAL['EVLIST_TIMEOUT']:
-            flags |= EV_FLAGS['EV_TIMEOUT']
-
-        flags &= (
-                EV_FLAGS['EV_TIMEOUT'] |
-                EV_FLAGS['EV_READ'] |
-                EV_FLAGS['EV_WRITE'] |
-                EV_FLAGS['EV_CLOSED'] |
-                EV_FLAGS['EV_SIGNAL']
-        )
-
-        for name, flag in EV_FLAGS.items():
-            if flags & flag:
-                res.append(name)
-
-        return res or ['nothing']
+        return event_what(int(self.event['ev_events']),
+                          int(self.event['ev_res']), int(self.flags))
 
     def children(self):
         what = self.what()
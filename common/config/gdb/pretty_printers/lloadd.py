@@ -4,8 +4,11 @@ import gdb
 import gdb.printing
 
 from pretty_printers.common import (
-    CollectionPrinter, AnnotatedStructPrinter, type_to_fields_dict
+    CollectionPrinter, AnnotatedStructPrinter, print_elements_limit, resolver,
+    type_to_fields_dict
 )
+from pretty_printers.queue import CircleQ, CorruptQueue
+from pretty_printers.tavl import TAVL, CorruptTree
 
 
 LDAP_MSG_TAGS = {
@@ -33,6 +36,49 @@ LDAP_MSG_TAGS = {
     0x79: "Intermediate response",
 }
 
+def connection_kind(destroy, conn_type):
+    """Describe a connection given its c_destroy callback and c_type name
+
+    Returns the description and the list it is linked on: 'clients' or the
+    name of the backend field holding it (None if unknown)."""
+    if destroy == resolver.address('client_destroy'):
+        return "Client", 'clients'
+    elif destroy == resolver.address('upstream_destroy'):
+        if conn_type == 'LLOAD_C_BIND':
+            return "Upstream bind", 'b_bindconns'
+        elif conn_type == 'LLOAD_C_PREPARING':
+            return "Upstream preparing", 'b_preparing'
+        return "Upstream", 'b_conns'
+    elif destroy == resolver.address('connection_destroy'):
+        return "Connection", None
+    return None, None
+
+
+def queue_summary(queue, describe_last):
+    """Describe a list of backends/connections in one line
+
+    No more than 'print elements' entries are walked to count them."""
+    if queue.empty():
+        return 'empty'
+
+    first = queue.head[queue.first]
+    desc = gdb.default_visualizer(first).to_string()
+    last = queue.head['cqh_last']
+    if first == last:
+        return desc
+
+    limit = print_elements_limit()
+    try:
+        # one more than the limit tells a full list from a longer one
+        total = queue.count(None if limit is None else limit + 1)
+    except CorruptQueue as e:
+        return "{}-{} (corrupt: {})".format(desc, describe_last(last), e)
+
+    if limit is not None and total > limit:
+        return "{}-{} ({}+ total)".format(desc, describe_last(last), limit)
+    return "{}-{} ({} total)".format(desc, describe_last(last), total)
+
+
 class TierPrinter(AnnotatedStructPrinter):
     """Pretty printer for LloadTier"""
 
@@ -41,7 +87,7 @@ class TierPrinter(AnnotatedStructPrinter):
 
     def __init__(self, value, lp=None):
         super().__init__(value)
-        self.list = lp or gdb.lookup_symbol('tiers')[0].value()
+        self.list = lp or resolver.value('tiers')
 
     def to_string(self):
         if self.value == self.list.address:
@@ -58,16 +104,9 @@ class TierPrinter(AnnotatedStructPrinter):
 
         result['t_type'] = result['t_type']['tier_name']
 
-        # TODO: convert to proper Queue printers
-        address = result['t_backends'].address
-        if result['t_backends']['cqh_first'] == address:
-            result['t_backends'] = 'empty'
-        else:
-            desc = gdb.default_visualizer(result['t_backends']['cqh_first'])\
-                .to_string()
-            if result['t_backends']['cqh_first'] == \
-                    result['t_backends']['cqh_last']:
-                result['t_backends'] = desc
+        result['t_backends'] = queue_summary(
+            CircleQ(result['t_backends'], 'b_next'),
+            lambda b: b['b_name'])
 
         next = result['t_next']['stqe_next']
         visualiser = gdb.default_visualizer(next)
@@ -92,7 +131,7 @@ class BackendPrinter(AnnotatedStructPrinter):
         if 'b_tier' in type_to_fields_dict(self.value):
             self.list = self.value['b_tier']['t_backends']
         else:
-            self.list = lp or gdb.lookup_symbol('backend')[0].value()
+            self.list = lp or resolver.value('backend')
 
     def to_string(self):
         if self.value == self.list.address:
@@ -129,33 +168,25 @@ class BackendPrinter(AnnotatedStructPrinter):
 
         result['b_connecting'] = result['b_connecting']['lh_first']
 
+        backends = CircleQ(self.list, 'b_next')
+
         prev = result['b_next']['cqe_prev']
-        if prev == self.list.address:
+        if backends.is_end(prev):
             result['prev'] = "end of list"
         elif prev:
             result['prev'] = prev['b_name']
 
         next = b['b_next']['cqe_next']
-        if next == self.list.address:
+        if backends.is_end(next):
             result['next'] = "end of list"
         elif next:
             result['next'] = next['b_name']
 
         del result['b_next']
 
-        # TODO: convert to proper Queue printers
         for name in ['b_conns', 'b_bindconns', 'b_preparing']:
-            address = result[name].address
-            if result[name]['cqh_first'] == address:
-                result[name] = 'empty'
-            else:
-                desc = gdb.default_visualizer(result[name]['cqh_first'])\
-                    .to_string()
-                if result[name]['cqh_first'] == result[name]['cqh_last']:
-                    result[name] = desc
-                else:
-                    result[name] = "{}-{}".format(
-                        desc, result[name]['cqh_last']['c_connid'])
+            result[name] = queue_summary(CircleQ(result[name], 'c_next'),
+                                         lambda c: c['c_connid'])
 
         for name in ['b_last_conn', 'b_last_bindconn']:
             if result[name]:
@@ -180,31 +211,19 @@ class ConnectionPrinter(AnnotatedStructPrinter):
         parent = None
         desc = None
 
-        cb = value['c_destroy']
+        cb = int(value['c_destroy'])
         if not cb:
             value.type = "No connection"
-        if cb == gdb.lookup_symbol('client_destroy')[0].value():
-            desc = "Client"
-            parent = gdb.lookup_symbol('clients')[0].value()
-        elif cb == gdb.lookup_symbol('upstream_destroy')[0].value():
-            desc = "Upstream"
+        desc, parent_field = connection_kind(cb, str(value['c_type']))
+        if parent_field == 'clients':
+            parent = resolver.value('clients')
+        elif parent_field:
             if 'c_backend' in type_to_fields_dict(self.value):
                 backend = value['c_backend']
             else:
-                backend_type = gdb.lookup_type("LloadBackend").pointer()
+                backend_type = resolver.type("LloadBackend").pointer()
                 backend = value['c_private'].cast(backend_type)
-
-            if str(value['c_type']) == 'LLOAD_C_BIND':
-                desc = "Upstream bind"
-                parent = backend['b_bindconns'].address
-            elif str(value['c_type']) == 'LLOAD_C_PREPARING':
-                desc = "Upstream preparing"
-                parent = backend['b_preparing'].address
-            else:
-                parent = backend['b_conns'].address
-
-        elif cb == gdb.lookup_symbol('connection_destroy')[0].value():
-            desc = "Connection"
+            parent = backend[parent_field].address
 
         return desc, parent
 
@@ -214,31 +233,56 @@ class ConnectionPrinter(AnnotatedStructPrinter):
         return "{} connid={}".format(desc, value['c_connid'])
 
     def children(self):
-        result = self.children_dict()
-
-        live = result.pop('c_live')
-        result['c_refcnt'] = "{}+{}".format(result['c_refcnt'], live)
-
-        if str(result['c_sasl_bind_mech']) == "BVNULL":
-            result.pop('c_sasl_bind_mech')
-
         _, parent = self.conn_type()
-        if parent:
-            prev = result['c_next']['cqe_prev']
-            if prev == parent.address:
-                result['prev'] = "end of list"
-            else:
-                result['prev'] = "connid={}".format(prev['c_connid'])
-
-            next = result['c_next']['cqe_next']
-            if next == parent.address:
-                result['next'] = "end of list"
-            else:
-                result['next'] = "connid={}".format(next['c_connid'])
 
-        del result['c_next']
+        for name, value in self.iter_children():
+            if name == 'c_live':
+                continue
+            elif name == 'c_refcnt':
+                value = "{}+{}".format(value, self.value['c_live'])
+            elif name == 'c_sasl_bind_mech' and str(value) == "BVNULL":
+                continue
+            elif name == 'c_ops':
+                if not value:
+                    continue
+                yield from self.operations(value)
+                continue
+            elif name == 'c_next':
+                if not parent:
+                    continue
+
+                conns = CircleQ(parent, 'c_next')
+
+                prev = value['cqe_prev']
+                if conns.is_end(prev):
+                    yield 'prev', "end of list"
+                else:
+                    yield 'prev', "connid={}".format(prev['c_connid'])
 
-        return result.items()
+                next = value['cqe_next']
+                if conns.is_end(next):
+                    yield 'next', "end of list"
+                else:
+                    yield 'next', "connid={}".format(next['c_connid'])
+                continue
+
+            yield name, value
+
+    def operations(self, root):
+        "Count the operations in c_ops and list as many as we may print"
+        tree = TAVL(root, 'LloadOperation')
+        limit = print_elements_limit()
+        try:
+            # one more than the limit tells a full tree from a larger one
+            total = tree.count(None if limit is None else limit + 1)
+            if limit is not None and total > limit:
+                yield 'c_ops', "{}+ operations".format(limit)
+            else:
+                yield 'c_ops', "{} operations".format(total)
+            for i, op in enumerate(tree.walk(limit)):
+                yield 'c_ops[{}]'.format(i), op
+        except CorruptTree as e:
+            yield 'c_ops', "corrupt: {}".format(e)
 
 
 class OperationPrinter(AnnotatedStructPrinter):
@@ -10,8 +10,10 @@ import socket
 
 from pretty_printers.common import (
     CollectionPrinter, AnnotatedStructPrinter, FlagsPrinter,
-    target_type,
+    print_elements_limit, resolver, target_type,
 )
+from pretty_printers.decoder import read_memory
+from pretty_printers.queue import CorruptQueue, STailQ, walk
 
 
 class LockPrinter:
@@ -185,6 +187,18 @@ class AttrDescPrinter:
         return self.name
 
 
+def same_berval(a, b):
+    "Whether the two berval hold the same bytes"
+    length = int(a['bv_len'])
+    if length != int(b['bv_len']):
+        return False
+    if a['bv_val'] == b['bv_val'] or not length:
+        return True
+    inferior = gdb.selected_inferior()
+    return bytes(read_memory(inferior, int(a['bv_val']), length)) == \
+        bytes(read_memory(inferior, int(b['bv_val']), length))
+
+
 class AttributePrinter(AnnotatedStructPrinter):
     """Pretty printer for Attribute"""
     short = ['a_next']
@@ -194,24 +208,61 @@ class AttributePrinter(AnnotatedStructPrinter):
         return self.value['a_desc']
 
     def children(self):
-        result = self.children_dict()
-
-        vals = result['a_vals']
-        nvals = result['a_nvals']
+        vals = self.value['a_vals']
+        nvals = self.value['a_nvals']
         if not nvals or vals == nvals:
-            result.pop('a_nvals')
             nvals = None
 
-        numvals = int(result['a_numvals'])
-        if numvals:
-            valuestype = vals.type.target().target()
-            arraytype = valuestype.array(numvals-1)
-            result['a_vals'] = vals.dereference().cast(arraytype)
+        numvals = int(self.value['a_numvals'])
+        limit = print_elements_limit()
+        shown = 0
+
+        for name, value in self.iter_children():
+            if name == 'a_nvals':
+                if nvals and not numvals:
+                    shown += 1
+                    yield name, value
+            elif name == 'a_vals' and numvals:
+                room = None if limit is None else limit - shown
+                for child in self.values(vals, nvals, numvals, room):
+                    shown += 1
+                    yield child
+            elif name != 'a_numvals' or not numvals:
+                shown += 1
+                yield name, value
+
+    def values(self, vals, nvals, numvals, room=None):
+        """Yield the values one at a time, as many as fit in room children
+
+        gdb stops asking for children at the 'print elements' limit, room is
+        what is left of it after the fields before a_vals so that the '...'
+        entry counting the values left out still gets shown. A normalised
+        value is only shown when it is a different string from the value
+        itself.
+        """
+        for i in range(numvals):
+            # unless this is the last value, keep a slot for the marker
+            marker = i + 1 < numvals
+            if room is not None and 1 + marker > room:
+                yield '...', "{} more".format(numvals - i)
+                return
+
+            value = vals[i]
+            entries = [('a_vals[{}]'.format(i), value)]
+
             if nvals:
-                result['a_nvals'] = nvals.dereference().cast(arraytype)
-            result.pop('a_numvals')
+                normalised = nvals[i]
+                if not same_berval(normalised, value):
+                    entries.append(('a_nvals[{}]'.format(i), normalised))
 
-        return result.items()
+            needed = len(entries) + marker
+            if room is not None and needed > room:
+                yield '...', "{} more".format(numvals - i)
+                return
+
+            yield from entries
+            if room is not None:
+                room -= len(entries)
 
 
 class OCPrinter:
@@ -274,14 +325,13 @@ class ModificationsPrinter:
         return "list"
 
     def children(self):
-        result = []
-        current = self.value
-
-        while current:
-            result.append(current['sml_mod'])
-            current = current['sml_next']
-
-        return result
+        mods = walk(self.value, lambda m: m['sml_next'],
+                    limit=print_elements_limit())
+        try:
+            for i, mod in enumerate(mods):
+                yield "[{}]".format(i), mod['sml_mod']
+        except CorruptQueue as e:
+            yield "corrupt", str(e)
 
 
 class AVAPrinter(AnnotatedStructPrinter):
@@ -322,7 +372,7 @@ class AVAPrinter(AnnotatedStructPrinter):
             return []
             return [(str(self.value['aa_desc']) + self.operator[self.choice],
                      self.value['aa_value'])]
-        return self.children_dict().items()
+        return self.iter_children()
 
 
 class FilterPrinter(AnnotatedStructPrinter):
@@ -432,12 +482,13 @@ class PoolPrinter:
         return "{}".format(state_string)
 
     def children(self):
-        return {
-            "mutex": self.value['ltp_mutex'],
-            # "cond": self.value['ltp_cond'],
-            "queues": self.value['ltp_numqs'],
-            "queue": self.value['ltp_wqs'][0],
-        }.items()
+        yield "mutex", self.value['ltp_mutex']
+        # yield "cond", self.value['ltp_cond']
+        yield "queues", self.value['ltp_numqs']
+
+        wqs = self.value['ltp_wqs']
+        for i in range(int(self.value['ltp_numqs'])):
+            yield "queue[{}]".format(i), wqs[i]
 
 
 class DBPrinter(AnnotatedStructPrinter):
@@ -486,10 +537,12 @@ class DBPrinter(AnnotatedStructPrinter):
         result['type'] = self.value['bd_info']['bi_type']
         result.move_to_end('type', last=False)
 
-        # TODO: use format_string(summary=True)?
-        #result['be_next'] = gdb.default_visualizer(
-        #    result['be_next']['stqe_next']).to_string()
-        result['be_next'] = result['be_next']['stqe_next'].format_string(summary=True)
+        following = STailQ.following(self.value, 'be_next', limit=1)
+        next_db = next(following, None)
+        if next_db is None:
+            result['be_next'] = "end of list"
+        else:
+            result['be_next'] = next_db.format_string(summary=True)
 
         flags = self.value['be_flags']
         if flags:
@@ -726,18 +779,16 @@ class SlapReplyPrinter(AnnotatedStructPrinter):
         return None
 
     def children(self):
-        result = self.children_dict()
         _, member = self._result_type()
 
-        if member is not None:
-            union = result['sr_un']
-            if member:
-                result['sr_un.'+member] = union[member]
-                del result['sr_un']
-        else:
-            del result['sr_un']
+        for name, value in self.iter_children():
+            if name == 'sr_un':
+                if member is None:
+                    continue
+                elif member:
+                    name, value = 'sr_un.'+member, value[member]
 
-        return result.items()
+            yield name, value
 
 
 class ConfigArgsFlags(FlagsPrinter):
@@ -1041,28 +1092,28 @@ class OperationPrinter(AnnotatedStructPrinter):
         return result
 
     def children(self):
-        result = self.children_dict()
-        tag = int(result.pop('o_tag'))
-
+        tag = int(self.value['o_tag'])
         member = self.members.get(tag, ['', ''])[1]
-        if member is not None:
-            request = result['o_request']
-            if member:
-                result['o_request.'+member] = request[member]
-        del result['o_request']
-
-        o_time = int(result['o_time'])
-        o_tusec = int(result.pop('o_tusec'))
-        o_tincr = int(result.pop('o_tincr'))
-        result['o_time'] = datetime.fromtimestamp(
-            o_time+o_tusec/1_000_000).isoformat()
-        if o_tincr:
-            result['o_time'] += f"#{o_tincr}"
 
-        if int(result['o_req_dn']['bv_len']):
-            result.pop('o_req_ndn')
-
-        return result.items()
+        for name, value in self.iter_children():
+            if name in ('o_tag', 'o_tusec', 'o_tincr'):
+                continue
+            elif name == 'o_request':
+                if member:
+                    yield 'o_request.'+member, value[member]
+                continue
+            elif name == 'o_time':
+                o_tusec = int(self.value['o_tusec'])
+                o_tincr = int(self.value['o_tincr'])
+                value = datetime.fromtimestamp(
+                    int(value)+o_tusec/1_000_000).isoformat()
+                if o_tincr:
+                    value += f"#{o_tincr}"
+            elif name == 'o_req_ndn' and \
+                    int(self.value['o_req_dn']['bv_len']):
+                continue
+
+            yield name, value
 
 
 class RewriteRulePrinter(AnnotatedStructPrinter):
@@ -1075,15 +1126,12 @@ class RewriteRulePrinter(AnnotatedStructPrinter):
         return " -> ".join([self.value['lr_pattern'].string(),
                             self.value['lr_subststring'].string()])
 
-    def children(self):
-        return self.children_dict().items()
-
 
 def finish_printer(printer):
     # mutex = gdb.lookup_type('pthread_mutex_t')
 
     try:
-        condition_type = gdb.lookup_type('pthread_cond_t')
+        condition_type = resolver.type('pthread_cond_t')
         # only way to get a value of a given type?
         condition = condition_type.optimized_out()
         visualiser = gdb.default_visualizer(condition)
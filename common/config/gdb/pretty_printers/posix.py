@@ -6,7 +6,8 @@ import gdb.printing
 import socket
 from decimal import Decimal
 
-from pretty_printers.common import CollectionPrinter
+from pretty_printers.common import CollectionPrinter, resolver
+from pretty_printers.decoder import read_memory
 
 
 AF_UNIX = 1
@@ -46,14 +47,14 @@ class SockAddrPrinterGeneric:
         family = int(value[cls.prefix + 'family'])
         subclass = cls.__family_to_subclass__.get(family)
         if subclass:
-            value = value.cast(gdb.lookup_type(cls.typename))
+            value = value.cast(resolver.type(cls.typename))
             return subclass.__new__(subclass, value)
 
         raise NotImplementedError
 
     def __init__(self, value):
         if value.type.name != self.typename:
-            value = value.cast(gdb.lookup_type(self.typename))
+            value = value.cast(resolver.type(self.typename))
         self.value = value
 
 
@@ -61,11 +62,18 @@ class SockAddrPrinterIP(SockAddrPrinterGeneric):
     def __init__(self, value):
         super().__init__(value)
         assert self.family == self.value[self.prefix + 'family']
-        self.addr_type = gdb.lookup_type("char").array(self.addr_len-1)
+        self.addr_type = resolver.type("char").array(self.addr_len-1)
 
     def address(self):
-        address_buf = self.value[self.prefix + 'addr'].cast(self.addr_type)
-        address = bytes([int(address_buf[x]) for x in range(self.addr_len)])
+        value = self.value[self.prefix + 'addr']
+        if value.address is not None:
+            address = bytes(read_memory(gdb.selected_inferior(),
+                                        value.address, self.addr_len))
+        else:
+            # not in memory, go byte by byte
+            address_buf = value.cast(self.addr_type)
+            address = bytes([int(address_buf[x]) & 0xff
+                             for x in range(self.addr_len)])
 
         return socket.inet_ntop(self.family, address)
 
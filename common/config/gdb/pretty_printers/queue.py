@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+"""Walkers and pretty printers for BSD queue.h style lists
+
+These cover the SLIST, LIST, STAILQ, TAILQ and CIRCLEQ heads as provided by
+<sys/queue.h> and OpenLDAP's ldap_queue.h (LDAP_*-prefixed). Everything is
+lazy: elements are produced one at a time as pointers, can be bounded by a
+limit and a cycle or a NULL where the list should have ended raises
+CorruptQueue instead of spinning forever.
+"""
+
+import gdb
+import gdb.printing
+
+from pretty_printers.common import print_elements_limit, resolver
+from pretty_printers.decoder import StructLayout, read_pointer
+
+
+class CorruptQueue(Exception):
+    "The list does not terminate the way it should"
+
+
+def walk(element, step, end=0, limit=None, read=None):
+    """Yield element (a pointer) and the ones step(element) leads to
+
+    Stops when reaching the end address or after limit elements. With read
+    given, element is an address and read(address) is what gets yielded
+    (and passed to step).
+    """
+    seen = set()
+    address = int(element)
+    while address != end:
+        if not address:
+            raise CorruptQueue("NULL after {} elements, expected {:#x}"
+                               .format(len(seen), end))
+        if address in seen:
+            raise CorruptQueue("cycle back to {:#x} after {} elements"
+                               .format(address, len(seen)))
+        seen.add(address)
+
+        if read:
+            element = read(address)
+        yield element
+        if limit is not None and len(seen) >= limit:
+            return
+
+        element = step(element)
+        address = int(element)
+
+
+def count(element, step, end=0, limit=None):
+    """Count the elements walk() would produce without remembering them
+
+    Uses Brent's algorithm to notice cycles, returns limit if reached.
+    """
+    n = 0
+    power = steps = 1
+    tortoise = None
+
+    address = int(element)
+    while address != end:
+        if not address:
+            raise CorruptQueue("NULL after {} elements, expected {:#x}"
+                               .format(n, end))
+        if address == tortoise:
+            raise CorruptQueue("cycle back to {:#x} after {} elements"
+                               .format(address, n))
+
+        n += 1
+        if limit is not None and n >= limit:
+            return n
+
+        if steps == power:
+            tortoise = address
+            power *= 2
+            steps = 0
+        steps += 1
+
+        element = step(element)
+        address = int(element)
+    return n
+
+
+class Queue:
+    """A list head together with the entry field linking its elements
+
+    Subclasses name the fields of the head and entry structures."""
+
+    first = None
+    next = None
+    circular = False
+
+    def __init__(self, head, field):
+        if head.type.code == gdb.TYPE_CODE_PTR:
+            head = head.dereference()
+        self.head = head
+        self.field = field
+
+    @property
+    def end(self):
+        "Address marking the end of the list"
+        if self.circular:
+            return int(self.head.address)
+        return 0
+
+    def is_end(self, element):
+        return int(element) == self.end
+
+    @property
+    def link(self):
+        "Name of the next pointer within an element"
+        return self.field + '.' + self.next
+
+    def _layout(self):
+        return StructLayout.get(self.head[self.first].type.target())
+
+    def _step(self):
+        "Function going from an element's address to the next one's"
+        offset = self._layout().offset(self.link)
+        inferior = gdb.selected_inferior()
+        return lambda address: read_pointer(address + offset, inferior)
+
+    def __iter__(self):
+        return self.walk()
+
+    def addresses(self, limit=None):
+        "Walk the list reading nothing but the next pointers"
+        return walk(int(self.head[self.first]), self._step(), self.end, limit)
+
+    def walk(self, limit=None):
+        pointer = self.head[self.first].type
+        for address in self.addresses(limit):
+            yield gdb.Value(address).cast(pointer)
+
+    def records(self, limit=None):
+        "Walk the list reading each element whole, yields decoder Records"
+        layout = self._layout()
+        link = self.link
+        return walk(int(self.head[self.first]), lambda record: record[link],
+                    self.end, limit, read=layout.read)
+
+    def count(self, limit=None):
+        return count(int(self.head[self.first]), self._step(), self.end,
+                     limit)
+
+    def empty(self):
+        return self.is_end(self.head[self.first])
+
+    @classmethod
+    def following(cls, element, field, limit=None):
+        "Walk the elements after element without knowing the head"
+        step = lambda e: e[field][cls.next]
+        return walk(step(element), step, limit=limit)
+
+
+class SList(Queue):
+    first = 'slh_first'
+    next = 'sle_next'
+
+
+class List(Queue):
+    first = 'lh_first'
+    next = 'le_next'
+
+
+class STailQ(Queue):
+    first = 'stqh_first'
+    next = 'stqe_next'
+
+
+class TailQ(Queue):
+    first = 'tqh_first'
+    next = 'tqe_next'
+
+
+class CircleQ(Queue):
+    first = 'cqh_first'
+    next = 'cqe_next'
+    circular = True
+
+    @classmethod
+    def following(cls, element, field, limit=None):
+        # the walk ends back at the head, there is no telling where that is
+        raise TypeError("CIRCLEQ elements cannot be walked forward without "
+                        "their head")
+
+
+QUEUES = {cls.first: cls for cls in (SList, List, STailQ, TailQ, CircleQ)}
+
+
+def head_spec(typ):
+    """Work out the queue class and entry field for a head type (or None)
+
+    The entry field is only known if the element type has exactly one
+    matching entry pointing back at its own type."""
+    typ = typ.strip_typedefs()
+    if typ.code != gdb.TYPE_CODE_STRUCT:
+        return None
+
+    fields = typ.fields()
+    if not fields or fields[0].name not in QUEUES:
+        return None
+
+    cls = QUEUES[fields[0].name]
+    element = fields[0].type.target()
+
+    candidates = []
+    for field in element.strip_typedefs().fields():
+        entry = field.type.strip_typedefs()
+        if entry.code != gdb.TYPE_CODE_STRUCT:
+            continue
+        links = {f.name: f for f in entry.fields()}
+        if cls.next in links and links[cls.next].type.target() \
+                .strip_typedefs() == element.strip_typedefs():
+            candidates.append(field.name)
+
+    if len(candidates) != 1:
+        return None
+    return cls, candidates[0]
+
+
+class QueuePrinter:
+    """Pretty printer for a list head, elements are shown as an array"""
+
+    def __init__(self, head, cls, field):
+        self.queue = cls(head, field)
+
+    def display_hint(self):
+        return "array"
+
+    def to_string(self):
+        if self.queue.empty():
+            return "empty"
+        return type(self.queue).__name__
+
+    def children(self):
+        limit = print_elements_limit()
+        try:
+            for i, element in enumerate(self.queue.walk(limit)):
+                yield "[{}]".format(i), element
+        except CorruptQueue as e:
+            yield "corrupt", str(e)
+
+
+class QueueHeadLookup(gdb.printing.PrettyPrinter):
+    """Finds named list head types, what they are is remembered per type"""
+
+    def __init__(self):
+        super().__init__('queue.h')
+        self._memo = {}
+        resolver.track(self._memo)
+
+    def __call__(self, val):
+        typ = val.type
+        if not typ.name or typ.code == gdb.TYPE_CODE_PTR:
+            return None
+
+        key = (typ.name, typ.code)
+        try:
+            spec = self._memo[key]
+        except KeyError:
+            spec = self._memo[key] = head_spec(typ)
+
+        if spec:
+            return QueuePrinter(val, *spec)
+
+
+def register(objfile):
+    if objfile is None:
+        objfile = gdb
+
+    gdb.printing.register_pretty_printer(objfile, QueueHeadLookup())
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""Walkers for OpenLDAP's threaded AVL trees (TAvlnode)
+
+A thread link points at the in-order successor (or predecessor) instead
+of a child, so the tree can be walked in order without a stack. Nodes are
+decoded with StructLayout, avl_data is only followed when asked for and a
+loop in a corrupt tree raises CorruptTree.
+"""
+
+import gdb
+
+from pretty_printers.common import resolver
+from pretty_printers.decoder import StructLayout
+
+
+AVL_CHILD = 0
+AVL_THREAD = 1
+
+
+class CorruptTree(Exception):
+    "The tree links lead somewhere they should not"
+
+
+class TAVL:
+    """A TAvlnode tree, optionally knowing what its avl_data points at"""
+
+    def __init__(self, root, data_type=None):
+        self.root = int(root)
+        self.data_type = data_type
+        if isinstance(data_type, str):
+            self.data_type = resolver.type(data_type)
+
+        self.layout = StructLayout.get('TAvlnode')
+        self._links = ['avl_link[0]', 'avl_link[1]']
+
+    def empty(self):
+        return not self.root
+
+    def _descend(self, address, seen, inferior):
+        "Leftmost node of the subtree at address"
+        path = set()
+        node = self.layout.read(address, inferior)
+        while node['avl_bits'][0] == AVL_CHILD and node[self._links[0]]:
+            path.add(address)
+            address = node[self._links[0]]
+            if address in seen or address in path:
+                raise CorruptTree("loop back to {:#x} after {} nodes"
+                                  .format(address, len(seen)))
+            node = self.layout.read(address, inferior)
+        return node
+
+    def nodes(self, limit=None):
+        "Yield the nodes in order as decoder Records"
+        if not self.root:
+            return
+
+        inferior = gdb.selected_inferior()
+        seen = set()
+        node = self._descend(self.root, seen, inferior)
+        while True:
+            if node.address in seen:
+                raise CorruptTree("loop back to {:#x} after {} nodes"
+                                  .format(node.address, len(seen)))
+            seen.add(node.address)
+
+            yield node
+            if limit is not None and len(seen) >= limit:
+                return
+
+            right = node[self._links[1]]
+            if not right:
+                return
+            if node['avl_bits'][1] == AVL_THREAD:
+                node = self.layout.read(right, inferior)
+            else:
+                node = self._descend(right, seen, inferior)
+
+    def data(self, limit=None):
+        "Yield avl_data of each node in order as an int"
+        for node in self.nodes(limit):
+            yield node['avl_data']
+
+    def walk(self, limit=None):
+        "Yield avl_data of each node in order as a pointer to data_type"
+        pointer = (self.data_type or resolver.type('void')).pointer()
+        for address in self.data(limit):
+            yield gdb.Value(address).cast(pointer)
+
+    def __iter__(self):
+        return self.walk()
+
+    def count(self, limit=None):
+        "Count the nodes, reads nothing but the nodes themselves"
+        n = 0
+        for _ in self.nodes(limit):
+            n += 1
+        return n
@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+
+import gdb
+
+import collections
+import threading
+import time
+
+import snapshot
+
+
+class Sampler:
+    "Interrupts the inferior periodically and counts the stacks seen"
+
+    def __init__(self, count, interval, output=None):
+        self.remaining = count
+        self.interval = interval
+        self.output = output
+
+        self.samples = 0
+        self.stacks = collections.Counter()
+
+        self.windows = 0
+        self.window_min = None
+        self.window_max = 0
+        self.window_total = 0
+        self.capture_total = 0
+
+        self._stopped_at = None
+        self._running = False
+        self._interrupted = False
+        self._timer = None
+        self.done = False
+
+    def start(self):
+        gdb.events.stop.connect(self.on_stop)
+        gdb.events.exited.connect(self.on_exit)
+        try:
+            self.resume()
+        except gdb.error:
+            self.done = True
+            self.disconnect()
+            raise
+
+    def disconnect(self):
+        gdb.events.stop.disconnect(self.on_stop)
+        gdb.events.exited.disconnect(self.on_exit)
+
+    def resume(self):
+        gdb.execute("continue -a &")
+
+        if self._stopped_at is not None:
+            window = time.perf_counter() - self._stopped_at
+            self.windows += 1
+            self.window_total += window
+            self.window_max = max(self.window_max, window)
+            if self.window_min is None or window < self.window_min:
+                self.window_min = window
+            self._stopped_at = None
+
+        self._running = True
+        self._interrupted = False
+        self._timer = threading.Timer(self.interval, gdb.post_event,
+                                      (self.interrupt,))
+        self._timer.daemon = True
+        self._timer.start()
+
+    def interrupt(self):
+        if self._running:
+            self._interrupted = True
+            # in non-stop mode plain interrupt only stops the current thread
+            gdb.execute("interrupt -a")
+
+    def cancel(self):
+        self._running = False
+        if self._timer:
+            self._timer.cancel()
+            self._timer = None
+
+    def on_stop(self, event):
+        self._stopped_at = time.perf_counter()
+        self.cancel()
+
+        if not self._interrupted:
+            # a breakpoint, signal, ... is not a sample, leave the inferior
+            # to the user
+            print("Sampling stopped by the inferior stopping on its own")
+            self.finish()
+            return
+        self._interrupted = False
+
+        self.capture()
+        self.capture_total += time.perf_counter() - self._stopped_at
+
+        self.remaining -= 1
+        if self.remaining > 0:
+            gdb.post_event(self.resume)
+        else:
+            self.finish()
+
+    def on_exit(self, event):
+        self.cancel()
+        self.finish()
+
+    def capture(self):
+        "Count the (filtered) stack of each thread once"
+        with snapshot.SelectionSaver():
+            current = snapshot.get()
+            for thread in current:
+                frame = current.newest_frame(thread)
+                stack = [decorator.inferior_frame().name() or
+                         hex(decorator.address())
+                         for decorator in snapshot.filtered_frames(frame)]
+                if thread.name:
+                    stack.append(thread.name)
+                self.stacks[";".join(reversed(stack))] += 1
+        self.samples += 1
+
+    def finish(self):
+        self.done = True
+        self.disconnect()
+
+        if self.output:
+            with open(self.output, 'w') as out:
+                self.write(out)
+        else:
+            self.write()
+
+        if self.samples:
+            print("{} samples, {} unique stacks, capture took {:.1f}ms "
+                  "on average".format(self.samples, len(self.stacks),
+                                      self.capture_total / self.samples
+                                      * 1000))
+        if self.windows:
+            print("stopped for {:.1f}ms/{:.1f}ms/{:.1f}ms (min/avg/max)"
+                  .format(self.window_min * 1000,
+                          self.window_total / self.windows * 1000,
+                          self.window_max * 1000))
+
+    def write(self, out=None):
+        for stack, count in self.stacks.most_common():
+            print("{} {}".format(stack, count), file=out)
+
+
+class CommandSample(gdb.Command):
+    """Samples the stacks of all threads of a running process, e.g.
+    (gdb) sample -n 1000 -i 0.01 -o slapd.folded
+
+    The process is continued and interrupted COUNT times, INTERVAL seconds
+    apart, each time the stack of every thread is recorded after the frame
+    filters have had their say. The result is in collapsed-stack format
+    suitable for flamegraph.pl, the thread name (if set) being the root
+    frame. How long the process was kept stopped for is reported when done.
+    Sampling ends early if the process stops for any other reason (a
+    breakpoint, a signal), that stop is left for you to look at.
+
+    Options:
+    -n COUNT        how many samples to take, 100 by default
+    -i INTERVAL     seconds between samples, 0.01 by default
+    -o FILE         write the stacks to FILE instead of printing them
+    """
+
+    count = 100
+    interval = 0.01
+
+    def __init__(self):
+        super().__init__("sample", gdb.COMMAND_RUNNING)
+        self.sampler = None
+        print("Command 'sample' loaded")
+
+    def invoke(self, arg, from_tty):
+        "Starts sampling"
+
+        count = self.count
+        interval = self.interval
+        output = None
+
+        argv = gdb.string_to_argv(arg)
+        while argv:
+            option = argv.pop(0)
+            if option not in ('-n', '-i', '-o'):
+                raise gdb.GdbError("Unknown option " + option)
+            if not argv:
+                raise gdb.GdbError("Option {} needs an argument"
+                                   .format(option))
+            if option in ('-n', '-i'):
+                try:
+                    if option == '-n':
+                        count = int(argv.pop(0))
+                        if count < 1:
+                            raise ValueError(count)
+                    else:
+                        interval = float(argv.pop(0))
+                except ValueError:
+                    raise gdb.GdbError("Option {} needs a number\nUsage: "
+                                       "sample [-n COUNT] [-i INTERVAL] "
+                                       "[-o FILE]".format(option)) from None
+            else:
+                output = argv.pop(0)
+
+        if self.sampler and not self.sampler.done:
+            raise gdb.GdbError("Already sampling")
+
+        self.sampler = Sampler(count, interval, output)
+        try:
+            self.sampler.start()
+        except gdb.error as e:
+            raise gdb.GdbError("Cannot sample: {}".format(e))
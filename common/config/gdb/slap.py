@@ -0,0 +1,331 @@
+#!/usr/bin/env python3
+
+import gdb
+
+import collections
+from datetime import datetime
+
+import snapshot
+from pretty_printers.common import resolver, type_to_fields_dict
+from pretty_printers.decoder import StructLayout
+from pretty_printers.openldap import OperationPrinter
+from pretty_printers.queue import CorruptQueue, STailQ
+
+
+PAUSE_STATES = {0: "running", 1: "pausing", 2: "paused"}
+
+# how many frames of each thread to look for an 'op' variable in
+OP_FRAMES_DEPTH = 16
+
+
+def pools():
+    "Yield every thread pool libldap knows about"
+    pool_list = resolver.value('ldap_int_thread_pool_list')
+    if pool_list is not None:
+        yield from STailQ(pool_list, 'ltp_next')
+        return
+
+    # no libldap symbols, try slapd's own
+    pool = resolver.value('connection_pool')
+    if pool is not None:
+        yield pool
+
+
+def task_link(work_list):
+    "Name of the entry field linking tasks on a work list"
+    layout = StructLayout.get(work_list['stqh_first'].type.target())
+    if 'ltt_next.q.stqe_next' in layout.fields:
+        return 'ltt_next.q'
+    return 'ltt_next'
+
+
+def limit_text(value, limit):
+    if limit:
+        return "{}/{}".format(value, limit)
+    return str(value)
+
+
+class CommandPool(gdb.Command):
+    """Prints the state of thread pools and the tasks pending on them, e.g.
+    (gdb) pool
+    pool 0x5555556f12a0: running, active 16/16 threads, open 16, pending 1502
+            queue 0: active 8/8, open 8, pending 750/...
+                   740 connection_read_thread
+                    10 connection_operation
+            queue 1: ...
+
+    Every queue's pending list is walked and pending tasks grouped by their
+    start routine, even while the pool is paused. Without an argument, all pools are examined (falling
+    back to slapd's connection_pool), otherwise the pool given.
+
+    Options:
+    --limit N       walk no more than N tasks per queue
+    """
+
+    def __init__(self):
+        super().__init__("pool", gdb.COMMAND_DATA)
+        print("Command 'pool' loaded")
+
+    def invoke(self, arg, from_tty):
+        "Walks and prints the pools"
+
+        limit = None
+        expression = None
+
+        argv = gdb.string_to_argv(arg)
+        while argv:
+            option = argv.pop(0)
+            if option == '--limit':
+                if not argv:
+                    raise gdb.GdbError("Option {} needs an argument"
+                                       .format(option))
+                try:
+                    limit = int(argv.pop(0))
+                except ValueError:
+                    raise gdb.GdbError("Option --limit needs a number\n"
+                                       "Usage: pool [--limit N] [POOL]") \
+                        from None
+            elif option.startswith('-') or expression is not None:
+                raise gdb.GdbError("Unknown option " + option)
+            else:
+                expression = option
+
+        if expression:
+            selected = [gdb.parse_and_eval(expression)]
+        else:
+            selected = list(pools())
+            if not selected:
+                raise gdb.GdbError("No thread pools found")
+
+        routines = {}
+        for pool in selected:
+            self.print_pool(pool, limit, routines)
+
+    def routine(self, address, routines):
+        "Name of the function at address, remembered in routines"
+        try:
+            return routines[address]
+        except KeyError:
+            pass
+        pointer = gdb.Value(address).cast(resolver.type('void').pointer())
+        _, symbol = snapshot.describe_address(pointer)
+        name = routines[address] = symbol or hex(address)
+        return name
+
+    def print_pool(self, pool, limit, routines):
+        if pool.type.strip_typedefs().code != gdb.TYPE_CODE_PTR:
+            pool = pool.address
+        if not pool:
+            print("pool not initialised")
+            return
+
+        p = pool.dereference()
+        pause = int(p['ltp_pause'])
+        state = PAUSE_STATES.get(pause, "pause={}".format(pause))
+        if int(p['ltp_finishing']):
+            state += ", finishing"
+
+        active = int(p['ltp_active_count'])
+        max_count = int(p['ltp_max_count'])
+        line = "pool {:#x}: {}, active {} threads, open {}, pending {}".format(
+            int(pool), state, limit_text(active, max_count),
+            p['ltp_open_count'],
+            limit_text(p['ltp_pending_count'], int(p['ltp_max_pending'])))
+        if max_count and active >= max_count:
+            line += ", SATURATED"
+        print(line)
+
+        wqs = p['ltp_wqs']
+        for i in range(int(p['ltp_numqs'])):
+            queue = wqs[i]
+            if not queue:
+                continue
+            q = queue.dereference()
+
+            print("\tqueue {}: active {}, open {}, starting {}, pending {}"
+                  .format(i, limit_text(q['ltp_active_count'],
+                                        int(q['ltp_max_count'])),
+                          q['ltp_open_count'], q['ltp_starting'],
+                          limit_text(q['ltp_pending_count'],
+                                     int(q['ltp_max_pending']))))
+
+            if 'ltp_pending_list' in type_to_fields_dict(q):
+                # ltp_work_list points at an empty list while the pool is
+                # paused, the tasks stay on ltp_pending_list
+                work_list = q['ltp_pending_list']
+            else:
+                work_list = q['ltp_work_list']
+                if work_list.type.strip_typedefs().code == gdb.TYPE_CODE_PTR:
+                    work_list = work_list.dereference()
+            tasks = collections.Counter()
+            try:
+                for task in STailQ(work_list, task_link(work_list)) \
+                        .records(limit):
+                    tasks[task['ltt_start_routine']] += 1
+            except CorruptQueue as e:
+                print("\t\tcorrupt work list: {}".format(e))
+            except gdb.error as e:
+                print("\t\tcannot read work list: {}".format(e))
+
+            for address, count in tasks.most_common():
+                print("\t\t{:6} {}".format(count,
+                                            self.routine(address, routines)))
+
+
+def connections():
+    "Yield (address, Record) of every connection slot in use"
+    table = resolver.value('connections')
+    size = resolver.value('dtblsize')
+    if table is None or size is None or not table:
+        return
+
+    layout = StructLayout.get(table.type.target())
+    used = {v for v, name in layout.enum('c_struct_state').items()
+            if name == 'SLAP_C_USED'}
+
+    address = int(table)
+    inferior = gdb.selected_inferior()
+    for i in range(int(size)):
+        slot = address + i * layout.size
+        if layout.read_field(slot, 'c_struct_state', inferior) in used:
+            yield slot, layout.read(slot, inferior)
+
+
+def is_pointer_to(value, typ):
+    pointer = value.type.strip_typedefs()
+    return pointer.code == gdb.TYPE_CODE_PTR and \
+        pointer.target().strip_typedefs() == typ.strip_typedefs()
+
+
+class InFlightOperation:
+    "An Operation and where it was found"
+
+    def __init__(self, op):
+        self.op = op
+        self.where = []
+
+        self.printer = OperationPrinter(op.dereference())
+        self.tag = int(op['o_tag'])
+        self.time = int(op['o_time']) + int(op['o_tusec']) / 1000000
+
+    @property
+    def kind(self):
+        return OperationPrinter.members.get(self.tag,
+                                            ["Unknown request"])[0]
+
+    def describe(self):
+        text = self.printer.to_string()
+        dn = self.op['o_req_dn']
+        if int(dn['bv_len']):
+            text += ' base="{}"'.format(
+                dn['bv_val'].string(length=int(dn['bv_len'])))
+        return text
+
+
+class CommandOperations(gdb.Command):
+    """Lists all operations slapd is processing, oldest first, e.g.
+    (gdb) slap-ops
+    Search request conn=1001 op=5 base="dc=example,dc=com"
+            started 2024-03-01T10:00:01.123456 (12.3s before newest)
+            executing, Thread #7 (LWP 2719)
+    ...
+    15 operations by type: 12 Search request, 3 Modify request
+
+    Operations are collected from each connection's executing and pending
+    lists as well as any 'op' variable in the newest frames of each thread.
+    Ages are relative to the most recent operation seen as a core has no
+    notion of the current time.
+
+    Options:
+    --limit N       only list the N oldest operations
+    """
+
+    def __init__(self):
+        super().__init__("slap-ops", gdb.COMMAND_DATA)
+        print("Command 'slap-ops' loaded")
+
+    def invoke(self, arg, from_tty):
+        "Collects and prints operations"
+
+        limit = None
+
+        argv = gdb.string_to_argv(arg)
+        while argv:
+            option = argv.pop(0)
+            if option != '--limit':
+                raise gdb.GdbError("Unknown option " + option)
+            if not argv:
+                raise gdb.GdbError("Option {} needs an argument"
+                                   .format(option))
+            try:
+                limit = int(argv.pop(0))
+            except ValueError:
+                raise gdb.GdbError("Option --limit needs a number\n"
+                                   "Usage: slap-ops [--limit N]") from None
+
+        try:
+            op_type = resolver.type('Operation')
+        except gdb.error:
+            raise gdb.GdbError("No slapd symbols found")
+
+        operations = collections.OrderedDict()
+
+        def found(op, where):
+            address = int(op)
+            entry = operations.get(address)
+            if entry is None:
+                try:
+                    entry = operations[address] = InFlightOperation(op)
+                except (NotImplementedError, gdb.error):
+                    # no header, not an operation (yet)
+                    return
+            entry.where.append(where)
+
+        for address, conn in connections():
+            connection = gdb.Value(address).cast(
+                resolver.type('Connection').pointer())
+            for field, state in (('c_ops', "executing"),
+                                 ('c_pending_ops', "pending")):
+                if not conn[field + '.stqh_first']:
+                    continue
+                try:
+                    for op in STailQ(connection[field], 'o_next'):
+                        found(op, state)
+                except CorruptQueue as e:
+                    print("connid={} {}: {}".format(conn['c_connid'], field,
+                                                     e))
+
+        with snapshot.SelectionSaver():
+            current = snapshot.get()
+            for thread in current:
+                frame = current.newest_frame(thread)
+                depth = 0
+                while frame and depth < OP_FRAMES_DEPTH:
+                    try:
+                        op = frame.read_var('op')
+                    except (ValueError, gdb.error):
+                        op = None
+                    if op is not None and is_pointer_to(op, op_type) and op:
+                        found(op, "Thread #{} (LWP {})".format(
+                            thread.num, thread.ptid[1]))
+                        break
+                    frame = frame.older()
+                    depth += 1
+
+        if not operations:
+            print("No operations in flight")
+            return
+
+        ordered = sorted(operations.values(), key=lambda entry: entry.time)
+        newest = ordered[-1].time
+        for entry in ordered[:limit]:
+            print(entry.describe())
+            print("\tstarted {} ({:.1f}s before newest)".format(
+                datetime.fromtimestamp(entry.time).isoformat(),
+                newest - entry.time))
+            print("\t" + ", ".join(entry.where))
+
+        kinds = collections.Counter(entry.kind for entry in ordered)
+        print("\n{} operations by type: {}".format(len(ordered), ", ".join(
+            "{} {}".format(count, kind)
+            for kind, count in kinds.most_common())))
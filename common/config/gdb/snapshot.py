@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+
+import gdb
+import gdb.frames
+from gdb.FrameDecorator import FrameDecorator
+from gdb.FrameIterator import FrameIterator
+
+import itertools
+
+
+class ThreadSnapshot:
+    """Threads of an inferior as seen at the current stop
+
+    Building one only walks the thread list, newest frames are fetched (and
+    remembered) on demand. Anything derived from the threads (waiter
+    classification, lock graphs, indexes, ...) should go through memo() so
+    that it is thrown away together with the snapshot once the inferior
+    state changes.
+    """
+
+    def __init__(self, inferior):
+        self.inferior = inferior
+        self.threads = {}
+
+        self._frames = {}
+        self._memo = {}
+
+        for thread in inferior.threads():
+            self.threads[thread.ptid[1]] = thread
+
+    def __len__(self):
+        return len(self.threads)
+
+    def __iter__(self):
+        return iter(self.threads.values())
+
+    def thread(self, lwp_id):
+        "Return the thread with a given LWP id or None"
+        return self.threads.get(lwp_id)
+
+    def newest_frame(self, thread):
+        "Select thread and return its newest frame"
+        thread.switch()
+
+        lwp_id = thread.ptid[1]
+        frame = self._frames.get(lwp_id)
+        if frame is None:
+            frame = gdb.newest_frame()
+            self._frames[lwp_id] = frame
+        return frame
+
+    def memo(self, key, factory):
+        "Return the value cached under key, calling factory(self) to create it"
+        try:
+            return self._memo[key]
+        except KeyError:
+            pass
+        value = self._memo[key] = factory(self)
+        return value
+
+
+class SelectionSaver:
+    "Context manager restoring the selected thread and frame on exit"
+
+    def __enter__(self):
+        self.thread = gdb.selected_thread()
+        try:
+            self.frame = gdb.selected_frame()
+        except gdb.error:
+            self.frame = None
+        return self
+
+    def __exit__(self, *exc):
+        if self.thread and self.thread.is_valid():
+            self.thread.switch()
+            if self.frame and self.frame.is_valid():
+                self.frame.select()
+
+
+def filtered_frames(frame, limit=None):
+    """Frame decorators for frame and older frames after frame filters
+
+    At most limit frames are returned, the thread needs to be selected.
+    """
+    if limit == 0:
+        return iter(())
+
+    high = -1 if limit is None else limit - 1
+    frames = gdb.frames.execute_frame_filters(frame, 0, high)
+    if frames is None:
+        # no frame filters enabled
+        frames = map(FrameDecorator,
+                     itertools.islice(FrameIterator(frame), limit))
+    return frames
+
+
+def format_frame(frame):
+    "One line description of a frame decorator"
+    function = frame.function()
+    if isinstance(function, int):
+        function = hex(function)
+
+    text = "{}()".format(function or "??")
+    if frame.filename():
+        text += " at {}:{}".format(frame.filename(), frame.line())
+    return text
+
+
+def describe_address(value):
+    "Return the address of a pointer and the symbol it points into (or None)"
+    address = int(value)
+    text = str(value.cast(gdb.lookup_type('void').pointer()))
+    symbol = None
+    if '<' in text:
+        symbol = text[text.index('<')+1:text.rindex('>')]
+    return address, symbol
+
+
+_snapshots = {}
+
+
+def get(inferior=None):
+    "Return the snapshot of inferior (the selected one by default)"
+    if inferior is None:
+        inferior = gdb.selected_inferior()
+
+    snapshot = _snapshots.get(inferior.num)
+    if snapshot is None or snapshot.inferior != inferior:
+        snapshot = _snapshots[inferior.num] = ThreadSnapshot(inferior)
+    return snapshot
+
+
+def invalidate(event=None):
+    _snapshots.clear()
+
+
+gdb.events.cont.connect(invalidate)
+gdb.events.stop.connect(invalidate)
+gdb.events.exited.connect(invalidate)
+gdb.events.new_objfile.connect(invalidate)
@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""Headless triage of a pile of core files
+
+Runs a batch mode gdb with these extensions loaded over every core found,
+several at a time, and merges what each of them reports into one summary:
+
+    ~/.gdb/triage.py --exe /usr/sbin/slapd /var/crash/slapd/
+
+Results are cached per core (keyed on its path, size and mtime and those
+of the executable) so that rerunning over a directory only looks at the new
+cores.
+
+The same module is imported inside each of the gdb workers where collect()
+does the actual work.
+"""
+
+import argparse
+import collections
+import concurrent.futures
+import fnmatch
+import hashlib
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+
+GDB_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# (key, command) pairs run in each worker on top of deadlock, the output is
+# kept as text, a command that is not available (e.g. lloadd commands on a
+# slapd core) just records the error
+COMMANDS = [
+    ('threads', 'info threads'),
+    ('lload-census', 'lload-census'),
+    ('pool', 'pool'),
+    ('slap-ops', 'slap-ops'),
+]
+
+
+def collect(output):
+    "Run inside gdb: examine the loaded core, store the results in output"
+    import gdb
+
+    result = {
+        'commands': {},
+        'errors': {},
+        'timing': {},
+    }
+
+    start = time.perf_counter()
+    with tempfile.NamedTemporaryFile(mode='r', suffix='.json') as f:
+        try:
+            gdb.execute('deadlock --json {}'.format(f.name), to_string=True)
+            result['deadlock'] = json.load(f)
+        except (gdb.error, ValueError) as e:
+            result['errors']['deadlock'] = str(e)
+    result['timing']['deadlock'] = time.perf_counter() - start
+
+    for key, command in COMMANDS:
+        start = time.perf_counter()
+        try:
+            result['commands'][key] = gdb.execute(command, to_string=True)
+        except gdb.error as e:
+            result['errors'][key] = str(e)
+        result['timing'][key] = time.perf_counter() - start
+
+    with open(output, 'w') as f:
+        json.dump(result, f)
+
+
+def identity(path):
+    stat = os.stat(path)
+    return "{}\0{}\0{}".format(os.path.realpath(path), stat.st_size,
+                               stat.st_mtime_ns)
+
+
+def cache_path(cache_dir, core, exe=None):
+    key = identity(core)
+    if exe:
+        key += "\0" + identity(exe)
+    return os.path.join(cache_dir,
+                        hashlib.sha1(key.encode()).hexdigest() + '.json')
+
+
+def gdb_command(core, exe, output):
+    command = [
+        'gdb', '-batch', '-nx',
+        '-iex', 'set pagination off',
+        '-iex', 'python import sys; sys.path.insert(0, {!r})'.format(GDB_DIR),
+        '-x', os.path.join(GDB_DIR, 'gdb.py'),
+    ]
+    if exe:
+        command.append(exe)
+    command += [
+        '-c', core,
+        '-ex', 'python import triage; triage.collect({!r})'.format(output),
+    ]
+    return command
+
+
+def triage(core, exe=None, timeout=None, cache_dir=None):
+    "Examine one core in a gdb subprocess, returns a result dictionary"
+    result = {
+        'core': core,
+        'exe': exe,
+    }
+
+    try:
+        cached = cache_dir and cache_path(cache_dir, core, exe)
+    except OSError as e:
+        # gone or unreadable since it was found, fail just this core
+        result.update(status='failed', elapsed=0.0, log=str(e))
+        return result
+
+    if cached and os.path.exists(cached):
+        with open(cached) as f:
+            result = json.load(f)
+        result['cached'] = True
+        return result
+
+    start = time.perf_counter()
+    with tempfile.TemporaryDirectory() as tmpdir:
+        output = os.path.join(tmpdir, 'result.json')
+        try:
+            process = subprocess.run(gdb_command(core, exe, output),
+                                     stdin=subprocess.DEVNULL,
+                                     stdout=subprocess.PIPE,
+                                     stderr=subprocess.STDOUT,
+                                     timeout=timeout)
+        except subprocess.TimeoutExpired:
+            result['status'] = 'timeout'
+        else:
+            if os.path.exists(output):
+                with open(output) as f:
+                    result.update(json.load(f))
+                result['status'] = 'ok'
+            else:
+                result['status'] = 'failed'
+                result['log'] = process.stdout.decode(errors='replace')
+    result['elapsed'] = time.perf_counter() - start
+
+    # timeouts might go away with a larger timeout, don't cache them
+    if cached and result['status'] != 'timeout':
+        with open(cached, 'w') as f:
+            json.dump(result, f)
+
+    return result
+
+
+def find_cores(paths, pattern):
+    for path in paths:
+        if not os.path.isdir(path):
+            yield path
+            continue
+
+        for dirpath, _, filenames in os.walk(path):
+            for name in sorted(filenames):
+                if fnmatch.fnmatch(name, pattern):
+                    yield os.path.join(dirpath, name)
+
+
+def summarise(results, out=sys.stdout):
+    statuses = collections.Counter(result['status'] for result in results)
+    print("{} cores: {}".format(
+        len(results), ", ".join("{} {}".format(count, status)
+                                for status, count in statuses.items())),
+        file=out)
+
+    symbols = collections.Counter()
+    for result in sorted(results, key=lambda r: r['core']):
+        line = "{core}: {status} in {elapsed:.1f}s".format(**result)
+        if result.get('cached'):
+            line += " (cached)"
+
+        deadlock = result.get('deadlock')
+        if deadlock:
+            stats = deadlock['stats']
+            line += ", {} threads, {} waiting on {} roots".format(
+                stats['threads'], stats['edges'], len(deadlock['roots']))
+            if deadlock['cycles']:
+                line += ", {} DEADLOCKS".format(len(deadlock['cycles']))
+            for edge in deadlock['edges']:
+                symbols[edge['symbol'] or edge['mutex']] += 1
+        for key, error in result.get('errors', {}).items():
+            line += "\n\t{}: {}".format(key, error.strip())
+        print(line, file=out)
+
+    if symbols:
+        print("\nMost contended mutexes:", file=out)
+        for symbol, count in symbols.most_common(10):
+            print("\t{:6} {}".format(count, symbol), file=out)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('paths', nargs='+', metavar='PATH',
+                        help="core files or directories to search for them")
+    parser.add_argument('-e', '--exe',
+                        help="executable the cores were produced by")
+    parser.add_argument('-p', '--pattern', default='core*',
+                        help="file name pattern of cores in directories "
+                             "(default: %(default)s)")
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count(),
+                        help="gdb processes to run at once (default: "
+                             "%(default)s)")
+    parser.add_argument('-t', '--timeout', type=float, default=600,
+                        help="seconds to give each core (default: "
+                             "%(default)s)")
+    parser.add_argument('-c', '--cache-dir',
+                        default=os.path.expanduser('~/.cache/gdb-triage'),
+                        help="where to keep results (default: %(default)s)")
+    parser.add_argument('--no-cache', dest='cache_dir', action='store_const',
+                        const=None, help="always rerun gdb")
+    parser.add_argument('-o', '--output',
+                        help="also write the merged results as JSON here")
+    args = parser.parse_args(argv)
+
+    if args.cache_dir:
+        os.makedirs(args.cache_dir, exist_ok=True)
+
+    cores = list(find_cores(args.paths, args.pattern))
+    results = []
+    with concurrent.futures.ProcessPoolExecutor(args.jobs) as executor:
+        futures = {executor.submit(triage, core, args.exe, args.timeout,
+                                   args.cache_dir): core for core in cores}
+        for future in concurrent.futures.as_completed(futures):
+            result = future.result()
+            print("{}: {}".format(futures[future], result['status']),
+                  file=sys.stderr)
+            results.append(result)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=1)
+
+    summarise(results)
+    return 0 if all(result['status'] == 'ok' for result in results) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())